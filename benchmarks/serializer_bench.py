@@ -0,0 +1,76 @@
+"""
+Compare the payload serialization of send_raw before and after the
+compiled encoders, on generic templates with many elements.
+
+    PYTHONPATH=. python benchmarks/serializer_bench.py
+"""
+import json
+import timeit
+
+import attr
+import six
+
+from pymessenger2 import Element
+from pymessenger2.buttons import PostbackButton, URLButton
+from pymessenger2.prepared import PreparedMessage
+from pymessenger2.serializer import Serializer, orjson
+
+
+class LegacyAttrsEncoder(json.JSONEncoder):
+    """AttrsEncoder as it was, going through attr.asdict."""
+    def default(self, obj):
+        if hasattr(obj, '__attrs_attrs__'):
+            items_iterator = (attr.asdict(obj).items()
+                              if six.PY3 else
+                              attr.asdict(obj).iteritems())
+            return {k: v for k, v in items_iterator if v is not None}
+        return json.JSONEncoder.default(self, obj)
+
+
+def generic_payload(elements):
+    return {
+        'recipient': {'id': '1234567890'},
+        'notification_type': 'REGULAR',
+        'message': {'attachment': {'type': 'template', 'payload': {
+            'template_type': 'generic',
+            'image_aspect_ratio': 'horizontal',
+            'elements': [
+                Element(title='Element {0}'.format(i),
+                        subtitle='Subtitle of element {0}'.format(i),
+                        image_url='https://example.com/{0}.png'.format(i),
+                        buttons=[URLButton(title='Open',
+                                           url='https://example.com/'),
+                                 PostbackButton(title='Pick {0}'.format(i)),
+                                 PostbackButton(title='Skip')])
+                for i in range(elements)]}}}}
+
+
+def legacy_send_raw_encoding(payload):
+    # send_raw used to encode twice: once to log, once for the body
+    json.dumps(payload, cls=LegacyAttrsEncoder)
+    return json.dumps(payload, cls=LegacyAttrsEncoder)
+
+
+def main(number=2000):
+    candidates = [('legacy AttrsEncoder x2', legacy_send_raw_encoding),
+                  ('Serializer(json)', Serializer('json').dumps)]
+    if orjson is not None:
+        candidates.append(('Serializer(orjson)', Serializer('orjson').dumps))
+    for elements in (10, 100):
+        payload = generic_payload(elements)
+        prepared = PreparedMessage(payload['message'])
+        runs = candidates + [
+            ('PreparedMessage', lambda _: prepared.for_recipient('1234567890'))]
+        print("generic template, {0} elements, {1} messages".format(
+            elements, number))
+        baseline = None
+        for name, dumps in runs:
+            seconds = min(timeit.repeat(lambda: dumps(payload),
+                                        number=number, repeat=3))
+            baseline = baseline or seconds
+            print("  {0:<24} {1:8.1f} us/msg  x{2:.1f}".format(
+                name, seconds / number * 1e6, baseline / seconds))
+
+
+if __name__ == '__main__':
+    main()
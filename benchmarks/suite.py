@@ -0,0 +1,399 @@
+"""
+Benchmark suite of the hot paths: payload building, serialization,
+signatures, the memory held by the message models, and send throughput
+against the local Graph API emulator.
+
+    PYTHONPATH=. python benchmarks/suite.py --output results.json
+    PYTHONPATH=. python benchmarks/suite.py --baseline benchmarks/baseline.json
+
+Results are written as JSON. With --baseline, every result is compared to
+the stored one and the run fails (exit status 1) when one of them is
+slower by more than --threshold. --save-baseline overwrites the baseline
+with the results of the run, --add-to-baseline only stores the results it
+doesn't have yet, eg: of a new benchmark, leaving the others untouched.
+
+Each timing is the median of a fixed number of repeats, each throughput
+the median of several runs, so that a noisy machine moves them less than
+the threshold. A reference workload is timed right before every repeat of
+the microbenchmarks, and they are compared by their ratio to it, which
+holds when the speed of the machine swings. Results still depend on the
+machine, noted in the "meta": record the baseline on the machine running
+the comparisons.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+from pymessenger2 import Element, QuickReply, frozen
+from pymessenger2.airline import (AirlineItinerary, Airport, FlightInfo,
+                                  FlightSchedule, PassengerInfo,
+                                  PassengerSegmentInfo, PriceInfo)
+from pymessenger2.bot import Bot
+from pymessenger2.buttons import PostbackButton, URLButton
+from pymessenger2.emulator import GraphEmulator
+from pymessenger2.serializer import Serializer, orjson
+from pymessenger2.utils import (AttrsEncoder, generate_appsecret_proof,
+                                validate_hub_signature)
+from pymessenger2.validation import Validator
+
+RECIPIENT_ID = '1234567890123456'
+APP_SECRET = 'a3d1b1bc2e4f6a8c0e2f4a6c8e0a2c4e'
+ACCESS_TOKEN = 'EAAB' + 'x' * 180
+# Repeats of each microbenchmark, runs of each throughput measure
+REPEATS = 31
+E2E_RUNS = 5
+# Round trip of the emulated Graph API, in seconds: with none, concurrent
+# sends only compete for the GIL
+E2E_LATENCY = 0.002
+
+
+#===============================================================================
+# Payloads
+#===============================================================================
+def generic_elements(count):
+    return [Element(title='Element {0}'.format(i),
+                    subtitle='Subtitle of element {0}'.format(i),
+                    image_url='https://example.com/{0}.png'.format(i),
+                    buttons=[URLButton(title='Open',
+                                       url='https://example.com/'),
+                             PostbackButton(title='Pick {0}'.format(i)),
+                             PostbackButton(title='Skip')])
+            for i in range(count)]
+
+
+def airline_itinerary(passengers, segments):
+    return AirlineItinerary(
+        intro_message='Here is your flight itinerary.',
+        pnr_number='ABCDEF',
+        passenger_info=[PassengerInfo(passenger_id='p{0}'.format(p),
+                                      name='Passenger {0}'.format(p),
+                                      ticket_number='T{0}'.format(p))
+                        for p in range(passengers)],
+        flight_info=[FlightInfo(
+            connection_id='c{0}'.format(s),
+            segment_id='s{0}'.format(s),
+            flight_number='KL{0}'.format(900 + s),
+            departure_airport=Airport(airport_code='SFO',
+                                      city='San Francisco', terminal='T4',
+                                      gate='G8'),
+            arrival_airport=Airport(airport_code='AMS', city='Amsterdam'),
+            flight_schedule=FlightSchedule(
+                departure_time='2016-01-02T19:45',
+                arrival_time='2016-01-03T17:30'),
+            travel_class='business',
+            aircraft_type='Boeing 787')
+            for s in range(segments)],
+        passenger_segment_info=[PassengerSegmentInfo(
+            segment_id='s{0}'.format(s), passenger_id='p{0}'.format(p),
+            seat='{0}A'.format(p + 1), seat_type='Business',
+            product_info=[{'title': 'Cabin', 'value': 'Business'}])
+            for s in range(segments) for p in range(passengers)],
+        price_info=[PriceInfo(title='Fuel surcharge', amount=1597,
+                              currency='USD')],
+        total_price=14003,
+        currency='USD',
+        base_price=12206,
+        tax=200)
+
+
+def template_payload(template):
+    return {'recipient': {'id': RECIPIENT_ID},
+            'notification_type': 'REGULAR',
+            'message': {'attachment': {'type': 'template',
+                                       'payload': template}}}
+
+
+#===============================================================================
+# Microbenchmarks
+#===============================================================================
+def send_helper_benchmarks(bot, attachment_path):
+    elements = generic_elements(10)
+    buttons = [PostbackButton(title='Yes'), PostbackButton(title='No')]
+    quick_replies = [QuickReply(content_type='text', title=str(i))
+                     for i in range(5)]
+    kwargs = {'do_send': False}
+    return [
+        ('send_text_message', lambda: bot.send_text_message(
+            RECIPIENT_ID, 'Hello world', **kwargs)),
+        ('send_message', lambda: bot.send_message(
+            RECIPIENT_ID, {'text': 'Hello world'}, **kwargs)),
+        ('send_generic_message', lambda: bot.send_generic_message(
+            RECIPIENT_ID, elements, **kwargs)),
+        ('send_button_message', lambda: bot.send_button_message(
+            RECIPIENT_ID, 'Pick one', buttons, **kwargs)),
+        ('send_quick_reply', lambda: bot.send_quick_reply(
+            RECIPIENT_ID, 'Pick one', quick_replies, **kwargs)),
+        ('send_action', lambda: bot.send_action(
+            RECIPIENT_ID, 'typing_on', **kwargs)),
+        ('send_attachment_url', lambda: bot.send_image_url(
+            RECIPIENT_ID, 'https://example.com/a.png', **kwargs)),
+        ('send_attachment_id', lambda: bot.send_attachment_id(
+            RECIPIENT_ID, 'image', '1857777774821032', **kwargs)),
+        ('send_attachment', lambda: bot.send_image(
+            RECIPIENT_ID, attachment_path, **kwargs)),
+    ]
+
+
+def encoder_benchmarks():
+    generic = template_payload({'template_type': 'generic',
+                                'elements': generic_elements(100)})
+    airline = template_payload(airline_itinerary(passengers=4, segments=8))
+    return [
+        ('AttrsEncoder.generic_100', lambda: json.dumps(generic,
+                                                        cls=AttrsEncoder)),
+        ('AttrsEncoder.airline_4x8', lambda: json.dumps(airline,
+                                                        cls=AttrsEncoder)),
+    ]
+
+
+def frozen_benchmarks():
+    """Carousels sent over and over: the frozen elements are encoded once.
+    """
+    serializer = Serializer()
+    mutable = template_payload({'template_type': 'generic',
+                                'elements': generic_elements(100)})
+    elements = tuple(frozen.freeze(element)
+                     for element in generic_elements(100))
+    immutable = template_payload({'template_type': 'generic',
+                                  'elements': elements})
+    serializer.dumps(immutable)
+    return [
+        ('Serializer.generic_100', lambda: serializer.dumps(mutable)),
+        ('Serializer.generic_100.frozen', lambda: serializer.dumps(
+            immutable)),
+    ]
+
+
+def validation_benchmarks():
+    validator = Validator()
+    generic = template_payload({'template_type': 'generic',
+                                'elements': generic_elements(10)})
+    quick_replies = {'recipient': {'id': RECIPIENT_ID}, 'message': {
+        'text': 'Pick one', 'quick_replies': [
+            QuickReply(content_type='text', title=str(i))
+            for i in range(13)]}}
+    return [
+        ('Validator.generic_10', lambda: validator.validate(generic)),
+        ('Validator.quick_replies_13', lambda: validator.validate(
+            quick_replies)),
+    ]
+
+
+def allocated(build):
+    """Bytes still allocated after `build()`, ie: held by its result."""
+    tracemalloc.start()
+    try:
+        result = build()
+        size = tracemalloc.get_traced_memory()[0]
+        del result
+        return size
+    finally:
+        tracemalloc.stop()
+
+
+def memory_benchmarks():
+    def frozen_elements(count):
+        return [frozen.freeze(element) for element in
+                generic_elements(count)]
+
+    return [
+        ('generic_elements_1000', lambda: generic_elements(1000)),
+        ('generic_elements_1000.frozen', lambda: frozen_elements(1000)),
+    ]
+
+
+def signature_benchmarks():
+    body = json.dumps({'object': 'page', 'entry': [
+        {'id': '1', 'time': 1, 'messaging': [
+            {'sender': {'id': RECIPIENT_ID}, 'recipient': {'id': '1'},
+             'message': {'mid': 'mid.{0}'.format(i), 'text': 'x' * 100}}]}
+        for i in range(10)]}).encode('utf8')
+    import hashlib
+    import hmac
+    header = 'sha1=' + hmac.new(APP_SECRET.encode('utf8'), body,
+                                hashlib.sha1).hexdigest()
+    return [
+        ('validate_hub_signature', lambda: validate_hub_signature(
+            APP_SECRET, body, header)),
+        ('generate_appsecret_proof', lambda: generate_appsecret_proof(
+            ACCESS_TOKEN, APP_SECRET)),
+    ]
+
+
+def reference_workload():
+    """Fixed pure Python workload timed along the microbenchmarks."""
+    return sorted(str(i) for i in range(1000))
+
+
+def measure(func, quick=False):
+    """Median time of one call in microseconds, and median ratio to the
+    time of `reference_workload` measured right before each repeat.
+    """
+    # Short repeats, about 20ms: the speed of the machine may swing
+    # within a second
+    timer = timeit.Timer(func)
+    number = max(1, timer.autorange()[0] // 10)
+    reference_timer = timeit.Timer(reference_workload)
+    reference_number = max(1, reference_timer.autorange()[0] // 10)
+    times = []
+    ratios = []
+    for _ in range(3 if quick else REPEATS):
+        reference_time = (reference_timer.timeit(reference_number) /
+                          reference_number)
+        times.append(timer.timeit(number) / number)
+        ratios.append(times[-1] / reference_time)
+    return statistics.median(times) * 1e6, statistics.median(ratios)
+
+
+#===============================================================================
+# End to end
+#===============================================================================
+def throughput(bot, messages, concurrency):
+    """Messages per second sent to the emulator."""
+    started = time.time()
+    if concurrency == 1:
+        for _ in range(messages):
+            bot.send_text_message(RECIPIENT_ID, 'Hello world')
+    else:
+        summary = bot.broadcast([RECIPIENT_ID] * messages,
+                                {'text': 'Hello world'},
+                                concurrency=concurrency)
+        assert summary.failed == 0, summary
+    return messages / (time.time() - started)
+
+
+#===============================================================================
+# Runner
+#===============================================================================
+def run(quick=False, log=sys.stderr):
+    results = {}
+
+    def record(name, value, unit, higher_is_better=False, relative=None):
+        results[name] = {'value': round(value, 3), 'unit': unit,
+                         'higher_is_better': higher_is_better}
+        if relative is not None:
+            results[name]['relative'] = round(relative, 5)
+        log.write('{0:<40} {1:12.3f} {2}\n'.format(name, value, unit))
+
+    bot = Bot(ACCESS_TOKEN, app_secret=APP_SECRET)
+    fd, attachment_path = tempfile.mkstemp(suffix='.png')
+    try:
+        os.write(fd, b'\x89PNG\r\n\x1a\n' + b'\x00' * 1024)
+        os.close(fd)
+        micro = (send_helper_benchmarks(bot, attachment_path) +
+                 encoder_benchmarks() + frozen_benchmarks() +
+                 validation_benchmarks() + signature_benchmarks())
+        for name, func in micro:
+            value, relative = measure(func, quick)
+            record('micro.' + name, value, 'us', relative=relative)
+        for name, build in memory_benchmarks():
+            record('memory.' + name, allocated(build) / 1024.0, 'KiB')
+    finally:
+        os.remove(attachment_path)
+
+    with GraphEmulator(latency=E2E_LATENCY) as graph:
+        messages = 100 if quick else 400
+        runs = 1 if quick else E2E_RUNS
+        for concurrency in (1, 8):
+            with Bot(ACCESS_TOKEN, app_secret=APP_SECRET,
+                     pool_maxsize=concurrency) as bot:
+                bot.graph_url = graph.url
+                # Warm up the connections
+                throughput(bot, concurrency, concurrency)
+                record('e2e.send_text_message.concurrency_{0}'.format(
+                    concurrency), statistics.median(
+                        throughput(bot, messages, concurrency)
+                        for _ in range(runs)),
+                    'msg/s', higher_is_better=True)
+
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'cpus': os.cpu_count(),
+            'repeats': 3 if quick else REPEATS,
+            'e2e_runs': 1 if quick else E2E_RUNS,
+            'orjson': orjson is not None,
+            'quick': quick,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        },
+        'results': results,
+    }
+
+
+def compare(results, baseline, threshold):
+    """Output: list of (name, baseline value, value, change) of the
+    results worse than the baseline by more than `threshold`. Timings are
+    compared relatively to the reference workload when both runs have it,
+    so that the machine running slower or faster doesn't move them.
+    """
+    regressions = []
+    for name, result in sorted(results['results'].items()):
+        reference = baseline['results'].get(name)
+        if reference is None or not reference['value']:
+            continue
+        key = 'value'
+        if 'relative' in result and 'relative' in reference:
+            key = 'relative'
+        change = result[key] / reference[key] - 1
+        if result['higher_is_better']:
+            change = -change
+        if change > threshold:
+            regressions.append((name, reference[key], result[key], change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip(),
+                                     formatter_class=argparse.
+                                     RawDescriptionHelpFormatter)
+    parser.add_argument('--output', help="write the results to this file")
+    parser.add_argument('--baseline', help="compare with these results")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="tolerated slowdown, default: 0.25 (25%%)")
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="store the results as the new baseline")
+    parser.add_argument('--add-to-baseline', action='store_true',
+                        help="store the results missing from the baseline")
+    parser.add_argument('--quick', action='store_true',
+                        help="fewer repetitions, for smoke tests")
+    args = parser.parse_args(argv)
+
+    results = run(quick=args.quick)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        return 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    if args.baseline and args.add_to_baseline:
+        for name, result in results['results'].items():
+            baseline['results'].setdefault(name, result)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        return 0
+    if args.baseline:
+        regressions = compare(results, baseline, args.threshold)
+        for name, before, after, change in regressions:
+            sys.stderr.write('REGRESSION {0}: {1} -> {2} ({3:+.0%})\n'.format(
+                name, before, after, change))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
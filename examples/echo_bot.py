@@ -3,13 +3,27 @@ This bot listens to port 5002 for incoming connections from Facebook. It takes
 in any messages that the bot receives and echos it back.
 """
 from flask import Flask, request
-from pymessenger.bot import Bot
+from pymessenger2.bot import Bot
+from pymessenger2.dispatcher import Dispatcher
 
 app = Flask(__name__)
 
 ACCESS_TOKEN = ""
 VERIFY_TOKEN = ""
 bot = Bot(ACCESS_TOKEN)
+dispatcher = Dispatcher()
+
+
+@dispatcher.on('message')
+def echo_text(event):
+    bot.send_text_message(event.sender_id, event.text)
+
+
+@dispatcher.on('attachment')
+def echo_attachments(event):
+    for att in event.attachments:
+        bot.send_attachment_url(event.sender_id, att['type'],
+                                att['payload']['url'])
 
 
 @app.route("/", methods=['GET', 'POST'])
@@ -21,21 +35,7 @@ def hello():
             return 'Invalid verification token'
 
     if request.method == 'POST':
-        output = request.get_json()
-        for event in output['entry']:
-            messaging = event['messaging']
-            for x in messaging:
-                if x.get('message'):
-                    recipient_id = x['sender']['id']
-                    if x['message'].get('text'):
-                        message = x['message']['text']
-                        bot.send_text_message(recipient_id, message)
-                    if x['message'].get('attachments'):
-                        for att in x['message'].get('attachments'):
-                            bot.send_attachment_url(recipient_id, att['type'],
-                                                    att['payload']['url'])
-                else:
-                    pass
+        dispatcher.dispatch(request.get_json())
         return "Success"
 
 
@@ -2,6 +2,7 @@ from .bot import Bot
 
 from .buttons import *
 from .airline import *
+from .validation import QUICK_REPLY_TYPES, invalid
 
 
 @attr.s
@@ -32,8 +33,11 @@ class QuickReply(object):
     image_url = attr.ib(default=None)
 
     def __attrs_post_init__(self):
-        assert self.content_type in {'text', 'location'}
-        assert self.content_type == 'location' or self.title
+        if self.content_type not in QUICK_REPLY_TYPES:
+            raise invalid('content_type', "Content type must be one of "
+                          "{0}.".format(', '.join(sorted(QUICK_REPLY_TYPES))))
+        if self.content_type == 'text' and not self.title:
+            raise invalid('title', "Text quick replies require a title.")
 
         if not self.payload:
             self.payload = self.title
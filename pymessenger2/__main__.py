@@ -0,0 +1,5 @@
+import sys
+
+from pymessenger2.cli import main
+
+sys.exit(main())
@@ -0,0 +1,452 @@
+import asyncio
+import json
+import logging
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from pymessenger2 import utils
+from pymessenger2.cache import MISSING
+from pymessenger2.messenger_profile import diff_configuration
+from pymessenger2.batch import BATCH_LIMIT, Batcher
+from pymessenger2.bot import Bot, NotificationType
+from pymessenger2.broadcast import BroadcastSummary, DEFAULT_CONCURRENCY
+from pymessenger2.exceptions import BatchError
+from pymessenger2.signature import SignatureVerifier
+from pymessenger2.upload import (AttachmentSource, MultipartBody,
+                                 attachment_fields)
+
+logger = logging.getLogger("pymessenger")
+
+
+class _Response(object):
+    """An already read aiohttp response exposing the subset of the
+    requests.Response API used by the Bot response handlers.
+    """
+
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    def json(self):
+        return json.loads(self.content.decode('utf8'))
+
+
+class AsyncBot(Bot):
+    """Asyncio flavour of Bot, sending through a pooled aiohttp session.
+    Every method talking to the Graph API returns an awaitable:
+
+        bot = AsyncBot(<access_token>)
+        await bot.send_text_message(recipient_id, 'hello')
+
+    Payloads are built by the Bot methods themselves, so `do_send=False`
+    still returns the payload right away. With `warm_up=True` the
+    connection is opened when entering `async with bot`.
+    """
+
+    retry_exceptions = ((aiohttp.ClientConnectionError, asyncio.TimeoutError)
+                        if aiohttp is not None else ())
+
+    def __init__(self,
+                 access_token,
+                 limit=100,
+                 limit_per_host=0,
+                 keepalive_timeout=15,
+                 **kwargs):
+        """
+            @required:
+                access_token
+            @optional:
+                limit: max simultaneous connections
+                limit_per_host: max simultaneous connections to the same
+                    host, 0 for no limit
+                keepalive_timeout: seconds an idle connection is kept open
+                session: an aiohttp.ClientSession shared between bots
+                all other Bot arguments
+        """
+        if aiohttp is None:
+            raise ImportError("AsyncBot requires aiohttp: "
+                              "pip install pymessenger2[async]")
+        self._connector_options = {
+            'limit': limit,
+            'limit_per_host': limit_per_host,
+            'keepalive_timeout': keepalive_timeout,
+        }
+        # Bot.__init__ can't await the warm up, see __aenter__
+        self._warm_up = kwargs.pop('warm_up', False)
+        super(AsyncBot, self).__init__(access_token, **kwargs)
+        self._profile_loads = {}
+        self._attachment_uploads = {}
+
+    def _make_session(self, **pool_options):
+        # aiohttp sessions have to be created from within the running loop,
+        # see `_client`.
+        return None
+
+    def _client(self):
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(**self._connector_options))
+        return self.session
+
+    @staticmethod
+    def _unsent(exception):
+        # The connection couldn't be opened, timeouts are ambiguous
+        return isinstance(exception, aiohttp.ClientConnectorError)
+
+    async def warm_up(self):
+        try:
+            await self._request('HEAD', '', params={})
+        except aiohttp.ClientError as e:
+            logger.warning("Graph API warm up failed: %s", e)
+
+    async def close(self):
+        if self._owns_session and self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        if self._warm_up:
+            await self.warm_up()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _request(self, method, path, params=None, **kwargs):
+        if params is None:
+            params = self.auth_args
+        timeout = kwargs.pop('timeout', self.timeout)
+        if timeout is not None:
+            kwargs['timeout'] = aiohttp.ClientTimeout(total=timeout)
+        async with self._client().request(
+                method, '{0}/{1}'.format(self.graph_url, path),
+                params=params, **kwargs) as response:
+            content = await response.read()
+            return _Response(response.status, response.headers, content)
+
+    async def _call(self, method, path, handler=None, tokens=0, retry=True,
+                    **kwargs):
+        hooks = self.instrumentation
+        breaker = self.circuit_breaker
+        attempt = 0
+        while True:
+            attempt += 1
+            if tokens and self.rate_limiter is not None:
+                delay = self.rate_limiter.reserve(self.access_token, tokens)
+                if delay > 0:
+                    if hooks is not None:
+                        hooks.on_throttle(self, path, delay)
+                    await asyncio.sleep(delay)
+            # Entered after throttling, right before the hooks and the
+            # request, and always recorded: a half open probe that is never
+            # recorded would keep the circuit from closing.
+            circuit = None
+            if breaker is not None:
+                circuit = self._circuit_acquire(path)
+            info = None
+            try:
+                if hooks is not None:
+                    info = self._request_info(method, path, attempt, kwargs)
+                response = await self._request(method, path, **kwargs)
+            except asyncio.CancelledError:
+                if circuit is not None:
+                    # Give the half open probe back
+                    self._circuit_record(circuit)
+                raise
+            except self.retry_exceptions as e:
+                if circuit is not None:
+                    self._circuit_record(circuit, failed=True)
+                if info is not None:
+                    self._observe(info, exception=e)
+                delay = None
+                if retry and self._can_resend(method, e):
+                    delay = self._retry_delay(attempt, exception=e)
+                if delay is None:
+                    raise
+            except Exception as e:
+                if circuit is not None:
+                    self._circuit_record(circuit)
+                if info is not None:
+                    self._observe(info, exception=e)
+                raise
+            else:
+                if circuit is not None:
+                    self._circuit_record(circuit, response=response)
+                if info is not None:
+                    self._observe(info, response)
+                delay = self._retry_delay(attempt, response) if retry else None
+                if delay is None:
+                    return (handler or self._handle_json)(response)
+            if info is not None:
+                hooks.on_retry(info, delay)
+            await asyncio.sleep(delay)
+
+    async def broadcast(self,
+                        recipients,
+                        message,
+                        notification_type=None,
+                        concurrency=DEFAULT_CONCURRENCY,
+                        sink=None):
+        """Send the same message to many recipients, `concurrency` at a
+        time, see Bot.broadcast. Recipients are consumed lazily.
+        """
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        summary = BroadcastSummary()
+        recipients = iter(recipients)
+
+        async def worker():
+            # The workers share the iterator of the recipients
+            for recipient_id in recipients:
+                try:
+                    result = await self.send_message(
+                        recipient_id, message, notification_type)
+                except Exception as e:
+                    result = e
+                summary.record(result)
+                if sink is not None:
+                    sink(recipient_id, result)
+
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        return summary
+
+    def batch(self, size=BATCH_LIMIT):
+        """Collect the payloads of the send_* helpers and send them with
+        `send_batch`, see `AsyncBatcher`.
+        """
+        return AsyncBatcher(self, size=size)
+
+    async def send_batch(self, payloads):
+        results = []
+        for chunk in utils.chunks(payloads, BATCH_LIMIT):
+            results.extend(await self._send_batch_chunk(chunk))
+        return self._check_batch(results)
+
+    async def sync_configuration(self, desired, fields=None, dry_run=False):
+        if fields is None:
+            fields = list(desired)
+        current = await self.get_configuration(fields=fields)
+        self._check_configuration(current)
+        diff = diff_configuration(current, desired, fields, self.serializer)
+        if not dry_run:
+            if diff.changed:
+                diff.responses.append(
+                    await self.send_configuration(**diff.changed))
+            if diff.removed:
+                diff.responses.append(
+                    await self.delete_configuration(diff.removed))
+        return diff
+
+    async def _send_tracked(self, payload, recipient_id, action=None):
+        actions = self.sender_actions
+        key = self._sender_key(recipient_id)
+        if action is not None and not actions.acquire(key, action):
+            return {'recipient_id': recipient_id}
+        try:
+            result = await self._post_json('me/messages', payload)
+        except Exception:
+            actions.failed(key, action)
+            raise
+        self._sender_tracked(key, action, result)
+        return result
+
+    def get_user_info(self, recipient_id, fields=None):
+        if self.profile_cache is None:
+            return self._get_user_info(recipient_id, fields)
+        return self._cached_user_info(recipient_id, fields)
+
+    async def _cached_user_info(self, recipient_id, fields):
+        key = self._profile_key(recipient_id, fields)
+        profile = self.profile_cache.get(key, MISSING)
+        if profile is MISSING:
+            load = self._profile_loads.get(key)
+            if load is None:
+                load = asyncio.ensure_future(
+                    self._get_user_info(recipient_id, fields))
+                self._profile_loads[key] = load
+                load.add_done_callback(
+                    lambda load: self._profile_loaded(key, load))
+            else:
+                self.profile_cache.coalesced += 1
+            profile = await asyncio.shield(load)
+        return dict(profile) if profile is not None else None
+
+    def _profile_loaded(self, key, load):
+        del self._profile_loads[key]
+        if not load.cancelled() and load.exception() is None:
+            self.profile_cache.set(key, load.result())
+
+    def send_attachment(self,
+                        recipient_id,
+                        attachment_type,
+                        attachment_path,
+                        notification_type=NotificationType.regular,
+                        do_send=True,
+                        filename=None,
+                        content_type=None,
+                        progress=None):
+        if not do_send:
+            return super(AsyncBot, self).send_attachment(
+                recipient_id, attachment_type, attachment_path,
+                notification_type, do_send=False, filename=filename,
+                content_type=content_type)
+        source = AttachmentSource(attachment_path, filename=filename,
+                                  content_type=content_type)
+        if self.attachment_cache is not None:
+            key = self.attachment_cache.key(attachment_type, attachment_path,
+                                            scope=self.access_token)
+            if key is not None:
+                return self._send_cached_attachment(
+                    recipient_id, attachment_type, source, key,
+                    notification_type, progress)
+        fields = attachment_fields(recipient_id, attachment_type,
+                                   notification_type)
+        return self._post_multipart(
+            'me/messages', MultipartBody(fields, 'filedata', source,
+                                         progress=progress),
+            handler=lambda response: response.json(),
+            tokens=1)
+
+    async def _send_cached_attachment(self, recipient_id, attachment_type,
+                                      source, key, notification_type,
+                                      progress):
+        cache = self.attachment_cache
+        attachment_id = cache.get(key)
+        if attachment_id is None:
+            upload = self._attachment_uploads.get(key)
+            if upload is None:
+                upload = asyncio.ensure_future(
+                    self._upload_attachment(attachment_type, source,
+                                            progress))
+                self._attachment_uploads[key] = upload
+                upload.add_done_callback(
+                    lambda upload: self._attachment_uploaded(key, upload))
+            response = await asyncio.shield(upload)
+            attachment_id = (response or {}).get('attachment_id')
+            if attachment_id is None:
+                # The upload failed: return its error
+                return response
+        else:
+            cache.hits += 1
+        return await self.send_attachment_id(recipient_id, attachment_type,
+                                             attachment_id, notification_type)
+
+    def _attachment_uploaded(self, key, upload):
+        del self._attachment_uploads[key]
+        if not upload.cancelled() and upload.exception() is None:
+            attachment_id = (upload.result() or {}).get('attachment_id')
+            if attachment_id is not None:
+                self.attachment_cache.uploads += 1
+                self.attachment_cache.set(key, attachment_id)
+
+    async def _post_multipart(self, path, body, handler=None, tokens=0):
+        headers = {'Content-Type': body.content_type}
+        if body.size is not None:
+            headers['Content-Length'] = str(body.size)
+        return await self._call('POST', path,
+                                handler=handler,
+                                tokens=tokens,
+                                retry=body.replayable,
+                                data=_AsyncBody(body),
+                                headers=headers)
+
+
+class _AsyncBody(object):
+    """Async iterable over a MultipartBody, for aiohttp to stream it.
+    Files are read in the event loop thread, one chunk at a time.
+    """
+
+    def __init__(self, body):
+        self.body = body
+        self.size = body.size
+
+    async def __aiter__(self):
+        for chunk in self.body:
+            yield chunk
+
+
+class AsyncBatcher(Batcher):
+    """Batcher of an AsyncBot, whose helpers are awaited since they may
+    flush:
+
+        async with bot.batch() as batch:
+            for recipient_id in recipient_ids:
+                await batch.send_text_message(recipient_id, 'Hello!')
+        batch.results
+    """
+
+    async def add(self, payload):
+        self.pending.append(payload)
+        if len(self.pending) >= self.size:
+            await self.flush()
+
+    async def flush(self):
+        pending, self.pending = self.pending, []
+        if not pending:
+            return []
+        try:
+            results = await self.bot.send_batch(pending)
+        except BatchError as e:
+            self.results.extend(e.results)
+            raise
+        self.results.extend(results)
+        return results
+
+    def __enter__(self):
+        raise TypeError("Use async with to batch with an AsyncBot")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            await self.flush()
+
+
+class ASGISignatureMiddleware(object):
+    """ASGI middleware refusing, with a 403, the POST requests whose body
+    doesn't match their X-Hub-Signature(-256), before the application
+    parses it.
+
+        app = ASGISignatureMiddleware(app, <app_secret>)
+
+    The body messages are hashed as they are received, then replayed to
+    the application.
+    """
+
+    def __init__(self, app, app_secret):
+        self.app = app
+        self.verifier = SignatureVerifier(app_secret)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] != 'POST':
+            return await self.app(scope, receive, send)
+        headers = dict(scope['headers'])
+        check = self.verifier.check(headers.get(b'x-hub-signature-256') or
+                                    headers.get(b'x-hub-signature'))
+        messages = []
+        while True:
+            message = await receive()
+            messages.append(message)
+            if message['type'] != 'http.request':
+                break
+            check.update(message.get('body', b''))
+            if not message.get('more_body', False):
+                break
+        if not check.verify():
+            await send({'type': 'http.response.start', 'status': 403,
+                        'headers': [(b'content-type', b'text/plain')]})
+            await send({'type': 'http.response.body',
+                        'body': b'Invalid signature'})
+            return
+
+        async def replay():
+            if messages:
+                return messages.pop(0)
+            return await receive()
+
+        return await self.app(scope, replay, send)
@@ -0,0 +1,191 @@
+import collections
+import hashlib
+import json
+import logging
+import os
+import threading
+
+import six
+
+from pymessenger2.cache import _Load
+
+logger = logging.getLogger("pymessenger")
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+def content_hash(data):
+    """sha256 hex digest of bytes, bytearray or memoryview."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_hash(path, chunk_size=_CHUNK_SIZE):
+    """sha256 hex digest of a file, read by chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class AttachmentCache(object):
+    """Map attachment contents to the attachment_id of their reusable
+    upload, so each file is uploaded once per page:
+
+        bot = Bot(<access_token>,
+                  attachment_cache=AttachmentCache('attachments.jsonl'))
+        bot.send_video(recipient_id, 'promo.mp4')  # uploads
+        bot.send_video(other_recipient_id, 'promo.mp4')  # reuses
+
+    Entries are keyed by attachment type and sha256 of the content, so a
+    renamed or copied file still hits and an edited one doesn't. File
+    digests are remembered by path, size and modification time, so a
+    known file isn't read again. Attachment ids belong to a page: the bots
+    scope their keys by access token, so a cache shared by the bots of a
+    `pool.BotPool` never gives a page the attachment_id of another.
+
+    When `path` is given, entries are appended to it as JSON lines and
+    loaded back on the next start.
+    """
+
+    def __init__(self, path=None, maxsize=10000):
+        """
+            @optional:
+                path: JSON lines file persisting the entries
+                maxsize: max file digests kept, the least recently used
+                    being evicted first
+        """
+        self.path = path
+        self.maxsize = maxsize
+        self._ids = {}
+        self._file_hashes = collections.OrderedDict()
+        self._loads = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.uploads = 0
+        if path is not None and os.path.exists(path):
+            self._load(path)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _load(self, path):
+        with open(path, 'rb+') as f:
+            offset = 0
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # Last line cut by a crash: the next entry appended
+                    # would be merged into it
+                    logger.warning("Truncating the partial last line of "
+                                   "attachment cache %s", path)
+                    f.truncate(offset)
+                    break
+                offset += len(line)
+                try:
+                    entry = json.loads(line.decode('utf8'))
+                except ValueError:
+                    logger.warning("Skipping corrupt attachment cache line "
+                                   "in %s", path)
+                    continue
+                self._ids[entry['key']] = entry['attachment_id']
+
+    def key(self, attachment_type, source, scope=None):
+        """
+        Input:
+            attachment_type: image, video, audio or file
+            source: path of a local file, or the content as a buffer:
+                bytes, bytearray, memoryview or mmap
+            scope: page of the attachment, eg: its access token, stored
+                hashed
+        Output:
+            cache key of the attachment, None for the sources that can't
+            be hashed without consuming them: file objects and iterators
+        """
+        if isinstance(source, six.string_types):
+            digest = self._file_hash(source)
+        else:
+            try:
+                digest = content_hash(memoryview(source))
+            except TypeError:
+                return None
+        key = '{0}:{1}'.format(attachment_type, digest)
+        if scope is None:
+            return key
+        # Don't write the access tokens to the cache file
+        return '{0}:{1}'.format(
+            content_hash(six.text_type(scope).encode('utf8'))[:16], key)
+
+    def _file_hash(self, path):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        signature = (path, stat.st_size, stat.st_mtime)
+        with self._lock:
+            # Python 2 OrderedDict has no move_to_end
+            digest = self._file_hashes.pop(signature, None)
+            if digest is not None:
+                self._file_hashes[signature] = digest
+                return digest
+        digest = file_hash(path)
+        with self._lock:
+            self._file_hashes[signature] = digest
+            while len(self._file_hashes) > self.maxsize:
+                self._file_hashes.popitem(last=False)
+        return digest
+
+    def get(self, key):
+        return self._ids.get(key)
+
+    def set(self, key, attachment_id):
+        with self._lock:
+            self._ids[key] = attachment_id
+            if self.path is not None:
+                with open(self.path, 'a') as f:
+                    f.write(json.dumps({'key': key,
+                                        'attachment_id': attachment_id}) +
+                            '\n')
+
+    def get_or_upload(self, key, upload):
+        """Return the attachment_id of `key`, calling `upload` on a miss.
+        Concurrent misses of the same key wait for a single upload.
+        Input:
+            upload: callable returning the new attachment_id, None if the
+                upload failed
+        """
+        with self._lock:
+            attachment_id = self._ids.get(key)
+            if attachment_id is not None:
+                self.hits += 1
+                return attachment_id
+            load = self._loads.get(key)
+            leader = load is None
+            if leader:
+                load = self._loads[key] = _Load()
+        if not leader:
+            load.done.wait()
+            if load.error is not None:
+                raise load.error
+            return load.value
+        try:
+            load.value = upload()
+        except Exception as e:
+            load.error = e
+            raise
+        else:
+            if load.value is not None:
+                self.uploads += 1
+                self.set(key, load.value)
+        finally:
+            with self._lock:
+                del self._loads[key]
+            load.done.set()
+        return load.value
+
+    def clear(self):
+        with self._lock:
+            self._ids.clear()
+            if self.path is not None and os.path.exists(self.path):
+                os.remove(self.path)
+
+    def stats(self):
+        return {'hits': self.hits, 'uploads': self.uploads,
+                'size': len(self._ids)}
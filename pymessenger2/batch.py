@@ -0,0 +1,96 @@
+import six
+from six.moves.urllib.parse import urlencode
+
+from pymessenger2.exceptions import BatchError
+from pymessenger2.serializer import default_serializer
+
+# Max number of requests in a Graph API batch
+BATCH_LIMIT = 50
+
+
+def batch_request(relative_url, payload, method='POST',
+                  serializer=default_serializer):
+    """Build one request of a Graph API batch.
+    https://developers.facebook.com/docs/graph-api/making-multiple-requests
+    Input:
+        relative_url: path relative to the versioned graph url
+        payload: JSON payload, as given to Bot.send_raw
+        serializer: `serializer.Serializer` encoding the payload fields
+    Output:
+        request as <dict>, the payload being form encoded as Graph expects
+    """
+    if isinstance(payload, bytes):
+        raise TypeError("Prepared payloads can't be batched, "
+                        "send them with Bot.send_raw")
+    body = urlencode([
+        (key, value if isinstance(value, six.string_types) else
+         serializer.dumps_text(value))
+        for key, value in payload.items()
+    ])
+    return {'method': method, 'relative_url': relative_url, 'body': body}
+
+
+class Batcher(object):
+    """Collect message payloads and send them with Graph API batch requests.
+
+        with bot.batch() as batch:
+            for recipient_id in recipient_ids:
+                batch.send_text_message(recipient_id, 'Hello!')
+        batch.results
+
+    Every `send_*` helper of the bot is available and builds its payload
+    with `do_send=False`. Payloads are flushed every `size` payloads, so
+    memory stays bounded, and once more when leaving the `with` block.
+    """
+    # The multipart uploads can't be batched as JSON payloads
+    unbatchable = {'send_attachment', 'send_image', 'send_audio',
+                   'send_video', 'send_file', 'send_raw', 'send_batch',
+                   'send_configuration'}
+
+    def __init__(self, bot, size=BATCH_LIMIT):
+        if not 0 < size <= BATCH_LIMIT:
+            raise ValueError("size must be between 1 and {0}".format(
+                BATCH_LIMIT))
+        self.bot = bot
+        self.size = size
+        self.pending = []
+        self.results = []
+
+    def add(self, payload):
+        self.pending.append(payload)
+        if len(self.pending) >= self.size:
+            self.flush()
+
+    def flush(self):
+        """Send the pending payloads.
+        Output:
+            results of the flushed payloads, see Bot.send_batch
+        """
+        pending, self.pending = self.pending, []
+        if not pending:
+            return []
+        try:
+            results = self.bot.send_batch(pending)
+        except BatchError as e:
+            self.results.extend(e.results)
+            raise
+        self.results.extend(results)
+        return results
+
+    def __getattr__(self, name):
+        if not name.startswith('send_') or name in self.unbatchable:
+            raise AttributeError(name)
+        method = getattr(self.bot, name)
+
+        def add_payload(*args, **kwargs):
+            kwargs['do_send'] = False
+            return self.add(method(*args, **kwargs))
+
+        return add_payload
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
@@ -1,15 +1,25 @@
-import os
 from enum import Enum
 import logging
 
 import six
 import json
+import socket
 import requests
-from requests_toolbelt import MultipartEncoder
+from requests.packages.urllib3.exceptions import ProtocolError
 
 from pymessenger2 import utils
-from pymessenger2.exceptions import OAuthError, FacebookError 
-from pymessenger2.utils import AttrsEncoder
+from pymessenger2.batch import Batcher, BATCH_LIMIT, batch_request
+from pymessenger2.broadcast import Broadcast, DEFAULT_CONCURRENCY
+from pymessenger2.exceptions import BatchError, OAuthError, FacebookError
+from pymessenger2.instrumentation import RequestInfo, endpoint_of, redact
+from pymessenger2.messenger_profile import PROFILE_FIELDS, diff_configuration
+from pymessenger2.prepared import PreparedMessage
+from pymessenger2.retry import parse_retry_after
+from pymessenger2.session import (make_session, DEFAULT_POOL_CONNECTIONS,
+                                  DEFAULT_POOL_MAXSIZE)
+from pymessenger2.serializer import default_serializer
+from pymessenger2.upload import (AttachmentSource, MultipartBody,
+                                 attachment_fields)
 
 logger = logging.getLogger("pymessenger")
 
@@ -23,6 +33,9 @@ class NotificationType(Enum):
 
 
 class Bot(object):
+    # Transport errors retried by the retry policy, see `_can_resend`
+    retry_exceptions = (requests.ConnectionError, requests.Timeout)
+
     def __init__(self,
                  access_token,
                  api_version=DEFAULT_API_VERSION,
@@ -30,13 +43,57 @@ class Bot(object):
                  verification_token=None,
                  raise_exception=False,
                  log_request=False,
-                 log_response=False):
+                 log_response=False,
+                 session=None,
+                 pool_connections=DEFAULT_POOL_CONNECTIONS,
+                 pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 pool_block=False,
+                 keep_alive=True,
+                 warm_up=False,
+                 timeout=None,
+                 rate_limiter=None,
+                 retry_policy=None,
+                 serializer=None,
+                 profile_cache=None,
+                 appsecret_proof=None,
+                 attachment_cache=None,
+                 instrumentation=None,
+                 sender_actions=None,
+                 circuit_breaker=None,
+                 validator=None):
         """
             @required:
                 access_token
             @optional:
                 api_version
                 app_secret
+                session: a session from `session.make_session` (or any
+                    requests.Session) to share between many Bot instances.
+                    When omitted the Bot builds its own from the
+                    `pool_*` and `keep_alive` arguments.
+                warm_up: open a connection to the Graph API right away
+                timeout: requests timeout for every Graph API call
+                rate_limiter: a `ratelimit.RateLimiter` throttling the sends
+                    and the handover calls of this page
+                retry_policy: a `retry.RetryPolicy` retrying the calls
+                    failing for transient reasons
+                serializer: a `serializer.Serializer` encoding the JSON
+                    payloads, defaults to one shared by all bots
+                profile_cache: a `cache.ProfileCache` for get_user_info
+                appsecret_proof: proof of `access_token` computed ahead,
+                    eg: cached by `pool.BotPool`
+                attachment_cache: an `attachments.AttachmentCache` making
+                    send_attachment upload each file once and send its
+                    attachment_id afterwards
+                instrumentation: an `instrumentation.Instrumentation`
+                    called around every Graph API call, eg: Metrics
+                sender_actions: a `sender_actions.SenderActions` dropping
+                    the redundant typing indicators and read receipts
+                circuit_breaker: a `circuit.CircuitBreaker` failing fast,
+                    with CircuitOpenError, the calls to an endpoint that
+                    keeps failing for this page
+                validator: a `validation.Validator` checking the payloads
+                    against the Send API limits before send_raw sends them
         """
         self.api_version = api_version
         self.app_secret = app_secret
@@ -47,12 +104,228 @@ class Bot(object):
         self.raise_exception = raise_exception
         self.log_request = log_request
         self.log_response = log_response
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy
+        self.serializer = serializer or default_serializer
+        self.profile_cache = profile_cache
+        self.appsecret_proof = appsecret_proof
+        self.attachment_cache = attachment_cache
+        self.instrumentation = instrumentation
+        self.sender_actions = sender_actions
+        self.circuit_breaker = circuit_breaker
+        self.validator = validator
+        self._owns_session = session is None
+        if session is None:
+            session = self._make_session(pool_connections=pool_connections,
+                                         pool_maxsize=pool_maxsize,
+                                         pool_block=pool_block,
+                                         keep_alive=keep_alive)
+        self.session = session
+        if warm_up:
+            self.warm_up()
+
+    def _make_session(self, **pool_options):
+        return make_session(**pool_options)
+
+    def warm_up(self):
+        """Pre-connect to the Graph API so the first send skips the TCP and
+        TLS handshake. Failures are logged and ignored.
+        """
+        try:
+            self.session.head(self.graph_url, timeout=self.timeout)
+        except requests.RequestException as e:
+            logger.warning("Graph API warm up failed: %s", e)
+
+    def close(self):
+        """Close the pooled connections, unless the session was given by
+        the caller and may still be in use by other bots.
+        """
+        if self._owns_session:
+            self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _request(self, method, path, params=None, **kwargs):
+        """Perform a Graph API call through the pooled session.
+        Input:
+            method: HTTP method
+            path: path relative to the versioned graph url, eg: me/messages
+            params: query string, defaults to `auth_args`
+        Output:
+            requests.Response
+        """
+        if params is None:
+            params = self.auth_args
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.request(
+            method, '{0}/{1}'.format(self.graph_url, path),
+            params=params, **kwargs)
+
+    def _call(self, method, path, handler=None, tokens=0, retry=True,
+              **kwargs):
+        """Perform a Graph API call and turn its response into a result.
+        Every Graph API call goes through here, so subclasses replacing the
+        transport (see `pymessenger2.aio.AsyncBot`) only override this.
+        Input:
+            handler: callable receiving the response, defaults to
+                `_handle_json`
+            tokens: number of messages sent, consumed from the rate limiter
+            retry: whether the retry policy applies, ie: the request body
+                can be sent again
+            kwargs: passed to `_request`
+        Output:
+            handler result
+        """
+        hooks = self.instrumentation
+        breaker = self.circuit_breaker
+        attempt = 0
+        while True:
+            attempt += 1
+            if tokens and self.rate_limiter is not None:
+                waited = self.rate_limiter.acquire(self.access_token, tokens)
+                if waited > 0 and hooks is not None:
+                    hooks.on_throttle(self, path, waited)
+            # Entered after throttling, right before the hooks and the
+            # request, and always recorded: a half open probe that is never
+            # recorded would keep the circuit from closing.
+            circuit = None
+            if breaker is not None:
+                circuit = self._circuit_acquire(path)
+            info = None
+            try:
+                if hooks is not None:
+                    info = self._request_info(method, path, attempt, kwargs)
+                response = self._request(method, path, **kwargs)
+            except self.retry_exceptions as e:
+                if circuit is not None:
+                    self._circuit_record(circuit, failed=True)
+                if info is not None:
+                    self._observe(info, exception=e)
+                delay = None
+                if retry and self._can_resend(method, e):
+                    delay = self._retry_delay(attempt, exception=e)
+                if delay is None:
+                    raise
+            except Exception as e:
+                if circuit is not None:
+                    self._circuit_record(circuit)
+                if info is not None:
+                    self._observe(info, exception=e)
+                raise
+            else:
+                if circuit is not None:
+                    self._circuit_record(circuit, response=response)
+                if info is not None:
+                    self._observe(info, response)
+                delay = self._retry_delay(attempt, response) if retry else None
+                if delay is None:
+                    return (handler or self._handle_json)(response)
+            if info is not None:
+                hooks.on_retry(info, delay)
+            self.retry_policy.sleep(delay)
+
+    def _circuit_acquire(self, path):
+        """Enter the circuit of the call, or raise CircuitOpenError."""
+        key = (endpoint_of(path), self.access_token)
+        self.circuit_breaker.acquire(key, self._circuit_listener())
+        return key
+
+    def _circuit_record(self, key, failed=None, response=None):
+        if response is not None:
+            failed = (response.status_code >= 400 and
+                      self.circuit_breaker.is_failure(
+                          response.status_code,
+                          self._response_error_params(response)))
+        self.circuit_breaker.record(key, failed, self._circuit_listener())
+
+    def _circuit_listener(self):
+        if self.instrumentation is None:
+            return None
+        return self._circuit_changed
+
+    def _circuit_changed(self, key, old_state, new_state):
+        self.instrumentation.on_circuit_change(self, key[0], old_state,
+                                               new_state)
+
+    def _request_info(self, method, path, attempt, kwargs):
+        """Describe an attempt to the instrumentation, then announce it."""
+        info = RequestInfo(self, method, path,
+                           kwargs.get('params') or self.auth_args, attempt,
+                           kwargs.get('data'))
+        self.instrumentation.before_request(info)
+        return info
+
+    def _observe(self, info, response=None, exception=None):
+        info.finish(response, exception)
+        self.instrumentation.after_request(info)
+
+    def _can_resend(self, method, exception):
+        """Whether a call failing with a transport error can be sent again.
+        GETs can, the other calls only when the request never reached
+        Graph: a message it may already have accepted would be delivered
+        twice.
+        """
+        return method == 'GET' or self._unsent(exception)
+
+    @staticmethod
+    def _unsent(exception):
+        if isinstance(exception, requests.ConnectTimeout):
+            return True
+        if not isinstance(exception, requests.ConnectionError):
+            return False
+        # requests wraps the connection lost after the request was written
+        # in a ConnectionError too, only their cause tells them apart
+        cause = exception.args[0] if exception.args else None
+        cause = getattr(cause, 'reason', cause)
+        return not isinstance(cause, (ProtocolError, socket.error))
+
+    def _retry_delay(self, attempt, response=None, exception=None):
+        """Seconds to wait before retrying a failed call, None if the call
+        should not be retried.
+        """
+        policy = self.retry_policy
+        if policy is None or attempt >= policy.max_attempts:
+            return None
+        if exception is not None:
+            if not policy.retry_connection_errors:
+                return None
+            logger.info("Retrying Graph API call after %r", exception)
+            return policy.delay(attempt)
+        if response.status_code < 400:
+            return None
+        error_params = self._response_error_params(response)
+        if not policy.is_retriable(response.status_code, error_params):
+            return None
+        logger.info("Retrying Graph API call after error %s",
+                    error_params or response.status_code)
+        return policy.delay(
+            attempt, parse_retry_after(response.headers.get('Retry-After')))
+
+    def _response_error_params(self, response):
+        """Error fields of a failed response, None if it has none."""
+        try:
+            data = response.json()
+        except ValueError:
+            return None
+        if type(data) is dict and ('error' in data or 'error_msg' in data):
+            return self._get_error_params(data)
+        return None
+
+    def _handle_json(self, response):
+        return self._handle_response(response.json())
 
     @property
     def auth_args(self):
         if not hasattr(self, '_auth_args'):
             auth = {'access_token': self.access_token}
-            if self.app_secret is not None:
+            if self.appsecret_proof is not None:
+                auth['appsecret_proof'] = self.appsecret_proof
+            elif self.app_secret is not None:
                 appsecret_proof = utils.generate_appsecret_proof(
                     self.access_token, self.app_secret)
                 auth['appsecret_proof'] = appsecret_proof
@@ -134,17 +407,18 @@ class Bot(object):
         if self.log_request:
             print("request to {0}: \n headers :{1}\n data: {2} "
                   "".format(request_endpoint,
-                            self.auth_args,
-                            request_data))
-        response = requests.post(
-            request_endpoint,
-            params=self.auth_args,
-            json=payload
-        )
+                            redact(self.auth_args),
+                            payload))
+        return self._call('POST', 'me/messenger_profile',
+                          handler=self._handle_configuration_response,
+                          json=payload)
+
+    def _handle_configuration_response(self, response):
         result = response.json()
         error = result.get('error',{})
         if error:
-            print("Error! : {0}".format(error.get("message",'Facebook Error')))
+            logger.warning("Error! : %s",
+                           error.get("message", 'Facebook Error'))
         if self.log_response:
             print("result : {0}".format(result))
         return result
@@ -154,10 +428,9 @@ class Bot(object):
         https://developers.facebook.com/docs/messenger-platform/reference/messenger-profile-api
         """
         if not fields:
-            fields = ['account_linking_url','persistent_menu','get_started',
-                      'greeting','whitelisted_domains','payment_settings',
-                      'target_audience','home_url']
-        params = self.auth_args
+            fields = PROFILE_FIELDS
+        # auth_args is shared by every call of the bot: copy it
+        params = dict(self.auth_args)
         params.update({
             'fields':",".join(list(fields))
         })
@@ -165,15 +438,57 @@ class Bot(object):
         if self.log_request:
             print("request to {0}: \n headers :{1}\n data: {2} "
                   "".format(request_endpoint,
-                            self.auth_args,
-                            request_data))
-        response = requests.get(
-            request_endpoint,
-            params=params,
-            #json=payload
-        )
-        result = response.json()
-        return result
+                            redact(self.auth_args),
+                            redact(params)))
+        return self._call('GET', 'me/messenger_profile',
+                          handler=lambda response: response.json(),
+                          params=params)
+
+    def delete_configuration(self, fields):
+        """ Delete Messenger profile properties
+        https://developers.facebook.com/docs/messenger-platform/reference/messenger-profile-api#delete
+        """
+        return self._call('DELETE', 'me/messenger_profile',
+                          handler=self._handle_configuration_response,
+                          json={'fields': list(fields)})
+
+    def sync_configuration(self, desired, fields=None, dry_run=False):
+        """ Make the Messenger profile match `desired`, sending only what
+        changed: one GET, then at most one POST with the changed fields
+        and one DELETE with the removed ones.
+        Input:
+            desired: <dict> of field to value, eg: {'greeting': [...]};
+                a None value removes the field
+            fields: fields managed, the ones missing from `desired` are
+                removed; defaults to the fields in `desired`
+            dry_run: only compute the differences
+        Output:
+            ConfigurationDiff, with the API responses in `responses`
+        Raises the FacebookError, or OAuthError, of a failed read of the
+        profile, without sending anything.
+        """
+        if fields is None:
+            fields = list(desired)
+        current = self.get_configuration(fields=fields)
+        self._check_configuration(current)
+        diff = diff_configuration(current, desired, fields, self.serializer)
+        if not dry_run:
+            if diff.changed:
+                diff.responses.append(self.send_configuration(**diff.changed))
+            if diff.removed:
+                diff.responses.append(self.delete_configuration(diff.removed))
+        return diff
+
+    def _check_configuration(self, current):
+        """Raise the error of a failed get_configuration: diffing it as an
+        empty profile would send every field again and delete none.
+        """
+        error = self._response_error(current)
+        if error is None and type(current) is not dict:
+            error = FacebookError(message="Unexpected Messenger profile "
+                                          "response {0!r}".format(current))
+        if error is not None:
+            raise error
 
     #===========================================================================
     # Section - Profile Data - 
@@ -187,14 +502,30 @@ class Bot(object):
         Output:
           Response from API as <dict>
         """
+        if self.profile_cache is None:
+            return self._get_user_info(recipient_id, fields)
+        profile = self.profile_cache.get_or_load(
+            self._profile_key(recipient_id, fields),
+            lambda: self._get_user_info(recipient_id, fields))
+        # The cached profile is shared between callers
+        return dict(profile) if profile is not None else None
+
+    def _profile_key(self, recipient_id, fields):
+        return (self.access_token, str(recipient_id),
+                tuple(fields) if fields else None)
+
+    def _get_user_info(self, recipient_id, fields=None):
         params = {}
         if fields is not None and isinstance(fields, (list, tuple)):
             params['fields'] = ",".join(fields)
 
         params.update(self.auth_args)
 
-        request_endpoint = '{0}/{1}'.format(self.graph_url, recipient_id)
-        response = requests.get(request_endpoint, params=params)
+        return self._call('GET', str(recipient_id),
+                          handler=self._handle_user_info_response,
+                          params=params)
+
+    def _handle_user_info_response(self, response):
         if response.status_code == 200:
             return response.json()
 
@@ -221,58 +552,197 @@ class Bot(object):
     def send_message(self,
                      recipient_id,
                      message,
-                     notification_type=NotificationType.regular,
+                     notification_type=None,
                      do_send=True):
+        """Send a message to the specified recipient.
+        Input:
+            recipient_id: recipient id to send to
+            message: message to send, as <dict> or `PreparedMessage`
+            notification_type: defaults to the one of the PreparedMessage,
+                or to NotificationType.regular
+        Output:
+            Response from API as <dict>
+        """
+        if isinstance(message, PreparedMessage):
+            if self.validator is not None:
+                message.validate(self.validator)
+            payload = message.for_recipient(recipient_id, notification_type)
+            if not do_send:
+                return payload
+            if self.sender_actions is not None:
+                return self._send_tracked(payload, recipient_id)
+            return self.send_raw(payload)
+        if notification_type is None:
+            notification_type = NotificationType.regular
         return self.send_recipient(recipient_id, {'message': message},
                                    notification_type,
                                    do_send=do_send)
 
+    def broadcast(self,
+                  recipients,
+                  message,
+                  notification_type=None,
+                  concurrency=DEFAULT_CONCURRENCY,
+                  sink=None):
+        """Send the same message to many recipients in parallel.
+        Recipients are consumed lazily, see `pymessenger2.broadcast.Broadcast`
+        to stream the results instead.
+        Input:
+            recipients: iterable of recipient ids, eg: a generator
+            message: message to send
+            notification_type: as for send_message
+            concurrency: number of sending threads
+            sink: callable receiving (recipient_id, result) for every
+                recipient, result being the response from API or the
+                raised exception
+        Output:
+            BroadcastSummary with the sent/failed counts by error code
+        """
+        return Broadcast(self, recipients, message,
+                         notification_type=notification_type,
+                         concurrency=concurrency,
+                         sink=sink).run()
+
     def send_attachment(self,
                         recipient_id,
                         attachment_type,
                         attachment_path,
                         notification_type=NotificationType.regular,
-                        do_send=True):
-        """Send an attachment to the specified recipient using local path.
+                        do_send=True,
+                        filename=None,
+                        content_type=None,
+                        progress=None):
+        """Send an attachment to the specified recipient, streaming its
+        content.
         Input:
             recipient_id: recipient id to send to
             attachment_type: type of attachment (image, video, audio, file)
-            attachment_path: Path of attachment
+            attachment_path: Path of attachment, or its content as a
+                binary file object, bytes, bytearray, memoryview, mmap or
+                iterable of bytes chunks
+            filename: name of the attachment, defaults to the basename of
+                the path
+            content_type: MIME type, guessed from the filename and the
+                content when omitted
+            progress: callable receiving an `upload.UploadProgress` after
+                every chunk sent and when the upload is complete
         Output:
             Response from API as <dict>
         """
-        with open(attachment_path, 'rb') as f:
-            attachment_filename = os.path.basename(attachment_path)
-            if attachment_type != 'file':
-                attachment_ext = attachment_filename.split('.')[1]
-                content_type = attachment_type + '/' + attachment_ext # eg: audio/mp3
-            else:
-                content_type = ''
-            payload = {
-                'recipient': json.dumps({
-                    'id': recipient_id
-                }),
-                'notification_type': notification_type.value,
-                'message': json.dumps({
-                    'attachment': {
-                        'type': attachment_type,
-                        'payload': {}
+        source = AttachmentSource(attachment_path, filename=filename,
+                                  content_type=content_type)
+        if do_send and self.attachment_cache is not None:
+            key = self.attachment_cache.key(attachment_type, attachment_path,
+                                            scope=self.access_token)
+            if key is not None:
+                return self._send_cached_attachment(
+                    recipient_id, attachment_type, source, key,
+                    notification_type, progress)
+        fields = attachment_fields(recipient_id, attachment_type,
+                                   notification_type)
+        if do_send:
+            return self._post_multipart(
+                'me/messages', MultipartBody(fields, 'filedata', source,
+                                             progress=progress),
+                handler=lambda response: response.json(),
+                tokens=1)
+        fields['filedata'] = (source.filename, attachment_path,
+                              source.content_type)
+        return fields
+
+    def _send_cached_attachment(self, recipient_id, attachment_type,
+                                source, key, notification_type, progress):
+        responses = []
+
+        def upload():
+            response = self._upload_attachment(attachment_type, source,
+                                               progress)
+            responses.append(response)
+            return (response or {}).get('attachment_id')
+
+        attachment_id = self.attachment_cache.get_or_upload(key, upload)
+        if attachment_id is None:
+            # The upload failed: return its error
+            return responses[0] if responses else None
+        return self.send_attachment_id(recipient_id, attachment_type,
+                                       attachment_id, notification_type)
+
+    def upload_attachment(self, attachment_type, attachment_path,
+                          filename=None, content_type=None, progress=None):
+        """Upload a reusable attachment, to be sent with send_attachment_id.
+        https://developers.facebook.com/docs/messenger-platform/reference/attachment-upload-api
+        Input:
+            attachment_type: type of attachment (image, video, audio, file)
+            attachment_path: Path of attachment, or its content, see
+                send_attachment
+        Output:
+            Response from API as <dict>, eg: {'attachment_id': '1857777774821032'}
+        """
+        source = AttachmentSource(attachment_path, filename=filename,
+                                  content_type=content_type)
+        return self._upload_attachment(attachment_type, source, progress)
+
+    def _upload_attachment(self, attachment_type, source, progress=None):
+        fields = attachment_fields(None, attachment_type, reusable=True)
+        return self._post_multipart(
+            'me/message_attachments',
+            MultipartBody(fields, 'filedata', source, progress=progress))
+
+    def upload_attachment_url(self, attachment_type, attachment_url):
+        """Upload a reusable attachment from a URL.
+        Output:
+            Response from API as <dict>, eg: {'attachment_id': '1857777774821032'}
+        """
+        return self._post_json('me/message_attachments', {
+            'message': {
+                'attachment': {
+                    'type': attachment_type,
+                    'payload': {
+                        'url': attachment_url,
+                        'is_reusable': True
                     }
-                }),
-                'filedata':
-                (attachment_filename, f, content_type)
+                }
             }
-            if do_send:
-                multipart_data = MultipartEncoder(payload)
-                multipart_header = {'Content-Type': multipart_data.content_type}
-                request_endpoint = '{0}/me/messages'.format(self.graph_url)
-                return requests.post(
-                    request_endpoint,
-                    data=multipart_data,
-                    params=self.auth_args,
-                    headers=multipart_header).json()
-            else:
-                return payload
+        }, tokens=0)
+
+    def send_attachment_id(self,
+                           recipient_id,
+                           attachment_type,
+                           attachment_id,
+                           notification_type=NotificationType.regular,
+                           do_send=True):
+        """Send an attachment uploaded beforehand.
+        Input:
+            recipient_id: recipient id to send to
+            attachment_type: type of attachment (image, video, audio, file)
+            attachment_id: id returned by upload_attachment
+        Output:
+            Response from API as <dict>
+        """
+        return self.send_message(recipient_id, {
+            'attachment': {
+                'type': attachment_type,
+                'payload': {
+                    'attachment_id': attachment_id
+                }
+            }
+        }, notification_type, do_send=do_send)
+
+    def _post_multipart(self, path, body, handler=None, tokens=0):
+        """POST a `upload.MultipartBody`, streamed chunk by chunk."""
+        response = self._call(
+            'POST', path,
+            handler=handler,
+            tokens=tokens,
+            # non seekable sources can't be sent twice
+            retry=body.replayable,
+            data=body.stream(),
+            headers={'Content-Type': body.content_type})
+        progress = body.last_progress
+        if progress is not None and progress.done:
+            logger.debug("Uploaded %s bytes to %s in %.3fs",
+                         progress.sent, path, progress.elapsed)
+        return response
 
     def send_attachment_url(self,
                             recipient_id,
@@ -549,48 +1019,180 @@ class Bot(object):
         return error_params
     
     def send_raw(self, payload):
-        """
+        """Send a payload to /me/messages.
+        Input:
+            payload: payload as <dict>, or its wire <bytes> as made by
+                `PreparedMessage.for_recipient`
+        Output:
+            Response from API as <dict>
+        Raises ValidationError when the bot has a strict `validator` and
+        the payload <dict> breaks the Send API limits. Wire bytes aren't
+        checked: send_message checks a PreparedMessage once for all its
+        recipients.
+
         @TODO Myabe Use facepy.graph_api.GraphAPI for exceptions handler and other shortcuts, 
               and to have an always update service.. if so `auth_args` will be unuseful
         """
-        request_endpoint = '{0}/me/messages'.format(self.graph_url)
         #=======================================================================
         # if FACEPY_ENABLED:
         #     from facepy.graph_api import GraphAPI
         #     graph = GraphAPI(self.access_token,appsecret=self.app_secret)
         #     request_data = graph.post(request_endpoint, payload)
         #=======================================================================
-        request_data = json.dumps(payload, cls=AttrsEncoder)
+        if self.validator is not None and type(payload) is dict:
+            self.validator.validate(payload)
+        if self.sender_actions is not None:
+            # Wire bytes, eg: of the outbox, are tracked the same
+            fields = (payload if type(payload) is dict else
+                      json.loads(payload.decode('utf8')))
+            recipient_id = (fields.get('recipient') or {}).get('id')
+            if recipient_id is not None:
+                return self._send_tracked(payload, recipient_id,
+                                          fields.get('sender_action'))
+        return self._post_json('me/messages', payload)
+
+    def _sender_key(self, recipient_id):
+        return (self.access_token, str(recipient_id))
+
+    def _send_tracked(self, payload, recipient_id, action=None):
+        """send_raw through the sender actions tracking, see
+        `sender_actions.SenderActions`.
+        Input:
+            action: sender_action of the payload, None for a message
+        """
+        actions = self.sender_actions
+        key = self._sender_key(recipient_id)
+        if action is not None and not actions.acquire(key, action):
+            return {'recipient_id': recipient_id}
+        try:
+            result = self._post_json('me/messages', payload)
+        except Exception:
+            actions.failed(key, action)
+            raise
+        self._sender_tracked(key, action, result)
+        return result
+
+    def _sender_tracked(self, key, action, result):
+        if type(result) is not dict or 'error' in result:
+            self.sender_actions.failed(key, action)
+        elif action is None:
+            self.sender_actions.message_sent(key)
+
+    def _post_json(self, path, payload, tokens=1):
+        """POST a JSON payload to the Graph API and handle its response."""
+        if isinstance(payload, bytes):
+            request_data = payload
+        else:
+            request_data = self.serializer.dumps(payload)
         if self.log_request:
-            print("request to {0}: \n headers :{1}\n data: {2} "
-                  "".format(request_endpoint,
-                            self.auth_args,
-                            request_data))
-        response = requests.post(
-            request_endpoint,
-            params=self.auth_args,
-            data=json.dumps(payload, cls=AttrsEncoder),
+            print("request to {0}/{1}: \n headers :{2}\n data: {3} "
+                  "".format(self.graph_url, path,
+                            redact(self.auth_args),
+                            request_data.decode('utf8')))
+        return self._call(
+            'POST', path,
+            tokens=tokens,
+            data=request_data,
             headers={'Content-Type': 'application/json'})
-        data = response.json()
+
+    def _handle_response(self, data):
         if self.raise_exception:
             #ERROR Raise
-            if type(data) is dict:
-                if 'error' in data:
-                    error = data['error']
-                    print("error: {0}".format(error))
-                    if error.get('type') == "OAuthException":
-                        raise OAuthError(**self._get_error_params(data))
-                    else:
-                        raise FacebookError(**self._get_error_params(data))
-                # Facebook occasionally reports errors in its legacy error format.
-                if 'error_msg' in data:
-                    error_msg = data['error_msg']
-                    print("error_msg: {0}".format(error_msg))
-                    raise FacebookError(**self._get_error_params(data))
+            error = self._response_error(data)
+            if error is not None:
+                raise error
             if self.log_response:
                 print("response data: {0}".format(data))
         return data
 
+    def _response_error(self, data):
+        """Return the FacebookError reported by a response, or None."""
+        if type(data) is dict:
+            if 'error' in data:
+                error = data['error']
+                logger.warning("error: %s", error)
+                if error.get('type') == "OAuthException":
+                    return OAuthError(**self._get_error_params(data))
+                else:
+                    return FacebookError(**self._get_error_params(data))
+            # Facebook occasionally reports errors in its legacy error format.
+            if 'error_msg' in data:
+                error_msg = data['error_msg']
+                logger.warning("error_msg: %s", error_msg)
+                return FacebookError(**self._get_error_params(data))
+        return None
+
+    #===========================================================================
+    # Section - Batch Requests -
+    # https://developers.facebook.com/docs/graph-api/making-multiple-requests
+    #===========================================================================
+    def send_batch(self, payloads):
+        """Send many payloads to /me/messages using Graph API batch
+        requests, BATCH_LIMIT payloads per HTTP call.
+        Input:
+            payloads: iterable of payloads, eg: built with do_send=False
+        Output:
+            list with the response from API as <dict> for every payload
+        With raise_exception, raises BatchError once every payload has been
+        sent if some failed, a refused batch failing all of its payloads:
+        its `results` give the FacebookError/OAuthError of the failed
+        payloads, so one failure does not hide the results of the others.
+        Raises ValidationError when the bot has a strict `validator` and a
+        payload breaks the Send API limits, before its chunk is sent.
+        """
+        results = []
+        for chunk in utils.chunks(payloads, BATCH_LIMIT):
+            results.extend(self._send_batch_chunk(chunk))
+        return self._check_batch(results)
+
+    def _check_batch(self, results):
+        if self.raise_exception and any(
+                isinstance(result, FacebookError) for result in results):
+            raise BatchError(results)
+        return results
+
+    def batch(self, size=BATCH_LIMIT):
+        """Collect the payloads of the send_* helpers and send them with
+        `send_batch`, see `pymessenger2.batch.Batcher`.
+        """
+        return Batcher(self, size=size)
+
+    def _send_batch_chunk(self, payloads):
+        if self.validator is not None:
+            for payload in payloads:
+                if type(payload) is dict:
+                    self.validator.validate(payload)
+        requests_data = [batch_request('me/messages', payload,
+                                       serializer=self.serializer)
+                         for payload in payloads]
+        return self._call(
+            'POST', '',
+            handler=lambda response: self._handle_batch_response(
+                response, len(payloads)),
+            tokens=len(payloads),
+            data={'batch': self.serializer.dumps_text(requests_data)})
+
+    def _handle_batch_response(self, response, size):
+        data = response.json()
+        if type(data) is not list:
+            # The whole batch has been refused, eg: invalid token
+            if self.raise_exception:
+                data = self._response_error(data) or data
+            return [data] * size
+        results = []
+        for item in data:
+            if item is None:
+                # Graph does not run the remaining requests of a batch
+                # taking too long
+                result = {'error': {'message': 'Batch request timed out',
+                                    'is_transient': True}}
+            else:
+                result = json.loads(item['body'])
+            if self.raise_exception:
+                result = self._response_error(result) or result
+            results.append(result)
+        return results
+
     def _send_payload(self, payload):
         """ Deprecated, use send_raw instead """
         return self.send_raw(payload)
@@ -620,43 +1222,13 @@ class Bot(object):
         @TODO Maybe Use facepy.graph_api.GraphAPI for exceptions handler and other shortcuts,
               and to have an always update service.. if so `auth_args` will be unuseful
         """
-        request_endpoint = '{0}/me/pass_thread_control'.format(self.graph_url)
         #=======================================================================
         # if FACEPY_ENABLED:
         #     from facepy.graph_api import GraphAPI
         #     graph = GraphAPI(self.access_token,appsecret=self.app_secret)
         #     request_data = graph.post(request_endpoint, payload)
         #=======================================================================
-        request_data = json.dumps(payload, cls=AttrsEncoder)
-        if self.log_request:
-            print("request to {0}: \n headers :{1}\n data: {2} "
-                  "".format(request_endpoint,
-                            self.auth_args,
-                            request_data))
-        response = requests.post(
-            request_endpoint,
-            params=self.auth_args,
-            data=json.dumps(payload, cls=AttrsEncoder),
-            headers={'Content-Type': 'application/json'})
-        data = response.json()
-        if self.raise_exception:
-            #ERROR Raise
-            if type(data) is dict:
-                if 'error' in data:
-                    error = data['error']
-                    print("error: {0}".format(error))
-                    if error.get('type') == "OAuthException":
-                        raise OAuthError(**self._get_error_params(data))
-                    else:
-                        raise FacebookError(**self._get_error_params(data))
-                # Facebook occasionally reports errors in its legacy error format.
-                if 'error_msg' in data:
-                    error_msg = data['error_msg']
-                    print("error_msg: {0}".format(error_msg))
-                    raise FacebookError(**self._get_error_params(data))
-            if self.log_response:
-                print("response data: {0}".format(data))
-        return data
+        return self._post_json('me/pass_thread_control', payload)
 
     def take_thread_control(self, recipient_id, message=""):
         """
@@ -675,40 +1247,10 @@ class Bot(object):
         @TODO Myabe Use facepy.graph_api.GraphAPI for exceptions handler and other shortcuts,
               and to have an always update service.. if so `auth_args` will be unuseful
         """
-        request_endpoint = '{0}/me/take_thread_control'.format(self.graph_url)
         #=======================================================================
         # if FACEPY_ENABLED:
         #     from facepy.graph_api import GraphAPI
         #     graph = GraphAPI(self.access_token,appsecret=self.app_secret)
         #     request_data = graph.post(request_endpoint, payload)
         #=======================================================================
-        request_data = json.dumps(payload, cls=AttrsEncoder)
-        if self.log_request:
-            print("request to {0}: \n headers :{1}\n data: {2} "
-                  "".format(request_endpoint,
-                            self.auth_args,
-                            request_data))
-        response = requests.post(
-            request_endpoint,
-            params=self.auth_args,
-            data=json.dumps(payload, cls=AttrsEncoder),
-            headers={'Content-Type': 'application/json'})
-        data = response.json()
-        if self.raise_exception:
-            #ERROR Raise
-            if type(data) is dict:
-                if 'error' in data:
-                    error = data['error']
-                    print("error: {0}".format(error))
-                    if error.get('type') == "OAuthException":
-                        raise OAuthError(**self._get_error_params(data))
-                    else:
-                        raise FacebookError(**self._get_error_params(data))
-                # Facebook occasionally reports errors in its legacy error format.
-                if 'error_msg' in data:
-                    error_msg = data['error_msg']
-                    print("error_msg: {0}".format(error_msg))
-                    raise FacebookError(**self._get_error_params(data))
-            if self.log_response:
-                print("response data: {0}".format(data))
-        return data
\ No newline at end of file
+        return self._post_json('me/take_thread_control', payload)
@@ -0,0 +1,180 @@
+import collections
+import threading
+
+from six.moves import queue
+
+DEFAULT_CONCURRENCY = 10
+
+_DONE = object()
+
+
+class BroadcastSummary(object):
+    """Aggregate counts of a broadcast.
+    `errors` maps the Graph error code (or the exception class name for
+    errors raised before reaching Graph) to its number of occurrences.
+    """
+
+    def __init__(self):
+        self.sent = 0
+        self.failed = 0
+        self.errors = collections.Counter()
+
+    @property
+    def total(self):
+        return self.sent + self.failed
+
+    def record(self, result):
+        error_code = result_error_code(result)
+        if error_code is None:
+            self.sent += 1
+        else:
+            self.failed += 1
+            self.errors[error_code] += 1
+
+    def as_dict(self):
+        return {'sent': self.sent, 'failed': self.failed,
+                'errors': dict(self.errors)}
+
+    def __repr__(self):
+        return 'BroadcastSummary(sent={0}, failed={1}, errors={2})'.format(
+            self.sent, self.failed, dict(self.errors))
+
+
+def result_error_code(result):
+    """Return the error code of a send result, or None if it succeeded.
+    Input:
+        result: response from API as <dict>, or the raised exception
+    """
+    if isinstance(result, Exception):
+        return getattr(result, 'code', None) or type(result).__name__
+    if not isinstance(result, dict):
+        return 'empty_response'
+    if 'error' in result:
+        return result['error'].get('code') or 'unknown'
+    if 'error_msg' in result:
+        return result.get('error_code') or 'unknown'
+    return None
+
+
+def imap_unordered(func, iterable, concurrency=DEFAULT_CONCURRENCY):
+    """Call `func` on every item of `iterable` from `concurrency` threads.
+    Items are pulled lazily and results go through a bounded queue, so
+    memory stays bounded whatever the size of `iterable`.
+    Output:
+        iterator of (item, result) in completion order, result being the
+        exception raised by `func` if it failed
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+    items = iter(iterable)
+    items_lock = threading.Lock()
+    results = queue.Queue(maxsize=concurrency * 2)
+    stop = threading.Event()
+    failures = []
+
+    def worker():
+        try:
+            while not stop.is_set():
+                with items_lock:
+                    item = next(items, _DONE)
+                if item is _DONE:
+                    break
+                try:
+                    result = func(item)
+                except Exception as e:
+                    result = e
+                results.put((item, result))
+        except Exception as e:
+            # The iterable itself failed
+            failures.append(e)
+            stop.set()
+        finally:
+            results.put(_DONE)
+
+    for _ in range(concurrency):
+        thread = threading.Thread(target=worker)
+        thread.daemon = True
+        thread.start()
+
+    running = concurrency
+    try:
+        while running:
+            item = results.get()
+            if item is _DONE:
+                running -= 1
+                continue
+            yield item
+    finally:
+        # Iteration stopped early: let the workers finish their current
+        # call and leave.
+        stop.set()
+        while running:
+            if results.get() is _DONE:
+                running -= 1
+    if failures:
+        raise failures[0]
+
+
+class Broadcast(object):
+    """Send the same message to many recipients on a bounded thread pool.
+    Recipients are pulled lazily from any iterable, so generators over
+    millions of ids never get loaded in memory. Iterating a Broadcast
+    streams `(recipient_id, result)` pairs in completion order, the result
+    being the response from API or the raised exception:
+
+        broadcast = Broadcast(bot, recipient_ids, {'text': 'Hello!'})
+        for recipient_id, result in broadcast:
+            ...
+        broadcast.summary
+
+    Use `run()` to only get the summary, passing a `sink` to record every
+    result.
+    """
+
+    def __init__(self, bot, recipients, message,
+                 notification_type=None,
+                 concurrency=DEFAULT_CONCURRENCY,
+                 sink=None,
+                 send=None):
+        """
+            @required:
+                bot
+                recipients: iterable of recipient ids
+                message: message to send, as given to Bot.send_message
+            @optional:
+                notification_type
+                concurrency: number of sending threads
+                sink: callable receiving (recipient_id, result) for every
+                    recipient
+                send: callable sending to one recipient, defaults to
+                    Bot.send_message with `message`
+        """
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        self.bot = bot
+        self.recipients = recipients
+        self.message = message
+        self.notification_type = notification_type
+        self.concurrency = concurrency
+        self.sink = sink
+        self.send = send or self._send_message
+        self.summary = BroadcastSummary()
+
+    def _send_message(self, recipient_id):
+        if self.notification_type is None:
+            return self.bot.send_message(recipient_id, self.message)
+        return self.bot.send_message(recipient_id, self.message,
+                                     self.notification_type)
+
+    def run(self):
+        for _ in self:
+            pass
+        return self.summary
+
+    def __iter__(self):
+        for recipient_id, result in imap_unordered(
+                self.send, self.recipients, self.concurrency):
+            self.summary.record(result)
+            if self.sink is not None:
+                self.sink(recipient_id, result)
+            yield recipient_id, result
@@ -1,5 +1,7 @@
 import attr
 
+from pymessenger2.validation import invalid
+
 
 @attr.s
 class PostbackButton(object):
@@ -11,8 +13,8 @@ class PostbackButton(object):
     type = attr.ib(default='postback')
 
     def __attrs_post_init__(self):
-        assert self.type == 'postback', 'Type of a button can\'t be set ' \
-                                        'manually.'
+        if self.type != 'postback':
+            raise invalid('type', "Type of a button can't be set manually.")
         if not self.payload:
             self.payload = self.title
 
@@ -26,14 +28,15 @@ class CallButton(object):
     type = attr.ib(default='phone_number')
 
     def __attrs_post_init__(self):
-        assert self.type == 'phone_number', 'Type of a button can\'t be set ' \
-                                            'manually.'
+        if self.type != 'phone_number':
+            raise invalid('type', "Type of a button can't be set manually.")
 
         self.payload = self.payload.replace(' ', '')
-        assert self.payload.startswith('+'), 'Payload must be a phone number ' \
-                                             'with a valid country code.'
-        assert self.payload[1:].isnumeric(), \
-            'Payload must be a phone number.'
+        if not self.payload.startswith('+'):
+            raise invalid('payload', 'Payload must be a phone number with a '
+                                     'valid country code.')
+        if not self.payload[1:].isdigit():
+            raise invalid('payload', 'Payload must be a phone number.')
 
 
 @attr.s
@@ -49,8 +52,8 @@ class URLButton(object):
     type = attr.ib(default='web_url')
 
     def __attrs_post_init__(self):
-        assert self.type == 'web_url', 'Type of a button can\'t be set ' \
-                                       'manually.'
+        if self.type != 'web_url':
+            raise invalid('type', "Type of a button can't be set manually.")
 
 
 @attr.s
@@ -61,5 +64,5 @@ class ShareButton(object):
     type = attr.ib(default='element_share')
 
     def __attrs_post_init__(self):
-        assert self.type == 'element_share', 'Type of a button can\'t be set ' \
-                                             'manually.'
+        if self.type != 'element_share':
+            raise invalid('type', "Type of a button can't be set manually.")
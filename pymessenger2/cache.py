@@ -0,0 +1,127 @@
+import collections
+import threading
+
+from pymessenger2.utils import monotonic
+
+MISSING = object()
+
+
+class _Load(object):
+    """A load in flight, shared by the callers asking for the same key."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ProfileCache(object):
+    """Thread-safe TTL + LRU cache of user profiles, for Bot.get_user_info.
+
+        bot = Bot(<access_token>, profile_cache=ProfileCache(ttl=3600))
+
+    Failed lookups (None) are cached for `negative_ttl` seconds. Concurrent
+    lookups of the same key are coalesced: the first caller loads, the
+    others wait for its result. Exceptions are not cached.
+    """
+
+    def __init__(self, ttl=3600, maxsize=10000, negative_ttl=60,
+                 clock=monotonic):
+        """
+            @optional:
+                ttl: seconds a profile is kept
+                maxsize: max profiles kept, the least recently used being
+                    evicted first
+                negative_ttl: seconds a failed lookup is kept, 0 to disable
+        """
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+        self._entries = collections.OrderedDict()
+        self._loads = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _get(self, key, now):
+        # Must hold the lock
+        entry = self._entries.get(key)
+        if entry is None:
+            return MISSING
+        expires, value = entry
+        if expires <= now:
+            del self._entries[key]
+            return MISSING
+        # Python 2 OrderedDict has no move_to_end
+        del self._entries[key]
+        self._entries[key] = entry
+        return value
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._get(key, self.clock())
+            if value is MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        ttl = self.ttl if value is not None else self.negative_ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (self.clock() + ttl, value)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(self, key, loader):
+        """Return the cached value of `key`, calling `loader` on a miss.
+        Only one caller at a time runs the loader of a given key.
+        """
+        with self._lock:
+            value = self._get(key, self.clock())
+            if value is not MISSING:
+                self.hits += 1
+                return value
+            load = self._loads.get(key)
+            leader = load is None
+            if leader:
+                load = self._loads[key] = _Load()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            load.done.wait()
+            if load.error is not None:
+                raise load.error
+            return load.value
+        try:
+            load.value = loader()
+        except Exception as e:
+            load.error = e
+            raise
+        else:
+            self.set(key, load.value)
+        finally:
+            with self._lock:
+                del self._loads[key]
+            load.done.set()
+        return load.value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'coalesced': self.coalesced, 'evictions': self.evictions,
+                'size': len(self._entries)}
@@ -0,0 +1,258 @@
+import collections
+import threading
+
+from pymessenger2.exceptions import FacebookError
+from pymessenger2.retry import RETRY_CODES, RETRY_STATUSES
+from pymessenger2.utils import monotonic
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Graph error codes of a token that can't be used anymore
+# https://developers.facebook.com/docs/graph-api/using-graph-api/error-handling
+TOKEN_CODES = frozenset([
+    102,  # API session, eg: the user logged out
+    190,  # Invalid or expired access token
+])
+FAILURE_CODES = RETRY_CODES | TOKEN_CODES
+FAILURE_STATUSES = RETRY_STATUSES
+
+
+class CircuitOpenError(FacebookError):
+    """Raised instead of calling an endpoint whose circuit is open.
+    `retry_after` is the number of seconds before the next probe.
+    """
+
+    def __init__(self, endpoint, retry_after):
+        super(CircuitOpenError, self).__init__(
+            message='Circuit open for {0}, retry in {1:.1f}s'.format(
+                endpoint, retry_after),
+            is_transient=True)
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+class _Circuit(object):
+    __slots__ = ('state', 'opened_at', 'consecutive', 'buckets', 'probes',
+                 'probed_at')
+
+    def __init__(self):
+        self.state = CLOSED
+        self.opened_at = None
+        self.consecutive = 0
+        # [second, calls, failures], oldest first
+        self.buckets = collections.deque()
+        self.probes = 0
+        self.probed_at = None
+
+    def reset(self):
+        self.consecutive = 0
+        self.buckets.clear()
+        self.probes = 0
+        self.probed_at = None
+
+
+class CircuitBreaker(object):
+    """Fail fast when an endpoint keeps failing for a page.
+
+        bot = Bot(<access_token>, circuit_breaker=CircuitBreaker())
+
+    Every Graph API call of the bot goes through the circuit of its
+    endpoint and page token. A circuit opens after `failure_threshold`
+    failures in a row, or when at least `min_calls` calls in the last
+    `window` seconds failed at `error_rate` or more. While open, calls
+    raise CircuitOpenError right away. After `reset_timeout` seconds up to
+    `half_open_calls` probes go through: the circuit closes when one
+    succeeds and opens again when one fails. Probes never recorded, eg:
+    lost to a bug, are given back after `probe_timeout` seconds.
+
+    Failures are connection errors, timeouts, `failure_statuses` and
+    `failure_codes`: throttling, transient and invalid token errors.
+    Errors about one recipient or payload, eg: (#100) invalid parameter,
+    count as successes.
+    """
+
+    def __init__(self,
+                 failure_threshold=5,
+                 error_rate=0.5,
+                 min_calls=20,
+                 window=30,
+                 reset_timeout=30,
+                 half_open_calls=1,
+                 probe_timeout=None,
+                 failure_codes=FAILURE_CODES,
+                 failure_statuses=FAILURE_STATUSES,
+                 maxsize=10000,
+                 clock=monotonic):
+        """
+            @optional:
+                failure_threshold: consecutive failures opening the circuit
+                error_rate: share of failed calls opening the circuit
+                min_calls: calls in the window before `error_rate` applies
+                window: seconds over which the error rate is measured
+                reset_timeout: seconds a circuit stays open before probing
+                half_open_calls: probes allowed at once when half open
+                probe_timeout: seconds after which the probes not recorded
+                    yet are given back, defaults to `reset_timeout`
+                failure_codes: Graph error codes counted as failures
+                failure_statuses: HTTP statuses counted as failures
+                maxsize: max circuits kept, the least recently used being
+                    forgotten first
+        """
+        self.failure_threshold = failure_threshold
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.reset_timeout = reset_timeout
+        self.half_open_calls = half_open_calls
+        self.probe_timeout = (reset_timeout if probe_timeout is None
+                              else probe_timeout)
+        self.failure_codes = frozenset(failure_codes)
+        self.failure_statuses = frozenset(failure_statuses)
+        self.maxsize = maxsize
+        self.clock = clock
+        self._circuits = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def __len__(self):
+        return len(self._circuits)
+
+    def _circuit(self, key):
+        # Must hold the lock
+        circuit = self._circuits.pop(key, None)
+        if circuit is None:
+            circuit = _Circuit()
+            while len(self._circuits) >= self.maxsize:
+                self._circuits.popitem(last=False)
+        # Python 2 OrderedDict has no move_to_end
+        self._circuits[key] = circuit
+        return circuit
+
+    def state(self, key):
+        """State of the circuit of `key`, ie: (endpoint, access token)."""
+        with self._lock:
+            circuit = self._circuits.get(key)
+            return circuit.state if circuit is not None else CLOSED
+
+    def is_failure(self, status_code=None, error_params=None):
+        """
+        Input:
+            status_code: HTTP status of the response
+            error_params: error fields, as given by Bot._get_error_params
+        Output:
+            whether the response counts as a failure
+        """
+        if status_code in self.failure_statuses:
+            return True
+        return bool(error_params and
+                    error_params.get('code') in self.failure_codes)
+
+    def acquire(self, key, listener=None):
+        """Let a call go through the circuit of `key`, or raise
+        CircuitOpenError. Every acquire is followed by one `record`.
+        Input:
+            listener: callable receiving (key, old state, new state),
+                called outside of the lock
+        """
+        changes = []
+        with self._lock:
+            now = self.clock()
+            circuit = self._circuit(key)
+            remaining = None
+            if circuit.state == OPEN:
+                remaining = circuit.opened_at + self.reset_timeout - now
+                if remaining <= 0:
+                    self._change(circuit, HALF_OPEN, changes)
+                    remaining = None
+            if circuit.state == HALF_OPEN:
+                if (circuit.probes >= self.half_open_calls and
+                        now - circuit.probed_at >= self.probe_timeout):
+                    # Stale probes
+                    circuit.probes = 0
+                if circuit.probes >= self.half_open_calls:
+                    remaining = max(0, circuit.probed_at +
+                                    self.probe_timeout - now)
+                else:
+                    circuit.probes += 1
+                    circuit.probed_at = now
+            if remaining is not None:
+                self.rejected += 1
+        self._notify(key, changes, listener)
+        if remaining is not None:
+            raise CircuitOpenError(key[0], remaining)
+
+    def record(self, key, failed, listener=None):
+        """Record the outcome of a call let through by `acquire`.
+        Input:
+            failed: True for a failure, False for a success, None for an
+                outcome that tells nothing about the endpoint
+        """
+        changes = []
+        with self._lock:
+            now = self.clock()
+            circuit = self._circuit(key)
+            if circuit.state == HALF_OPEN:
+                circuit.probes = max(0, circuit.probes - 1)
+                if failed:
+                    circuit.opened_at = now
+                    self._change(circuit, OPEN, changes)
+                elif failed is not None:
+                    self._change(circuit, CLOSED, changes)
+            elif circuit.state == CLOSED and failed is not None:
+                circuit.consecutive = (circuit.consecutive + 1 if failed
+                                       else 0)
+                calls, failures = self._count(circuit, now, failed)
+                if (circuit.consecutive >= self.failure_threshold or
+                        (calls >= self.min_calls and
+                         failures >= self.error_rate * calls)):
+                    circuit.opened_at = now
+                    self._change(circuit, OPEN, changes)
+        self._notify(key, changes, listener)
+
+    def _count(self, circuit, now, failed):
+        """Add a call to the window and return its (calls, failures)."""
+        second = int(now)
+        buckets = circuit.buckets
+        while buckets and buckets[0][0] <= second - self.window:
+            buckets.popleft()
+        if not buckets or buckets[-1][0] != second:
+            buckets.append([second, 0, 0])
+        buckets[-1][1] += 1
+        if failed:
+            buckets[-1][2] += 1
+        calls = failures = 0
+        for _, bucket_calls, bucket_failures in buckets:
+            calls += bucket_calls
+            failures += bucket_failures
+        return calls, failures
+
+    def _change(self, circuit, state, changes):
+        changes.append((circuit.state, state))
+        circuit.state = state
+        if state != HALF_OPEN:
+            circuit.reset()
+
+    def _notify(self, key, changes, listener):
+        if listener is not None:
+            for old, new in changes:
+                listener(key, old, new)
+
+    def reset(self, key=None):
+        """Close the circuit of `key`, or every circuit."""
+        with self._lock:
+            if key is None:
+                self._circuits.clear()
+            else:
+                self._circuits.pop(key, None)
+
+    def stats(self):
+        """Output: <dict> with the number of circuits by state and the
+        calls rejected.
+        """
+        with self._lock:
+            states = collections.Counter(
+                circuit.state for circuit in self._circuits.values())
+            return {CLOSED: states[CLOSED], OPEN: states[OPEN],
+                    HALF_OPEN: states[HALF_OPEN], 'rejected': self.rejected}
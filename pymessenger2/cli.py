@@ -0,0 +1,335 @@
+"""
+Prepare campaigns offline and send them at a controlled throughput.
+
+    python -m pymessenger2 compile --message message.json \\
+        --recipients psids.txt --output payloads.jsonl
+    python -m pymessenger2 replay payloads.jsonl --results results.jsonl \\
+        --concurrency 16 --rate 250
+
+`compile` writes one wire-ready payload per line. The recipients file has
+one PSID per line, or one JSON object per line whose "id" is the PSID and
+whose other keys fill the $placeholders of the message strings. Messages
+breaking the Send API limits are refused, see --validation.
+
+`replay` sends every payload with Bot.send_raw and writes one result per
+line, {"line": <payload line>, "result": <Graph response>}. Both commands
+stream their input, so memory stays constant whatever the size of the
+campaign. An interrupted replay is continued with --resume, which skips
+the payloads already in the results file, or with --offset.
+"""
+import argparse
+import io
+import json
+import os
+import string
+import sys
+
+import six
+
+from pymessenger2.bot import Bot, DEFAULT_API_VERSION, NotificationType
+from pymessenger2.broadcast import (BroadcastSummary, DEFAULT_CONCURRENCY,
+                                    imap_unordered)
+from pymessenger2.prepared import PreparedMessage
+from pymessenger2.ratelimit import RateLimiter
+from pymessenger2.retry import RetryPolicy
+from pymessenger2.serializer import default_serializer
+from pymessenger2.validation import MODES, STRICT, ValidationError, Validator
+
+TOKEN_ENV = 'PAGE_ACCESS_TOKEN'
+APP_SECRET_ENV = 'APP_SECRET'
+
+
+class CommandError(Exception):
+    """Invalid input, reported without traceback."""
+
+
+class _StdStream(object):
+    """Binary stdin or stdout, flushed instead of closed so that it stays
+    usable after a `with` block.
+    """
+
+    def __init__(self, stream):
+        self._stream = getattr(stream, 'buffer', stream)
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    def __iter__(self):
+        return iter(self._stream)
+
+    def close(self):
+        self._stream.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _open(path, mode):
+    if path == '-':
+        return _StdStream(sys.stdin if 'r' in mode else sys.stdout)
+    return io.open(path, mode)
+
+
+#===============================================================================
+# compile
+#===============================================================================
+def render(value, variables):
+    """Fill the $placeholders of every string of a message."""
+    if isinstance(value, six.string_types):
+        return string.Template(value).substitute(variables)
+    if isinstance(value, dict):
+        return dict((key, render(item, variables))
+                    for key, item in value.items())
+    if isinstance(value, list):
+        return [render(item, variables) for item in value]
+    return value
+
+
+def compile_payloads(message, recipients, notification_type=None,
+                     serializer=default_serializer, validator=None):
+    """Iterate over the wire payloads of `message` for every recipient.
+    Input:
+        message: message <dict>, as given to Bot.send_message
+        recipients: iterable of lines, a PSID or a JSON object with the
+            "id" and the placeholder values
+        validator: `validation.Validator` checking the message, and every
+            rendered one, against the Send API limits
+    Output:
+        iterator of <bytes>, without line ending
+    """
+    notification = getattr(notification_type, 'value', notification_type)
+    if validator is not None:
+        _validate(validator, {'message': message, 'recipient': {'id': ''}},
+                  'message')
+    prepared = PreparedMessage(message, notification_type,
+                               serializer=serializer)
+    for number, line in enumerate(recipients, 1):
+        if isinstance(line, bytes):
+            line = line.decode('utf8')
+        line = line.strip()
+        if not line:
+            continue
+        if not line.startswith('{'):
+            yield prepared.for_recipient(line)
+            continue
+        try:
+            variables = json.loads(line)
+            recipient_id = variables.pop('id')
+            rendered = render(message, variables)
+        except (ValueError, KeyError) as e:
+            raise CommandError("recipients line {0}: {1!r}".format(number,
+                                                                   e))
+        payload = {'message': rendered,
+                   'notification_type': notification or 'REGULAR',
+                   'recipient': {'id': recipient_id}}
+        if validator is not None:
+            _validate(validator, payload, "recipients line {0}".format(
+                number))
+        yield serializer.dumps(payload)
+
+
+def _validate(validator, payload, where):
+    try:
+        validator.validate(payload)
+    except ValidationError as e:
+        raise CommandError("{0}: {1}".format(where, e))
+
+
+def compile_command(args):
+    with io.open(args.message, 'rb') as f:
+        message = json.loads(f.read().decode('utf8'))
+    count = 0
+    with _open(args.recipients, 'rb') as recipients, \
+            _open(args.output, 'wb') as output:
+        for payload in compile_payloads(
+                message, recipients,
+                NotificationType(args.notification_type),
+                validator=Validator(args.validation)):
+            output.write(payload + b'\n')
+            count += 1
+    sys.stderr.write("{0} payloads compiled\n".format(count))
+    return 0
+
+
+#===============================================================================
+# replay
+#===============================================================================
+class Progress(object):
+    """Lowest payload line not sent yet, ie: the offset to resume from.
+    Payloads complete out of order, by at most the concurrency: only the
+    lines done ahead of the offset are kept.
+    """
+
+    def __init__(self, offset=0):
+        self.offset = offset
+        self.ahead = set()
+
+    def done(self, line):
+        self.ahead.add(line)
+        while self.offset in self.ahead:
+            self.ahead.remove(self.offset)
+            self.offset += 1
+
+    @classmethod
+    def from_results(cls, stream):
+        progress = cls()
+        for line in stream:
+            line = line.strip()
+            if line:
+                progress.done(json.loads(line.decode('utf8'))['line'])
+        return progress
+
+
+def _result(line, result):
+    if isinstance(result, Exception):
+        error = {'message': str(result), 'type': type(result).__name__}
+        if getattr(result, 'code', None) is not None:
+            error['code'] = result.code
+        result = {'error': error}
+    return {'line': line, 'result': result}
+
+
+def _payloads(stream, progress):
+    """Iterate over the (line, payload) not sent yet, `line` counting
+    from 0.
+    """
+    for line, payload in enumerate(stream):
+        if line < progress.offset or line in progress.ahead:
+            continue
+        payload = payload.strip()
+        if payload:
+            yield line, payload
+
+
+def replay(bot, payloads, progress, sink=None,
+           concurrency=DEFAULT_CONCURRENCY):
+    """Send the payloads of a JSONL stream.
+    Input:
+        payloads: iterable of wire payload lines
+        progress: Progress, updated as payloads complete
+        sink: callable receiving the result <dict> of every payload
+    Output:
+        BroadcastSummary
+    """
+    summary = BroadcastSummary()
+    for (line, _), result in imap_unordered(
+            lambda item: bot.send_raw(item[1]),
+            _payloads(payloads, progress), concurrency):
+        summary.record(result)
+        if sink is not None:
+            sink(_result(line, result))
+        progress.done(line)
+    return summary
+
+
+def replay_command(args):
+    token = args.token or os.environ.get(TOKEN_ENV)
+    if not token:
+        raise CommandError("an access token is required: --token or "
+                           "${0}".format(TOKEN_ENV))
+    rate_limiter = None
+    if args.rate:
+        rate_limiter = RateLimiter(rate=args.rate, burst=args.burst)
+    bot = Bot(token,
+              api_version=args.api_version,
+              app_secret=args.app_secret or os.environ.get(APP_SECRET_ENV),
+              pool_maxsize=args.concurrency,
+              timeout=args.timeout,
+              rate_limiter=rate_limiter,
+              retry_policy=RetryPolicy(max_attempts=args.max_attempts))
+    if args.graph_url:
+        bot.graph_url = args.graph_url.rstrip('/')
+
+    progress = Progress(args.offset)
+    if args.resume and os.path.exists(args.results):
+        with io.open(args.results, 'rb') as f:
+            progress = Progress.from_results(f)
+    mode = 'ab' if args.resume or args.offset else 'wb'
+    summary = None
+    try:
+        with _open(args.payloads, 'rb') as payloads, \
+                io.open(args.results, mode) as results:
+            def sink(result):
+                results.write(default_serializer.dumps(result) + b'\n')
+
+            summary = replay(bot, payloads, progress, sink,
+                             concurrency=args.concurrency)
+    except KeyboardInterrupt:
+        sys.stderr.write("Interrupted, resume with --resume or --offset "
+                         "{0}\n".format(progress.offset))
+        return 130
+    finally:
+        bot.close()
+    sys.stderr.write("{0}\n".format(summary))
+    return 1 if summary.failed else 0
+
+
+#===============================================================================
+# Entry point
+#===============================================================================
+def parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m pymessenger2', description=__doc__.strip(),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    compile_parser = commands.add_parser(
+        'compile', help="write the payloads of a message for recipients")
+    compile_parser.add_argument('--message', required=True,
+                                help="JSON file of the message")
+    compile_parser.add_argument('--recipients', default='-',
+                                help="recipients file, default: stdin")
+    compile_parser.add_argument('--output', '-o', default='-',
+                                help="payloads JSONL, default: stdout")
+    compile_parser.add_argument(
+        '--notification-type', default=NotificationType.regular.value,
+        choices=[member.value for member in NotificationType])
+    compile_parser.add_argument(
+        '--validation', default=STRICT, choices=MODES,
+        help="checks of the Send API limits, default: {0}".format(STRICT))
+    compile_parser.set_defaults(func=compile_command)
+
+    replay_parser = commands.add_parser(
+        'replay', help="send the payloads of a JSONL file")
+    replay_parser.add_argument('payloads', help="payloads JSONL, - for "
+                                                "stdin")
+    replay_parser.add_argument('--results', required=True,
+                               help="results JSONL")
+    replay_parser.add_argument('--token', help="page access token, "
+                               "default: ${0}".format(TOKEN_ENV))
+    replay_parser.add_argument('--app-secret', help="default: ${0}".format(
+        APP_SECRET_ENV))
+    replay_parser.add_argument('--concurrency', type=int,
+                               default=DEFAULT_CONCURRENCY)
+    replay_parser.add_argument('--rate', type=float,
+                               help="max messages per second")
+    replay_parser.add_argument('--burst', type=int,
+                               help="messages sent at once, default: rate")
+    replay_parser.add_argument('--max-attempts', type=int, default=3,
+                               help="attempts per payload on transient "
+                                    "errors")
+    replay_parser.add_argument('--timeout', type=float, default=30)
+    replay_parser.add_argument('--offset', type=int, default=0,
+                               help="payload lines to skip, appending to "
+                                    "the results")
+    replay_parser.add_argument('--resume', action='store_true',
+                               help="skip the payloads already in the "
+                                    "results, appending to them")
+    replay_parser.add_argument('--api-version', default=DEFAULT_API_VERSION)
+    replay_parser.add_argument('--graph-url', help="eg: the url of a "
+                               "local emulator.GraphEmulator")
+    replay_parser.set_defaults(func=replay_command)
+    return parser
+
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except (CommandError, IOError) as e:
+        sys.stderr.write("error: {0}\n".format(e))
+        return 2
@@ -0,0 +1,360 @@
+import json
+import re
+
+import six
+
+#===============================================================================
+# Events
+# https://developers.facebook.com/docs/messenger-platform/reference/webhook-events
+#===============================================================================
+
+
+class Event(object):
+    """A webhook messaging event.
+    `type` is one of the EVENT_TYPES, `raw` the messaging object as sent by
+    Facebook and `match` the regex match of the route that selected the
+    handler, if any.
+    """
+    __slots__ = ('type', 'page_id', 'sender_id', 'recipient_id', 'timestamp',
+                 'standby', 'raw', 'match')
+
+    def __init__(self, type, page_id, raw, standby=False):
+        self.type = type
+        self.page_id = page_id
+        self.sender_id = raw.get('sender', {}).get('id')
+        self.recipient_id = raw.get('recipient', {}).get('id')
+        self.timestamp = raw.get('timestamp')
+        self.standby = standby
+        self.raw = raw
+        self.match = None
+
+    @property
+    def payload(self):
+        return None
+
+    @property
+    def text(self):
+        return None
+
+    def __repr__(self):
+        return '<{0} {1} from {2}>'.format(type(self).__name__, self.type,
+                                           self.sender_id)
+
+
+class MessageEvent(Event):
+    """`message`, `quick_reply`, `attachment` and `echo` events."""
+    __slots__ = ('mid', '_text', 'quick_reply_payload', 'attachments',
+                 'is_echo')
+
+    def __init__(self, type, page_id, raw, standby=False):
+        super(MessageEvent, self).__init__(type, page_id, raw, standby)
+        message = raw['message']
+        self.mid = message.get('mid')
+        self._text = message.get('text')
+        self.quick_reply_payload = message.get('quick_reply',
+                                               {}).get('payload')
+        self.attachments = message.get('attachments', [])
+        self.is_echo = message.get('is_echo', False)
+
+    @property
+    def payload(self):
+        return self.quick_reply_payload
+
+    @property
+    def text(self):
+        return self._text
+
+
+class PostbackEvent(Event):
+    __slots__ = ('_payload', 'title', 'referral')
+
+    def __init__(self, type, page_id, raw, standby=False):
+        super(PostbackEvent, self).__init__(type, page_id, raw, standby)
+        postback = raw['postback']
+        self._payload = postback.get('payload')
+        self.title = postback.get('title')
+        self.referral = postback.get('referral')
+
+    @property
+    def payload(self):
+        return self._payload
+
+
+class DeliveryEvent(Event):
+    __slots__ = ('mids', 'watermark')
+
+    def __init__(self, type, page_id, raw, standby=False):
+        super(DeliveryEvent, self).__init__(type, page_id, raw, standby)
+        self.mids = raw['delivery'].get('mids', [])
+        self.watermark = raw['delivery'].get('watermark')
+
+
+class ReadEvent(Event):
+    __slots__ = ('watermark',)
+
+    def __init__(self, type, page_id, raw, standby=False):
+        super(ReadEvent, self).__init__(type, page_id, raw, standby)
+        self.watermark = raw['read'].get('watermark')
+
+
+# Messaging keys checked, in order, to find the type of an event
+_EVENT_KEYS = (
+    ('message', MessageEvent),
+    ('postback', PostbackEvent),
+    ('delivery', DeliveryEvent),
+    ('read', ReadEvent),
+    ('referral', Event),
+    ('optin', Event),
+    ('account_linking', Event),
+    ('pass_thread_control', Event),
+    ('take_thread_control', Event),
+    ('request_thread_control', Event),
+    ('app_roles', Event),
+    ('policy_enforcement', Event),
+)
+
+_DEFAULT_FLAGS = re.compile('').flags
+# Numbered backreferences and conditionals, eg: (a)\1 or (a)?(?(1)b|c),
+# broken by the groups added when merging the regex routes
+_NUMBERED_REFERENCE = re.compile(r'\\[1-9]|\(\?\(\d')
+
+EVENT_TYPES = frozenset(
+    [key for key, _ in _EVENT_KEYS] +
+    ['quick_reply', 'attachment', 'echo', 'unknown'])
+
+
+def parse_event(messaging, page_id=None, standby=False):
+    """Turn a messaging object of a webhook entry into an Event."""
+    for key, event_class in _EVENT_KEYS:
+        if key in messaging:
+            event_type = key
+            if key == 'message':
+                message = messaging['message']
+                if message.get('is_echo'):
+                    event_type = 'echo'
+                elif 'quick_reply' in message:
+                    event_type = 'quick_reply'
+                elif 'attachments' in message:
+                    event_type = 'attachment'
+            return event_class(event_type, page_id, messaging, standby)
+    return Event('unknown', page_id, messaging, standby)
+
+
+def parse_events(body):
+    """Iterate over the events of a webhook request body.
+    Input:
+        body: request body, parsed or as JSON bytes/str
+    """
+    if isinstance(body, (bytes, six.text_type)):
+        if isinstance(body, bytes):
+            body = body.decode('utf8')
+        body = json.loads(body)
+    for entry in body.get('entry', []):
+        page_id = entry.get('id')
+        for messaging in entry.get('messaging', []):
+            yield parse_event(messaging, page_id)
+        for messaging in entry.get('standby', []):
+            yield parse_event(messaging, page_id, standby=True)
+
+
+#===============================================================================
+# Dispatcher
+#===============================================================================
+
+
+class Dispatcher(object):
+    """Route webhook events to handlers through precomputed indexes.
+
+        dispatcher = Dispatcher()
+
+        @dispatcher.postback('GET_STARTED')
+        def get_started(event):
+            bot.send_text_message(event.sender_id, 'Welcome!')
+
+        @dispatcher.postback_prefix('PRODUCT:')
+        def product(event):
+            ...
+
+        @dispatcher.text(r'^(hi|hello)\\b', regex=True)
+        def greet(event):
+            ...
+
+        dispatcher.dispatch(request_body)
+
+    Routes match the text of `message` events, or the payload of
+    `postback` and `quick_reply` events. The most specific route wins:
+    exact value, then the longest prefix, then the first registered regex,
+    then the handler of the event type, then the default handler.
+    Exact routes cost one dict lookup and prefix routes one lookup per
+    distinct prefix length, whatever the number of routes. The regexes of
+    an event type are merged into one pattern searched once, unless they
+    use flags or numbered backreferences.
+    """
+    # Which event types each route field applies to
+    _FIELDS = {
+        'text': ('message',),
+        'postback': ('postback',),
+        'quick_reply': ('quick_reply',),
+    }
+
+    def __init__(self):
+        self._type_handlers = {}
+        self._exact = {}
+        self._prefixes = {}
+        self._prefix_lengths = {}
+        self._regexes = {}
+        self._compiled_regexes = {}
+        self.default_handler = None
+
+    # Registration
+    #---------------------------------------------------------------------------
+    def _check_type(self, event_type):
+        if event_type not in EVENT_TYPES:
+            raise ValueError("Unknown event type {0!r}".format(event_type))
+
+    def add_handler(self, event_type, handler):
+        """Handle all the events of `event_type` not taken by a route."""
+        self._check_type(event_type)
+        if event_type in self._type_handlers:
+            raise ValueError("{0!r} events already have a handler".format(
+                event_type))
+        self._type_handlers[event_type] = handler
+
+    def add_route(self, field, value, handler, prefix=False, regex=False):
+        """
+        Input:
+            field: 'text', 'postback' or 'quick_reply'
+            value: exact value, prefix or regex to match
+            handler: callable receiving the Event
+            prefix: match values starting with `value`
+            regex: `value` is a regex searched in the values
+        """
+        for event_type in self._FIELDS[field]:
+            if regex:
+                pattern = value if hasattr(value, 'pattern') else re.compile(
+                    value)
+                self._regexes.setdefault(event_type, []).append(
+                    (pattern, handler))
+                self._compiled_regexes.pop(event_type, None)
+                continue
+            if prefix:
+                index = self._prefixes.setdefault(event_type, {})
+                lengths = self._prefix_lengths.setdefault(event_type, [])
+                if len(value) not in lengths:
+                    lengths.append(len(value))
+                    lengths.sort(reverse=True)
+            else:
+                index = self._exact
+                value = (event_type, value)
+            if value in index:
+                raise ValueError("{0!r} already has a handler".format(value))
+            index[value] = handler
+
+    def on(self, event_type):
+        """Decorator registering the handler of an event type."""
+        def decorator(handler):
+            self.add_handler(event_type, handler)
+            return handler
+        return decorator
+
+    def _route_decorator(self, field, value, prefix=False, regex=False):
+        def decorator(handler):
+            self.add_route(field, value, handler, prefix=prefix, regex=regex)
+            return handler
+        return decorator
+
+    def postback(self, payload, regex=False):
+        return self._route_decorator('postback', payload, regex=regex)
+
+    def postback_prefix(self, prefix):
+        return self._route_decorator('postback', prefix, prefix=True)
+
+    def quick_reply(self, payload, regex=False):
+        return self._route_decorator('quick_reply', payload, regex=regex)
+
+    def quick_reply_prefix(self, prefix):
+        return self._route_decorator('quick_reply', prefix, prefix=True)
+
+    def text(self, text, regex=False):
+        return self._route_decorator('text', text, regex=regex)
+
+    def text_prefix(self, prefix):
+        return self._route_decorator('text', prefix, prefix=True)
+
+    def default(self, handler):
+        """Decorator registering the handler of unrouted events."""
+        self.default_handler = handler
+        return handler
+
+    # Dispatch
+    #---------------------------------------------------------------------------
+    def _combined_regex(self, event_type):
+        combined = self._compiled_regexes.get(event_type)
+        if combined is None:
+            routes = self._regexes[event_type]
+            pattern = None
+            if all(route.flags == _DEFAULT_FLAGS and
+                   not _NUMBERED_REFERENCE.search(route.pattern)
+                   for route, _ in routes):
+                # Every alternative may skip any leading text, so the
+                # first registered route matching anywhere wins, like
+                # searching the routes one by one.
+                try:
+                    pattern = re.compile('|'.join(
+                        '(?P<_route{0}>[\\s\\S]*?(?:{1}))'.format(
+                            i, route.pattern)
+                        for i, (route, _) in enumerate(routes)))
+                except re.error:
+                    # Eg: a group name used by two routes
+                    pattern = None
+            combined = self._compiled_regexes[event_type] = (pattern, routes)
+        return combined
+
+    def _match_regex(self, event_type, value):
+        pattern, routes = self._combined_regex(event_type)
+        if pattern is not None:
+            match = pattern.match(value)
+            if match is None:
+                return None, None
+            route, handler = routes[int(match.lastgroup[len('_route'):])]
+            return handler, route.search(value)
+        for route, handler in routes:
+            match = route.search(value)
+            if match is not None:
+                return handler, match
+        return None, None
+
+    def resolve(self, event):
+        """Return the handler of an event, or None."""
+        event_type = event.type
+        value = event.text if event_type == 'message' else event.payload
+        if value is not None:
+            handler = self._exact.get((event_type, value))
+            if handler is not None:
+                return handler
+            prefixes = self._prefixes.get(event_type)
+            if prefixes:
+                for length in self._prefix_lengths[event_type]:
+                    handler = prefixes.get(value[:length])
+                    if handler is not None:
+                        return handler
+            if event_type in self._regexes:
+                handler, event.match = self._match_regex(event_type, value)
+                if handler is not None:
+                    return handler
+        return self._type_handlers.get(event_type, self.default_handler)
+
+    def dispatch_event(self, event):
+        handler = self.resolve(event)
+        if handler is None:
+            return None
+        return handler(event)
+
+    def dispatch(self, body):
+        """Handle every event of a webhook request body.
+        Input:
+            body: request body, parsed or as JSON bytes/str
+        Output:
+            list of the handler results
+        """
+        return [self.dispatch_event(event) for event in parse_events(body)]
@@ -0,0 +1,556 @@
+"""
+Local emulator of the Graph API endpoints called by the library, to test
+and benchmark bots offline:
+
+    with GraphEmulator(latency=lognormal(0.08, 0.5),
+                       faults=[Fault(THROTTLED, rate=0.01)]) as graph:
+        bot = Bot(<access_token>)
+        bot.graph_url = graph.url
+        bot.send_text_message(recipient_id, 'Hello!')
+        graph.stats()
+
+or, in another process:
+
+    python -m pymessenger2.emulator --port 8080 --latency 0.08
+"""
+import argparse
+import collections
+import itertools
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+
+import six
+from six.moves import BaseHTTPServer, socketserver
+from six.moves.urllib.parse import parse_qsl, urlsplit
+
+from pymessenger2.bot import DEFAULT_API_VERSION
+from pymessenger2.instrumentation import endpoint_of
+from pymessenger2.utils import monotonic
+
+_VERSION = re.compile(r'^/v\d+(\.\d+)?(?=/|$)')
+
+USER_FIELDS = ('first_name', 'last_name', 'profile_pic')
+_KNOWN_USER_FIELDS = frozenset(USER_FIELDS + (
+    'id', 'name', 'locale', 'timezone', 'gender'))
+
+
+#===============================================================================
+# Errors
+#===============================================================================
+class GraphError(object):
+    """Error response of the Graph API, in its JSON format."""
+
+    def __init__(self, code, message, type='OAuthException', status=400,
+                 subcode=None, is_transient=False, retry_after=None):
+        self.code = code
+        self.message = message
+        self.type = type
+        self.status = status
+        self.subcode = subcode
+        self.is_transient = is_transient
+        self.retry_after = retry_after
+
+    def body(self):
+        error = {'message': self.message, 'type': self.type,
+                 'code': self.code, 'is_transient': self.is_transient,
+                 'fbtrace_id': uuid.uuid4().hex[:11]}
+        if self.subcode is not None:
+            error['error_subcode'] = self.subcode
+        return {'error': error}
+
+    def headers(self):
+        if self.retry_after is None:
+            return {}
+        return {'Retry-After': str(self.retry_after)}
+
+    def __repr__(self):
+        return 'GraphError({0}, {1!r})'.format(self.code, self.message)
+
+
+THROTTLED = GraphError(613, 'Calls to this api have exceeded the rate '
+                       'limit.')
+APP_THROTTLED = GraphError(4, 'Application request limit reached',
+                           is_transient=True)
+INVALID_TOKEN = GraphError(190, 'Error validating access token: The session '
+                           'has been invalidated.', subcode=460)
+TRANSIENT = GraphError(1200, 'Temporary send message failure. Please try '
+                       'again later', type='FacebookApiException',
+                       status=500, is_transient=True)
+UNAVAILABLE = GraphError(2, 'Service temporarily unavailable', status=503,
+                         is_transient=True)
+_NO_TOKEN = GraphError(2500, 'An active access token must be used to query '
+                       'information about the current user.')
+
+
+def _invalid_parameter(message, subcode=None):
+    return GraphError(100, message, subcode=subcode)
+
+
+class Fault(object):
+    """Error injected in a share of the calls.
+    Input:
+        error: GraphError returned, eg: THROTTLED
+        rate: probability for a call to fail
+        endpoints: endpoints failing, eg: ['/me/messages'], all by default
+        limit: number of calls failed before the fault stops
+    """
+
+    def __init__(self, error, rate=1.0, endpoints=None, limit=None):
+        self.error = error
+        self.rate = rate
+        self.endpoints = frozenset(endpoints) if endpoints else None
+        self.limit = limit
+        self.count = 0
+
+    def fires(self, endpoint, rng):
+        if self.limit is not None and self.count >= self.limit:
+            return False
+        if self.endpoints is not None and endpoint not in self.endpoints:
+            return False
+        if rng.random() >= self.rate:
+            return False
+        self.count += 1
+        return True
+
+
+#===============================================================================
+# Latency distributions: callables drawing seconds from a random.Random
+#===============================================================================
+def constant(seconds):
+    return lambda rng: seconds
+
+
+def uniform(low, high):
+    return lambda rng: rng.uniform(low, high)
+
+
+def exponential(mean):
+    return lambda rng: rng.expovariate(1.0 / mean)
+
+
+def lognormal(median, sigma=0.5):
+    """Long tailed latency, as usually observed: half of the calls take
+    less than `median` seconds.
+    """
+    mu = math.log(median)
+    return lambda rng: rng.lognormvariate(mu, sigma)
+
+
+def _distribution(latency):
+    if latency is None:
+        return None
+    if callable(latency):
+        return latency
+    return constant(latency)
+
+
+#===============================================================================
+# Emulator
+#===============================================================================
+Call = collections.namedtuple('Call', 'method endpoint token fields status')
+
+
+class GraphEmulator(object):
+    """In process HTTP server answering like the Graph API.
+
+    Emulated: /me/messages (JSON and multipart), /me/message_attachments,
+    /me/messenger_profile (GET, POST, DELETE, kept per token), user
+    profiles, /me/pass_thread_control, /me/take_thread_control and batch
+    requests. Any access token is accepted unless `tokens` is given;
+    `revoke` invalidates one at runtime.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=None, faults=(),
+                 rate_limit=None, tokens=None, history=1000, seed=None,
+                 api_version=DEFAULT_API_VERSION):
+        """
+            @optional:
+                host, port: address to listen on, port 0 picks a free one
+                latency: seconds, or a distribution such as lognormal(0.1),
+                    or a <dict> of endpoint to either, None being the
+                    default, eg: {'/me/messages': 0.1, None: 0.02}
+                faults: list of Fault, the first one firing answers
+                rate_limit: messages per second accepted per token, above
+                    which sends fail with THROTTLED
+                tokens: valid access tokens, any by default
+                history: number of calls kept in `calls`
+                seed: seed of the random draws, for reproducible runs
+                api_version: version in `url`, every version is served
+        """
+        self.host = host
+        self.port = port
+        if isinstance(latency, dict):
+            self.latency = dict((endpoint, _distribution(value))
+                                for endpoint, value in latency.items())
+        else:
+            self.latency = {None: _distribution(latency)}
+        self.faults = list(faults)
+        self.rate_limit = rate_limit
+        self.tokens = set(tokens) if tokens is not None else None
+        self.revoked = set()
+        self.api_version = api_version
+        self.calls = collections.deque(maxlen=history)
+        self.profiles = collections.defaultdict(dict)
+        self.thread_owners = {}
+        self._random = random.Random(seed)
+        self._ids = itertools.count(1)
+        self._windows = {}
+        self._requests = collections.Counter()
+        self._errors = collections.Counter()
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self):
+        """Value for Bot.graph_url"""
+        return 'http://{0}:{1}/v{2}'.format(self.host, self.port,
+                                            self.api_version)
+
+    def start(self):
+        self._server = _Server((self.host, self.port), _Handler)
+        self._server.emulator = self
+        self.port = self._server.server_address[1]
+        thread = threading.Thread(target=self._server.serve_forever,
+                                  args=(0.05,))
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def revoke(self, token):
+        """Make every following call with `token` fail with INVALID_TOKEN."""
+        with self._lock:
+            self.revoked.add(token)
+
+    def stats(self):
+        """Output: <dict> with the calls by (endpoint, status) and the
+        errors by Graph code.
+        """
+        with self._lock:
+            return {'requests': dict(self._requests),
+                    'errors': dict(self._errors)}
+
+    def delay(self, endpoint):
+        """Latency drawn for a call to `endpoint`, in seconds."""
+        distribution = self.latency.get(endpoint, self.latency.get(None))
+        if distribution is None:
+            return 0
+        with self._lock:
+            return max(0.0, distribution(self._random))
+
+    #===========================================================================
+    # Dispatch
+    #===========================================================================
+    def dispatch(self, method, path, params, fields):
+        """Answer one call.
+        Input:
+            path: path without version, eg: /me/messages
+            params: query parameters <dict>
+            fields: body parameters <dict>, form values JSON decoded
+        Output:
+            (HTTP status, response data, headers <dict>)
+        """
+        endpoint = endpoint_of(path.lstrip('/'))
+        token = params.get('access_token') or fields.get('access_token')
+        with self._lock:
+            error = self._refuse(endpoint, token)
+            if error is None:
+                data = self._route(method, endpoint, path, params, fields,
+                                   token)
+                if isinstance(data, GraphError):
+                    error = data
+            if error is not None:
+                status, data, headers = (error.status, error.body(),
+                                         error.headers())
+                self._errors[error.code] += 1
+            else:
+                status, headers = 200, {}
+            self._requests[(endpoint, status)] += 1
+            self.calls.append(Call(method, endpoint, token, fields, status))
+        return status, data, headers
+
+    def _refuse(self, endpoint, token):
+        if not token:
+            return _NO_TOKEN
+        if token in self.revoked or (self.tokens is not None and
+                                     token not in self.tokens):
+            return INVALID_TOKEN
+        for fault in self.faults:
+            if fault.fires(endpoint, self._random):
+                return fault.error
+        if self.rate_limit is not None and endpoint == '/me/messages':
+            now = monotonic()
+            started, count = self._windows.get(token, (now, 0))
+            if now - started >= 1:
+                started, count = now, 0
+            if count >= self.rate_limit:
+                return THROTTLED
+            self._windows[token] = (started, count + 1)
+        return None
+
+    def _route(self, method, endpoint, path, params, fields, token):
+        if method == 'HEAD':
+            return {}
+        if endpoint == '/':
+            if method == 'POST' and 'batch' in fields:
+                return self._batch(fields['batch'], token)
+        elif endpoint == '/me/messages' and method == 'POST':
+            return self._send(fields)
+        elif endpoint == '/me/message_attachments' and method == 'POST':
+            if not isinstance(fields.get('message'), dict):
+                return _invalid_parameter('The parameter message is '
+                                          'required')
+            return {'attachment_id': str(next(self._ids))}
+        elif endpoint == '/me/messenger_profile':
+            return self._messenger_profile(method, params, fields, token)
+        elif endpoint in ('/me/pass_thread_control',
+                          '/me/take_thread_control') and method == 'POST':
+            recipient_id = self._recipient(fields)
+            if recipient_id is None:
+                return _invalid_parameter('The parameter recipient is '
+                                          'required')
+            self.thread_owners[recipient_id] = (
+                fields.get('target_app_id') if 'pass' in endpoint else None)
+            return {'success': True}
+        elif endpoint == '/{id}' and method == 'GET':
+            return self._user_profile(path.strip('/'), params)
+        return GraphError(100, 'Unsupported {0} request.'.format(method),
+                          type='GraphMethodException', subcode=33)
+
+    def _recipient(self, fields):
+        recipient = fields.get('recipient')
+        if isinstance(recipient, dict):
+            return recipient.get('id')
+        return None
+
+    def _send(self, fields):
+        recipient_id = self._recipient(fields)
+        if recipient_id is None:
+            return _invalid_parameter('The parameter recipient is required')
+        message = fields.get('message')
+        if 'sender_action' in fields:
+            return {'recipient_id': recipient_id}
+        if not isinstance(message, dict) or not message:
+            return _invalid_parameter('param message must be non-empty.')
+        result = {'recipient_id': recipient_id,
+                  'message_id': 'm_{0}'.format(next(self._ids))}
+        attachment = message.get('attachment') or {}
+        if (attachment.get('payload') or {}).get('is_reusable'):
+            result['attachment_id'] = str(next(self._ids))
+        return result
+
+    def _messenger_profile(self, method, params, fields, token):
+        profile = self.profiles[token]
+        if method == 'GET':
+            names = params.get('fields')
+            if not names:
+                return _invalid_parameter('The parameter fields is required')
+            data = dict((name, profile[name]) for name in names.split(',')
+                        if name in profile)
+            return {'data': [data] if data else []}
+        if method == 'POST':
+            profile.update((name, value) for name, value in fields.items()
+                           if name != 'access_token')
+            return {'result': 'success'}
+        if method == 'DELETE':
+            for name in fields.get('fields') or ():
+                profile.pop(name, None)
+            return {'result': 'success'}
+        return GraphError(100, 'Unsupported {0} request.'.format(method),
+                          type='GraphMethodException', subcode=33)
+
+    def _user_profile(self, psid, params):
+        names = params.get('fields')
+        names = names.split(',') if names else USER_FIELDS
+        for name in names:
+            if name not in _KNOWN_USER_FIELDS:
+                return _invalid_parameter(
+                    'Tried accessing nonexisting field ({0})'.format(name))
+        profile = {'id': psid, 'first_name': 'User',
+                   'last_name': psid[-4:], 'name': 'User ' + psid[-4:],
+                   'profile_pic': 'https://example.com/{0}.jpg'.format(psid),
+                   'locale': 'en_US', 'timezone': 0, 'gender': 'female'}
+        data = dict((name, profile[name]) for name in names)
+        data['id'] = psid
+        return data
+
+    def _batch(self, batch, token):
+        results = []
+        for request in batch:
+            path, _, query = request['relative_url'].partition('?')
+            params = dict(parse_qsl(query))
+            params.setdefault('access_token', token)
+            fields = _decode(dict(parse_qsl(request.get('body') or '')))
+            error = self._refuse(endpoint_of(path), token)
+            data = error or self._route(request.get('method', 'GET'),
+                                        endpoint_of(path), '/' + path,
+                                        params, fields, token)
+            status = 200
+            if isinstance(data, GraphError):
+                self._errors[data.code] += 1
+                status, data = data.status, data.body()
+            results.append({'code': status, 'headers': [],
+                            'body': json.dumps(data)})
+        return results
+
+
+#===============================================================================
+# HTTP
+#===============================================================================
+def _decode(fields):
+    """JSON decode the form values, as Graph does."""
+    for name, value in fields.items():
+        if isinstance(value, six.string_types) and value[:1] in ('{', '['):
+            try:
+                fields[name] = json.loads(value)
+            except ValueError:
+                pass
+    return fields
+
+
+def _parse_multipart(body, content_type):
+    boundary = content_type.split('boundary=', 1)[1].strip('"')
+    fields = {}
+    for part in body.split(b'--' + boundary.encode('ascii')):
+        head, sep, content = part.partition(b'\r\n\r\n')
+        if not sep:
+            continue
+        head = head.decode('utf8')
+        name = re.search(r'name="([^"]*)"', head)
+        if name is None:
+            continue
+        content = content[:-2] if content.endswith(b'\r\n') else content
+        filename = re.search(r'filename="([^"]*)"', head)
+        if filename is not None:
+            fields[name.group(1)] = {'filename': filename.group(1),
+                                     'size': len(content)}
+        else:
+            fields[name.group(1)] = content.decode('utf8')
+    return _decode(fields)
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately: avoid the delayed ACKs
+    disable_nagle_algorithm = True
+
+    def _body(self):
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b';')[0], 16)
+                if not size:
+                    # Trailers, up to the empty line
+                    while self.rfile.readline() not in (b'\r\n', b'\n', b''):
+                        pass
+                    return b''.join(chunks)
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+    def _fields(self, body):
+        content_type = self.headers.get('Content-Type') or ''
+        if not body:
+            return {}
+        if content_type.startswith('application/json'):
+            return json.loads(body.decode('utf8'))
+        if content_type.startswith('multipart/form-data'):
+            return _parse_multipart(body, content_type)
+        return _decode(dict(parse_qsl(body.decode('utf8'))))
+
+    def _handle(self):
+        emulator = self.server.emulator
+        url = urlsplit(self.path)
+        path = _VERSION.sub('', url.path) or '/'
+        body = self._body()
+        try:
+            fields = self._fields(body)
+        except ValueError:
+            status, data, headers = 400, _invalid_parameter(
+                'Invalid request body').body(), {}
+        else:
+            status, data, headers = emulator.dispatch(
+                self.command, path, dict(parse_qsl(url.query)), fields)
+        delay = emulator.delay(endpoint_of(path.lstrip('/')))
+        if delay:
+            time.sleep(delay)
+        content = json.dumps(data).encode('utf8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(content)
+
+    do_GET = do_POST = do_DELETE = do_HEAD = _handle
+
+    def log_message(self, *args):
+        pass
+
+
+class _Server(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+_FAULTS = {'throttled': THROTTLED, 'app-throttled': APP_THROTTLED,
+           'invalid-token': INVALID_TOKEN, 'transient': TRANSIENT,
+           'unavailable': UNAVAILABLE}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m pymessenger2.emulator',
+        description="Serve an emulated Graph API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0,
+                        help="median latency in seconds")
+    parser.add_argument('--sigma', type=float, default=0.5,
+                        help="spread of the lognormal latency")
+    parser.add_argument('--rate-limit', type=float,
+                        help="messages per second accepted per token")
+    parser.add_argument('--fault', action='append', default=[],
+                        metavar='NAME=RATE',
+                        help="inject errors, NAME among: {0}".format(
+                            ', '.join(sorted(_FAULTS))))
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args(argv)
+
+    faults = []
+    for fault in args.fault:
+        name, _, rate = fault.partition('=')
+        if name not in _FAULTS:
+            parser.error("unknown fault {0}".format(name))
+        faults.append(Fault(_FAULTS[name], rate=float(rate or 1)))
+    latency = lognormal(args.latency, args.sigma) if args.latency else None
+    emulator = GraphEmulator(args.host, args.port, latency=latency,
+                             faults=faults, rate_limit=args.rate_limit,
+                             seed=args.seed).start()
+    print("Graph API emulator on {0}".format(emulator.url))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        emulator.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -23,4 +23,21 @@ class FacebookError(Exception):
         super(FacebookError, self).__init__(message)
         
 class OAuthError(FacebookError):
-    pass
\ No newline at end of file
+    pass
+
+
+class BatchError(FacebookError):
+    """Raised by Bot.send_batch, with raise_exception, once every payload
+    has been sent when some of them failed. `results` holds the result of
+    every payload, the FacebookError/OAuthError of the failed ones, and
+    `errors` only those.
+    """
+
+    def __init__(self, results):
+        self.results = results
+        self.errors = [result for result in results
+                       if isinstance(result, FacebookError)]
+        super(BatchError, self).__init__(
+            message='{0} of {1} batched payloads failed, first: {2}'.format(
+                len(self.errors), len(results), self.errors[0]),
+            is_transient=all(error.is_transient for error in self.errors))
@@ -0,0 +1,98 @@
+"""
+Immutable, slotted variants of the message models.
+
+    from pymessenger2 import frozen
+
+    buttons = (frozen.PostbackButton(title='Yes'),
+               frozen.PostbackButton(title='No'))
+    element = frozen.Element(title='Arsenal', buttons=buttons)
+
+They take the same arguments and are validated the same way as the models
+they mirror, but have no per-instance `__dict__` and can't be modified:
+lists become tuples and nested models their frozen variant. They can be
+hashed when all their values can, and shared between threads and messages.
+The Serializer encodes every instance once and reuses its JSON, so a
+carousel sent to thousands of recipients is only encoded the first time.
+Use `attr.evolve` to get a modified copy.
+"""
+import collections
+
+import attr
+
+from pymessenger2 import Element, ListElement, QuickReply, Template
+from pymessenger2 import airline, buttons
+from pymessenger2.serializer import register_fragment_type
+
+# Mutable model -> frozen variant
+_variants = {}
+
+
+def _freeze_value(value):
+    variant = _variants.get(type(value))
+    if variant is not None:
+        return freeze(value)
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze_value(item) for item in value)
+    return value
+
+
+def freeze(obj):
+    """
+    Input:
+        obj: message model, eg: a PostbackButton
+    Output:
+        the frozen variant of `obj`, nested models included
+    """
+    if type(obj) in _variants.values():
+        return obj
+    variant = _variants.get(type(obj))
+    if variant is None:
+        raise TypeError("{0!r} has no frozen variant".format(obj))
+    return variant(**dict((field.name, getattr(obj, field.name))
+                          for field in attr.fields(type(obj))))
+
+
+def frozen_model(cls):
+    """Build the frozen variant of the attrs model `cls`.
+    Its values go through `cls` first, for its converters, defaults and
+    checks.
+    """
+    fields = attr.fields(cls)
+    these = collections.OrderedDict(
+        (field.name, attr.ib(default=field.default)) for field in fields)
+    these['_fragment'] = attr.ib(default=None, init=False, repr=False,
+                                 cmp=False)
+
+    def __attrs_post_init__(self):
+        model = cls(**dict((field.name, getattr(self, field.name))
+                           for field in fields))
+        for field in fields:
+            object.__setattr__(self, field.name,
+                               _freeze_value(getattr(model, field.name)))
+
+    body = {'__attrs_post_init__': __attrs_post_init__,
+            '__doc__': cls.__doc__,
+            '__module__': __name__}
+    variant = attr.s(these=these, slots=True, frozen=True)(
+        type(cls.__name__, (object,), body))
+    _variants[cls] = variant
+    return register_fragment_type(variant)
+
+
+Template = frozen_model(Template)
+Element = frozen_model(Element)
+QuickReply = frozen_model(QuickReply)
+ListElement = frozen_model(ListElement)
+
+PostbackButton = frozen_model(buttons.PostbackButton)
+CallButton = frozen_model(buttons.CallButton)
+URLButton = frozen_model(buttons.URLButton)
+ShareButton = frozen_model(buttons.ShareButton)
+
+AirlineItinerary = frozen_model(airline.AirlineItinerary)
+PassengerInfo = frozen_model(airline.PassengerInfo)
+FlightInfo = frozen_model(airline.FlightInfo)
+FlightSchedule = frozen_model(airline.FlightSchedule)
+Airport = frozen_model(airline.Airport)
+PassengerSegmentInfo = frozen_model(airline.PassengerSegmentInfo)
+PriceInfo = frozen_model(airline.PriceInfo)
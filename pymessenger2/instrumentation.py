@@ -0,0 +1,401 @@
+import bisect
+import collections
+import logging
+import re
+import threading
+
+from pymessenger2.utils import monotonic
+
+# Seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0)
+# Bytes
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304,
+                16777216, 67108864)
+
+# Query parameters never logged as is
+SECRET_PARAMS = frozenset(['access_token', 'appsecret_proof'])
+
+# Path segments made of an id, eg: a PSID in a user profile lookup
+_ID_SEGMENT = re.compile(r'(?<=/)\d+(?=/|$)')
+
+
+def endpoint_of(path):
+    """Metric label of a Graph API path, ids replaced to bound the number
+    of label values, eg: 1234567890 -> /{id}
+    """
+    return _ID_SEGMENT.sub('{id}', '/' + path.split('?', 1)[0])
+
+
+def redact(params):
+    """Copy of query parameters with the secrets masked."""
+    if not params:
+        return params
+    return dict((key, '***' if key in SECRET_PARAMS else value)
+                for key, value in params.items())
+
+
+def _body_size(data):
+    if data is None:
+        return 0
+    if isinstance(data, (bytes, bytearray)):
+        return len(data)
+    # upload.MultipartBody, None when streamed chunked
+    return getattr(data, 'size', None)
+
+
+class RequestInfo(object):
+    """One attempt of a Graph API call, as seen by the hooks.
+    `response` is set after a response was received, `exception` after
+    the request failed without response.
+    """
+    __slots__ = ('bot', 'method', 'path', 'params', 'attempt',
+                 'request_bytes', 'started', 'elapsed', 'response',
+                 'exception')
+
+    def __init__(self, bot, method, path, params, attempt, data=None):
+        self.bot = bot
+        self.method = method
+        self.path = path
+        self.params = params
+        self.attempt = attempt
+        self.request_bytes = _body_size(data)
+        self.started = monotonic()
+        self.elapsed = None
+        self.response = None
+        self.exception = None
+
+    def finish(self, response=None, exception=None):
+        self.elapsed = monotonic() - self.started
+        self.response = response
+        self.exception = exception
+
+    @property
+    def endpoint(self):
+        return endpoint_of(self.path)
+
+    @property
+    def status_code(self):
+        return getattr(self.response, 'status_code', None)
+
+    @property
+    def response_bytes(self):
+        content = getattr(self.response, 'content', None)
+        return len(content) if content is not None else None
+
+    @property
+    def error(self):
+        """(code, subcode) of the Graph error reported by the response,
+        None for successful calls. Parsed on access only.
+        """
+        if self.response is None or self.status_code < 400:
+            return None
+        try:
+            data = self.response.json()
+        except ValueError:
+            data = None
+        if type(data) is not dict:
+            return (None, None)
+        error = data.get('error')
+        if isinstance(error, dict):
+            return (error.get('code'), error.get('error_subcode'))
+        # Legacy error format
+        return (data.get('error_code'), None)
+
+
+class Instrumentation(object):
+    """Hooks called around every Graph API call of a Bot.
+
+        bot = Bot(<access_token>, instrumentation=metrics)
+
+    Subclasses override the hooks they need; hooks must be fast and never
+    raise. Bots without instrumentation skip all of this.
+    """
+
+    def before_request(self, info):
+        """Called with a RequestInfo before each attempt is sent."""
+
+    def after_request(self, info):
+        """Called with the finished RequestInfo of each attempt."""
+
+    def on_retry(self, info, delay):
+        """Called when an attempt is retried after `delay` seconds."""
+
+    def on_throttle(self, bot, path, delay):
+        """Called when the rate limiter delayed a call by `delay`
+        seconds.
+        """
+
+    def on_circuit_change(self, bot, endpoint, old_state, new_state):
+        """Called when the circuit breaker circuit of `endpoint` for the
+        bot page goes from `old_state` to `new_state`, see
+        `circuit.CircuitBreaker`.
+        """
+
+
+class Hooks(Instrumentation):
+    """Several Instrumentation called in order."""
+
+    def __init__(self, *instrumentations):
+        self.instrumentations = instrumentations
+
+    def before_request(self, info):
+        for instrumentation in self.instrumentations:
+            instrumentation.before_request(info)
+
+    def after_request(self, info):
+        for instrumentation in self.instrumentations:
+            instrumentation.after_request(info)
+
+    def on_retry(self, info, delay):
+        for instrumentation in self.instrumentations:
+            instrumentation.on_retry(info, delay)
+
+    def on_throttle(self, bot, path, delay):
+        for instrumentation in self.instrumentations:
+            instrumentation.on_throttle(bot, path, delay)
+
+    def on_circuit_change(self, bot, endpoint, old_state, new_state):
+        for instrumentation in self.instrumentations:
+            instrumentation.on_circuit_change(bot, endpoint, old_state,
+                                              new_state)
+
+
+class Histogram(object):
+    """Cumulative histogram over fixed buckets, Prometheus style."""
+    __slots__ = ('buckets', 'counts', 'count', 'sum')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # Last count: values above the last bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        """Iterate over (upper bound, count of values <= bound)."""
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),),
+                                self.counts):
+            total += count
+            yield bound, total
+
+
+class Metrics(Instrumentation):
+    """Collect, per endpoint: latency and payload size histograms, call
+    counts by HTTP status, errors by Graph code and subcode, retries, rate
+    limiter throttling and circuit breaker state changes.
+
+        metrics = Metrics()
+        bot = Bot(<access_token>, instrumentation=metrics)
+        metrics.prometheus()  # text exposition format
+    """
+
+    def __init__(self, latency_buckets=LATENCY_BUCKETS,
+                 size_buckets=SIZE_BUCKETS):
+        self.latency_buckets = tuple(latency_buckets)
+        self.size_buckets = tuple(size_buckets)
+        self._lock = threading.Lock()
+        self.latency = {}
+        self.request_bytes = {}
+        self.response_bytes = {}
+        self.requests = collections.Counter()
+        self.errors = collections.Counter()
+        self.retries = collections.Counter()
+        self.throttled = collections.Counter()
+        self.throttled_seconds = collections.Counter()
+        self.circuit_changes = collections.Counter()
+
+    def _histogram(self, histograms, endpoint, buckets):
+        histogram = histograms.get(endpoint)
+        if histogram is None:
+            histogram = histograms[endpoint] = Histogram(buckets)
+        return histogram
+
+    def after_request(self, info):
+        endpoint = info.endpoint
+        error = info.error
+        status = info.status_code
+        response_bytes = info.response_bytes
+        with self._lock:
+            self._histogram(self.latency, endpoint,
+                            self.latency_buckets).observe(info.elapsed)
+            if info.request_bytes is not None:
+                self._histogram(self.request_bytes, endpoint,
+                                self.size_buckets).observe(info.request_bytes)
+            if response_bytes is not None:
+                self._histogram(self.response_bytes, endpoint,
+                                self.size_buckets).observe(response_bytes)
+            if info.exception is not None:
+                status = type(info.exception).__name__
+            self.requests[(endpoint, str(status))] += 1
+            if error is not None:
+                self.errors[(endpoint,) + error] += 1
+
+    def on_retry(self, info, delay):
+        with self._lock:
+            self.retries[info.endpoint] += 1
+
+    def on_throttle(self, bot, path, delay):
+        endpoint = endpoint_of(path)
+        with self._lock:
+            self.throttled[endpoint] += 1
+            self.throttled_seconds[endpoint] += delay
+
+    def on_circuit_change(self, bot, endpoint, old_state, new_state):
+        with self._lock:
+            self.circuit_changes[(endpoint, new_state)] += 1
+
+    def prometheus(self, prefix='pymessenger'):
+        """Render the metrics in the Prometheus text exposition format."""
+        with self._lock:
+            return PrometheusExporter(prefix).render(self)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace(
+        '\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join('{0}="{1}"'.format(name, _escape(value))
+                          for name, value in sorted(labels.items())) + '}'
+
+
+class PrometheusExporter(object):
+    """Render Metrics in the Prometheus text exposition format, eg: for a
+    /metrics endpoint.
+    """
+
+    def __init__(self, prefix='pymessenger'):
+        self.prefix = prefix
+
+    def render(self, metrics):
+        lines = []
+        self._histograms(lines, 'request_duration_seconds',
+                         'Graph API call latency', metrics.latency)
+        self._histograms(lines, 'request_size_bytes',
+                         'Graph API request body size',
+                         metrics.request_bytes)
+        self._histograms(lines, 'response_size_bytes',
+                         'Graph API response body size',
+                         metrics.response_bytes)
+        self._counter(lines, 'requests_total',
+                      'Graph API calls by HTTP status',
+                      [(_labels(endpoint=endpoint, status=status), value)
+                       for (endpoint, status), value in
+                       metrics.requests.items()])
+        self._counter(lines, 'errors_total',
+                      'Graph API errors by code and subcode',
+                      [(_labels(endpoint=endpoint,
+                                code='' if code is None else code,
+                                subcode='' if subcode is None else subcode),
+                        value)
+                       for (endpoint, code, subcode), value in
+                       metrics.errors.items()])
+        self._counter(lines, 'retries_total', 'Graph API calls retried',
+                      [(_labels(endpoint=endpoint), value)
+                       for endpoint, value in metrics.retries.items()])
+        self._counter(lines, 'throttled_total',
+                      'Calls delayed by the rate limiter',
+                      [(_labels(endpoint=endpoint), value)
+                       for endpoint, value in metrics.throttled.items()])
+        self._counter(lines, 'throttled_seconds_total',
+                      'Seconds waited for the rate limiter',
+                      [(_labels(endpoint=endpoint), value)
+                       for endpoint, value in
+                       metrics.throttled_seconds.items()])
+        self._counter(lines, 'circuit_changes_total',
+                      'Circuit breaker state changes by new state',
+                      [(_labels(endpoint=endpoint, state=state), value)
+                       for (endpoint, state), value in
+                       metrics.circuit_changes.items()])
+        return '\n'.join(lines) + '\n'
+
+    def _header(self, lines, name, help_text, metric_type):
+        lines.append('# HELP {0}_{1} {2}'.format(self.prefix, name,
+                                                 help_text))
+        lines.append('# TYPE {0}_{1} {2}'.format(self.prefix, name,
+                                                 metric_type))
+
+    def _counter(self, lines, name, help_text, samples):
+        self._header(lines, name, help_text, 'counter')
+        for labels, value in sorted(samples):
+            lines.append('{0}_{1}{2} {3}'.format(self.prefix, name, labels,
+                                                 value))
+
+    def _histograms(self, lines, name, help_text, histograms):
+        self._header(lines, name, help_text, 'histogram')
+        metric = '{0}_{1}'.format(self.prefix, name)
+        for endpoint in sorted(histograms):
+            histogram = histograms[endpoint]
+            for bound, count in histogram.cumulative():
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append('{0}_bucket{1} {2}'.format(
+                    metric, _labels(endpoint=endpoint, le=le), count))
+            labels = _labels(endpoint=endpoint)
+            lines.append('{0}_sum{1} {2}'.format(metric, labels,
+                                                 histogram.sum))
+            lines.append('{0}_count{1} {2}'.format(metric, labels,
+                                                   histogram.count))
+
+
+class _Redacted(object):
+    """Query parameters formatted, with their secrets masked, only when
+    the log record is emitted.
+    """
+    __slots__ = ('params',)
+
+    def __init__(self, params):
+        self.params = params
+
+    def __str__(self):
+        return str(redact(self.params))
+
+
+class LoggingHooks(Instrumentation):
+    """Log every Graph API call through `logging`, tokens masked.
+    Records are only formatted when the logger is enabled for `level`.
+    """
+
+    def __init__(self, logger=None, level=logging.DEBUG):
+        self.logger = logger or logging.getLogger("pymessenger")
+        self.level = level
+
+    def before_request(self, info):
+        if self.logger.isEnabledFor(self.level):
+            self.logger.log(self.level, "Graph API %s /%s %s attempt %d "
+                            "(%s bytes)", info.method, info.path,
+                            _Redacted(info.params), info.attempt,
+                            info.request_bytes)
+
+    def after_request(self, info):
+        if not self.logger.isEnabledFor(self.level):
+            return
+        if info.exception is not None:
+            self.logger.log(self.level, "Graph API %s /%s failed after "
+                            "%.3fs: %r", info.method, info.path,
+                            info.elapsed, info.exception)
+        else:
+            self.logger.log(self.level, "Graph API %s /%s %s in %.3fs "
+                            "(%s bytes)", info.method, info.path,
+                            info.status_code, info.elapsed,
+                            info.response_bytes)
+
+    def on_retry(self, info, delay):
+        self.logger.info("Graph API %s /%s retried in %.3fs", info.method,
+                         info.path, delay)
+
+    def on_throttle(self, bot, path, delay):
+        if self.logger.isEnabledFor(self.level):
+            self.logger.log(self.level, "Graph API /%s throttled %.3fs",
+                            path, delay)
+
+    def on_circuit_change(self, bot, endpoint, old_state, new_state):
+        self.logger.warning("Graph API %s circuit %s -> %s", endpoint,
+                            old_state, new_state)
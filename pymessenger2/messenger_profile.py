@@ -0,0 +1,82 @@
+import json
+
+from pymessenger2.broadcast import imap_unordered, DEFAULT_CONCURRENCY
+
+# Messenger profile fields, see
+# https://developers.facebook.com/docs/messenger-platform/reference/messenger-profile-api
+PROFILE_FIELDS = ('account_linking_url', 'persistent_menu', 'get_started',
+                  'greeting', 'whitelisted_domains', 'payment_settings',
+                  'target_audience', 'home_url')
+
+
+class ConfigurationDiff(object):
+    """Field level difference between the current Messenger profile of a
+    page and the desired one.
+    `changed` maps the fields to set to their desired value, `removed`
+    lists the fields to delete.
+    """
+
+    def __init__(self, changed, removed, unchanged):
+        self.changed = changed
+        self.removed = removed
+        self.unchanged = unchanged
+        self.responses = []
+
+    def __bool__(self):
+        return bool(self.changed or self.removed)
+
+    __nonzero__ = __bool__
+
+    def __repr__(self):
+        return 'ConfigurationDiff(changed={0}, removed={1})'.format(
+            sorted(self.changed), self.removed)
+
+
+def diff_configuration(current, desired, fields, serializer):
+    """
+    Input:
+        current: response of Bot.get_configuration
+        desired: <dict> of field to desired value, None meaning removed
+        fields: fields managed, the ones not in `desired` are removed
+        serializer: `serializer.Serializer` normalizing desired values
+    Output:
+        ConfigurationDiff
+    """
+    data = current.get('data') or [{}]
+    current = data[0]
+    changed, removed, unchanged = {}, [], []
+    for field in fields:
+        value = desired.get(field)
+        if value is None:
+            if current.get(field) is not None:
+                removed.append(field)
+            continue
+        # Compare the desired value as it will be sent, eg: attrs models
+        # as dicts
+        normalized = json.loads(serializer.dumps_text(value))
+        if normalized == current.get(field):
+            unchanged.append(field)
+        else:
+            changed[field] = value
+    return ConfigurationDiff(changed, removed, unchanged)
+
+
+def sync_configurations(bots, desired, fields=None, dry_run=False,
+                        concurrency=DEFAULT_CONCURRENCY):
+    """Sync the Messenger profile of many pages in parallel.
+    Input:
+        bots: iterable of Bot, one per page
+        desired: desired configuration <dict>, or a callable returning the
+            one of a given bot
+        fields, dry_run: see Bot.sync_configuration
+        concurrency: number of pages synced at once
+    Output:
+        iterator of (bot, ConfigurationDiff), in completion order; the
+        exception raised instead of the diff if the sync of a page failed
+    """
+    def sync(bot):
+        page_desired = desired(bot) if callable(desired) else desired
+        return bot.sync_configuration(page_desired, fields=fields,
+                                      dry_run=dry_run)
+
+    return imap_unordered(sync, bots, concurrency)
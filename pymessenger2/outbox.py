@@ -0,0 +1,381 @@
+import logging
+import sqlite3
+import threading
+import time
+
+import six
+
+from pymessenger2.exceptions import FacebookError
+from pymessenger2.retry import RetryPolicy
+
+logger = logging.getLogger("pymessenger")
+
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_PENDING = 10000
+# Entries leased from the spool at once
+_LEASE_SIZE = 100
+
+
+class OutboxFull(Exception):
+    """Raised by Outbox.put when the spool stays full past the timeout."""
+
+
+class SQLiteSpool(object):
+    """Durable store of the payloads waiting to be sent.
+    Entries are leased by the workers, then acknowledged (deleted) once
+    Graph confirmed them, released to be tried again later, or buried in
+    the dead letters. Leases only live as long as the process: opening a
+    spool releases the entries a crashed process had leased.
+    """
+
+    def __init__(self, path):
+        """
+            @required:
+                path: SQLite database file, ':memory:' for a volatile spool
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False,
+                                   isolation_level=None)
+        if path != ':memory:':
+            self._db.execute('PRAGMA journal_mode=WAL')
+            # Durable across process crashes, one fsync per checkpoint
+            self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS outbox ('
+            ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+            ' payload BLOB NOT NULL,'
+            ' attempts INTEGER NOT NULL DEFAULT 0,'
+            ' available_at REAL NOT NULL DEFAULT 0,'
+            ' leased INTEGER NOT NULL DEFAULT 0,'
+            ' error TEXT)')
+        self._db.execute(
+            'CREATE INDEX IF NOT EXISTS outbox_available'
+            ' ON outbox (leased, available_at)')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS dead_letters ('
+            ' id INTEGER PRIMARY KEY,'
+            ' payload BLOB NOT NULL,'
+            ' attempts INTEGER NOT NULL,'
+            ' error TEXT,'
+            ' failed_at REAL NOT NULL)')
+        self._db.execute('UPDATE outbox SET leased = 0 WHERE leased = 1')
+
+    def __len__(self):
+        """Number of entries not acknowledged yet, leased ones included."""
+        with self._lock:
+            return self._db.execute(
+                'SELECT COUNT(*) FROM outbox').fetchone()[0]
+
+    def put_many(self, payloads):
+        """Append wire payloads (bytes) in a single transaction."""
+        with self._lock:
+            with self._db:
+                self._db.execute('BEGIN')
+                self._db.executemany(
+                    'INSERT INTO outbox (payload) VALUES (?)',
+                    ((sqlite3.Binary(payload),) for payload in payloads))
+
+    def lease(self, limit, now=None):
+        """Lease up to `limit` entries available at `now`, oldest first.
+        Output:
+            list of (id, payload, attempts)
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            with self._db:
+                self._db.execute('BEGIN IMMEDIATE')
+                rows = self._db.execute(
+                    'SELECT id, payload, attempts FROM outbox'
+                    ' WHERE leased = 0 AND available_at <= ?'
+                    ' ORDER BY id LIMIT ?', (now, limit)).fetchall()
+                self._db.executemany(
+                    'UPDATE outbox SET leased = 1 WHERE id = ?',
+                    ((row[0],) for row in rows))
+        return [(id_, bytes(payload), attempts)
+                for id_, payload, attempts in rows]
+
+    def next_available(self):
+        """Time at which the next delayed entry is available, or None."""
+        with self._lock:
+            return self._db.execute(
+                'SELECT MIN(available_at) FROM outbox WHERE leased = 0'
+            ).fetchone()[0]
+
+    def ack(self, entry_id):
+        with self._lock:
+            self._db.execute('DELETE FROM outbox WHERE id = ?', (entry_id,))
+
+    def release(self, entry_id, delay=0, error=None):
+        """Give a leased entry back, to be tried again after `delay`."""
+        with self._lock:
+            self._db.execute(
+                'UPDATE outbox SET leased = 0, attempts = attempts + 1,'
+                ' available_at = ?, error = ? WHERE id = ?',
+                (time.time() + delay, error, entry_id))
+
+    def unlease(self, entry_ids):
+        """Give leased entries back untried."""
+        with self._lock:
+            self._db.executemany(
+                'UPDATE outbox SET leased = 0 WHERE id = ?',
+                ((entry_id,) for entry_id in entry_ids))
+
+    def bury(self, entry_id, error=None):
+        """Move an entry that can't be sent to the dead letters."""
+        with self._lock:
+            with self._db:
+                self._db.execute('BEGIN')
+                self._db.execute(
+                    'INSERT INTO dead_letters'
+                    ' SELECT id, payload, attempts + 1, ?, ? FROM outbox'
+                    ' WHERE id = ?', (error, time.time(), entry_id))
+                self._db.execute('DELETE FROM outbox WHERE id = ?',
+                                 (entry_id,))
+
+    def dead_letters(self):
+        """Output: list of (id, payload, attempts, error)"""
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT id, payload, attempts, error FROM dead_letters'
+                ' ORDER BY id').fetchall()
+        return [(id_, bytes(payload), attempts, error)
+                for id_, payload, attempts, error in rows]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class Outbox(object):
+    """Durable outbound queue in front of Bot.send_raw.
+
+        with Outbox(bot, SQLiteSpool('outbox.db'), workers=8) as outbox:
+            outbox.put(bot.send_text_message(recipient_id, 'hi',
+                                             do_send=False))
+
+    Payloads are written to the spool before `put` returns, sent by a pool
+    of worker threads and only removed once Graph confirmed them, so the
+    entries pending when the process stops or crashes are sent on the next
+    start. Delivery is at least once: a crash between the Graph response
+    and the acknowledgement sends the entry again.
+
+    Transient failures (connection errors, throttling, `is_transient`
+    errors, see `retry.RetryPolicy`) are tried again with backoff, other
+    failures and entries out of attempts go to the spool dead letters.
+    `put` blocks while `max_pending` entries are waiting.
+    """
+
+    def __init__(self, bot, spool,
+                 workers=DEFAULT_WORKERS,
+                 max_pending=DEFAULT_MAX_PENDING,
+                 retry_policy=None):
+        """
+            @required:
+                bot
+                spool: SQLiteSpool
+            @optional:
+                workers: number of sending threads
+                max_pending: entries waiting before `put` blocks
+                retry_policy: `retry.RetryPolicy` deciding which failures
+                    are tried again, how many times and after which delay
+        """
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.bot = bot
+        self.spool = spool
+        self.workers = workers
+        self.max_pending = max_pending
+        self.retry_policy = retry_policy or RetryPolicy(max_attempts=5)
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self._pending = len(spool)
+        self._leased = []
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._draining = False
+        self._threads = []
+
+    @property
+    def pending(self):
+        """Entries not acknowledged yet, in flight ones included."""
+        return self._pending
+
+    def _encode(self, payload):
+        if isinstance(payload, six.binary_type):
+            return payload
+        return self.bot.serializer.dumps(payload)
+
+    def put(self, payload, timeout=None):
+        """Queue a payload for Bot.send_raw.
+        Input:
+            payload: <dict>, eg: a send_* helper result with do_send=False,
+                or wire <bytes>
+            timeout: seconds to wait for room in the spool, None to wait
+                forever
+        """
+        self.put_many([payload], timeout=timeout)
+
+    def put_many(self, payloads, timeout=None):
+        """Queue many payloads, written to the spool in one transaction.
+        Raises ValidationError, queuing none of them, when the bot has a
+        strict `validator` and a payload <dict> breaks the Send API limits.
+        """
+        payloads = list(payloads)
+        validator = self.bot.validator
+        if validator is not None:
+            for payload in payloads:
+                if type(payload) is dict:
+                    validator.validate(payload)
+        encoded = [self._encode(payload) for payload in payloads]
+        deadline = None if timeout is None else time.time() + timeout
+        with self._condition:
+            if self._stopping:
+                raise RuntimeError("The outbox is stopped")
+            # Backpressure: wait for the workers to catch up
+            while self._pending + len(encoded) > max(self.max_pending,
+                                                     len(encoded)):
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise OutboxFull("{0} entries pending".format(
+                            self._pending))
+                self._condition.wait(remaining)
+            self.spool.put_many(encoded)
+            self._pending += len(encoded)
+            self._condition.notify_all()
+
+    def start(self):
+        with self._condition:
+            self._stopping = self._draining = False
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._work)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, drain=True, timeout=None):
+        """Stop the workers once their current send is done.
+        Input:
+            drain: first send every pending entry, except the ones waiting
+                to be tried again
+            timeout: seconds to wait for the workers
+        """
+        with self._condition:
+            if drain:
+                self._draining = True
+            else:
+                self._stopping = True
+            self._condition.notify_all()
+        deadline = None if timeout is None else time.time() + timeout
+        for thread in self._threads:
+            remaining = None
+            if deadline is not None:
+                remaining = max(0, deadline - time.time())
+            thread.join(remaining)
+        self._threads = [t for t in self._threads if t.is_alive()]
+        with self._condition:
+            leased, self._leased = self._leased, []
+        self.spool.unlease(entry[0] for entry in leased)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop(drain=exc_info[0] is None)
+
+    def _next(self):
+        """Return the next entry to send, None when the worker should
+        leave.
+        """
+        with self._condition:
+            while True:
+                if self._stopping:
+                    return None
+                if not self._leased:
+                    self._leased = self.spool.lease(_LEASE_SIZE)
+                    self._leased.reverse()
+                if self._leased:
+                    self._in_flight += 1
+                    return self._leased.pop()
+                if self._draining:
+                    # Entries in flight may still be released for retry
+                    if not self._in_flight:
+                        self._stopping = True
+                        self._condition.notify_all()
+                        return None
+                    self._condition.wait()
+                    continue
+                self._condition.wait(self._wait_time())
+
+    def _wait_time(self):
+        available_at = self.spool.next_available()
+        if available_at is None:
+            return None
+        return max(0.01, available_at - time.time())
+
+    def _work(self):
+        while True:
+            entry = self._next()
+            if entry is None:
+                return
+            try:
+                self._send(*entry)
+            except Exception:
+                logger.exception("Outbox entry %s failed", entry[0])
+            finally:
+                with self._condition:
+                    self._in_flight -= 1
+                    self._condition.notify_all()
+
+    def _send(self, entry_id, payload, attempts):
+        # Whether the entry leaves the outbox, freeing its room
+        done = True
+        try:
+            try:
+                result = self.bot.send_raw(payload)
+                error = self.bot._response_error(result)
+                if error is None and not isinstance(result, dict):
+                    error = FacebookError('Empty response', is_transient=True)
+            except Exception as e:
+                error = e
+            if error is None:
+                self.spool.ack(entry_id)
+                with self._condition:
+                    self.sent += 1
+                return
+            if self._retriable(error) and (attempts + 1 <
+                                           self.retry_policy.max_attempts):
+                self.spool.release(entry_id,
+                                   self.retry_policy.delay(attempts + 1),
+                                   error=repr(error))
+                done = False
+                with self._condition:
+                    self.retried += 1
+                return
+            logger.warning("Outbox entry %s failed: %r", entry_id, error)
+            self.spool.bury(entry_id, error=repr(error))
+            with self._condition:
+                self.failed += 1
+        finally:
+            if done:
+                with self._condition:
+                    self._pending -= 1
+
+    def _retriable(self, error):
+        """Connection errors and transient Graph errors are tried again;
+        other exceptions, eg: ValidationError or a bug, never succeed.
+        """
+        if isinstance(error, FacebookError):
+            return self.retry_policy.is_retriable(None, {
+                'code': error.code, 'is_transient': error.is_transient})
+        return isinstance(error, self.bot.retry_exceptions)
+
+    def stats(self):
+        return {'pending': self._pending, 'in_flight': self._in_flight,
+                'sent': self.sent, 'failed': self.failed,
+                'retried': self.retried}
@@ -0,0 +1,169 @@
+import collections
+import threading
+
+import six
+
+from pymessenger2 import utils
+from pymessenger2.bot import Bot
+from pymessenger2.dispatcher import parse_events
+from pymessenger2.serializer import default_serializer
+from pymessenger2.session import (make_session, DEFAULT_POOL_CONNECTIONS,
+                                  DEFAULT_POOL_MAXSIZE)
+
+DEFAULT_MAXSIZE = 1000
+DEFAULT_PROOF_CACHE_SIZE = 100000
+
+
+class BotPool(object):
+    """Bots of many Facebook pages, keyed by page ID.
+
+        pool = BotPool(page_tokens, app_secret=<app_secret>)
+        pool[page_id].send_text_message(recipient_id, 'hello')
+
+        for bot, event in pool.route(request_body):
+            ...
+
+    Bots are created on first use and the least recently used ones are
+    dropped past `maxsize`, so serving thousands of pages keeps a bounded
+    number of Bot instances. All the bots share one connection pool and
+    one serializer, and the appsecret proofs are computed once per token,
+    even across evictions.
+    """
+
+    def __init__(self, tokens, app_secret=None,
+                 maxsize=DEFAULT_MAXSIZE,
+                 proof_cache_size=DEFAULT_PROOF_CACHE_SIZE,
+                 session=None,
+                 pool_connections=DEFAULT_POOL_CONNECTIONS,
+                 pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 serializer=None,
+                 bot_class=Bot,
+                 **bot_options):
+        """
+            @required:
+                tokens: <dict> of page ID to page access token, or a
+                    callable returning the token of a page ID, None if
+                    unknown
+            @optional:
+                app_secret: app secret shared by the pages
+                maxsize: max Bot instances kept
+                proof_cache_size: max appsecret proofs kept
+                session: session shared by the bots, built from the
+                    `pool_*` arguments when omitted; required when
+                    `bot_class` is AsyncBot
+                serializer: `serializer.Serializer` shared by the bots
+                bot_class: Bot or a subclass
+                bot_options: other arguments given to every Bot
+        """
+        self._token_for = tokens if callable(tokens) else tokens.get
+        self.app_secret = app_secret
+        self.maxsize = maxsize
+        self.proof_cache_size = proof_cache_size
+        self._owns_session = session is None
+        if session is None:
+            session = make_session(pool_connections=pool_connections,
+                                   pool_maxsize=pool_maxsize)
+        self.session = session
+        self.serializer = serializer or default_serializer
+        self.bot_class = bot_class
+        self.bot_options = bot_options
+        self._bots = collections.OrderedDict()
+        self._proofs = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._bots)
+
+    def __contains__(self, page_id):
+        return six.text_type(page_id) in self._bots
+
+    def __getitem__(self, page_id):
+        bot = self.get(page_id)
+        if bot is None:
+            raise KeyError(page_id)
+        return bot
+
+    def _appsecret_proof(self, access_token):
+        with self._lock:
+            proof = self._proofs.pop(access_token, None)
+        if proof is None:
+            proof = utils.generate_appsecret_proof(access_token,
+                                                   self.app_secret)
+        with self._lock:
+            self._proofs[access_token] = proof
+            while len(self._proofs) > self.proof_cache_size:
+                self._proofs.popitem(last=False)
+        return proof
+
+    def _create(self, page_id, access_token):
+        proof = None
+        if self.app_secret is not None:
+            proof = self._appsecret_proof(access_token)
+        return self.bot_class(access_token,
+                              app_secret=self.app_secret,
+                              appsecret_proof=proof,
+                              session=self.session,
+                              serializer=self.serializer,
+                              **self.bot_options)
+
+    def get(self, page_id):
+        """Return the Bot of a page, or None if its token is unknown."""
+        page_id = six.text_type(page_id)
+        with self._lock:
+            bot = self._bots.pop(page_id, None)
+            if bot is not None:
+                # Python 2 OrderedDict has no move_to_end
+                self._bots[page_id] = bot
+                return bot
+        access_token = self._token_for(page_id)
+        if access_token is None:
+            return None
+        bot = self._create(page_id, access_token)
+        with self._lock:
+            # Another thread may have created it meanwhile
+            existing = self._bots.get(page_id)
+            if existing is not None:
+                return existing
+            self._bots[page_id] = bot
+            self.created += 1
+            while len(self._bots) > self.maxsize:
+                self._bots.popitem(last=False)
+                self.evictions += 1
+        return bot
+
+    def evict(self, page_id):
+        """Drop the Bot of a page, eg: after its token changed."""
+        with self._lock:
+            bot = self._bots.pop(six.text_type(page_id), None)
+            if bot is not None:
+                self._proofs.pop(bot.access_token, None)
+
+    def route(self, body):
+        """Iterate over the events of a webhook request body with the Bot
+        of the page each one was sent to.
+        Input:
+            body: request body, parsed or as JSON bytes/str
+        Output:
+            iterator of (bot, event), bot being None for unknown pages
+        """
+        for event in parse_events(body):
+            yield self.get(event.page_id), event
+
+    def close(self):
+        """Close the shared session, unless it was given by the caller."""
+        with self._lock:
+            self._bots.clear()
+        if self._owns_session:
+            self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def stats(self):
+        return {'size': len(self._bots), 'created': self.created,
+                'evictions': self.evictions, 'proofs': len(self._proofs)}
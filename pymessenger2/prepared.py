@@ -0,0 +1,106 @@
+import json
+import re
+
+import six
+
+from pymessenger2.serializer import default_serializer
+from pymessenger2.validation import STRICT, ValidationError
+
+DEFAULT_NOTIFICATION_TYPE = 'REGULAR'
+
+# PSIDs and notification types need no escaping
+_PLAIN_STRING = re.compile(r'^[A-Za-z0-9_]*\Z')
+
+
+def _json_string(value):
+    """Encode a recipient id or notification type as a JSON string."""
+    value = six.text_type(value)
+    if _PLAIN_STRING.match(value):
+        return b'"' + value.encode('ascii') + b'"'
+    return json.dumps(value).encode('ascii')
+
+
+class PreparedMessage(object):
+    """A message serialized once, to be sent to many recipients.
+    Only the recipient id and the notification type change between two
+    recipients, so the wire bytes of every recipient are made by splicing
+    them around the already encoded message: no dict copy, no re-encoding.
+
+        prepared = PreparedMessage({'attachment': {'type': 'template',
+                                                   'payload': itinerary}})
+        bot.send_message(recipient_id, prepared)
+        bot.broadcast(recipient_ids, prepared)
+    """
+
+    def __init__(self, message, notification_type=None,
+                 serializer=default_serializer):
+        """
+            @required:
+                message: message to send, as given to Bot.send_message
+            @optional:
+                notification_type: default NotificationType of the sends
+                serializer: `serializer.Serializer` encoding the message
+        """
+        self.message = message
+        self.notification_type = notification_type
+        encoded = serializer.dumps({'message': message})
+        # Drop the closing brace to append the recipient fields
+        self._prefix = encoded[:-1] + b',"notification_type":'
+        self._notification_types = {}
+        self._validated_by = None
+        self._violations = []
+
+    @classmethod
+    def from_payload(cls, payload, serializer=default_serializer):
+        """Prepare the payload returned by a send_* helper with
+        `do_send=False`.
+        """
+        return cls(payload['message'],
+                   notification_type=payload.get('notification_type'),
+                   serializer=serializer)
+
+    def validate(self, validator):
+        """Check the message with a `validation.Validator`, once per
+        validator: every recipient is sent the same message. Later calls
+        raise the same ValidationError in STRICT mode, without logging
+        the violations again in WARN mode.
+        Output:
+            list of the Violation found
+        """
+        if validator is self._validated_by:
+            if self._violations and validator.mode == STRICT:
+                raise ValidationError(self._violations)
+            return self._violations
+        self._validated_by = validator
+        try:
+            self._violations = validator.validate({'recipient': {'id': ''},
+                                                   'message': self.message})
+        except ValidationError as e:
+            self._violations = e.violations
+            raise
+        return self._violations
+
+    def _encoded_notification_type(self, notification_type):
+        if notification_type is None:
+            notification_type = self.notification_type
+        value = getattr(notification_type, 'value', notification_type)
+        encoded = self._notification_types.get(value)
+        if encoded is None:
+            encoded = self._notification_types[value] = _json_string(
+                value or DEFAULT_NOTIFICATION_TYPE)
+        return encoded
+
+    def for_recipient(self, recipient_id, notification_type=None):
+        """
+        Input:
+            recipient_id: recipient id to send to
+            notification_type: overrides the prepared notification type
+        Output:
+            wire bytes of the payload, to be given to Bot.send_raw
+        """
+        return b''.join((
+            self._prefix,
+            self._encoded_notification_type(notification_type),
+            b',"recipient":{"id":',
+            _json_string(recipient_id),
+            b'}}'))
@@ -0,0 +1,125 @@
+import math
+import threading
+import time
+
+from pymessenger2.utils import monotonic
+
+
+class TokenBucket(object):
+    """Thread-safe token bucket.
+    Reservations may put the bucket in debt: a caller is told how long to
+    wait for its token instead of polling, which keeps waiting callers in
+    arrival order.
+    """
+
+    def __init__(self, rate, burst, clock=monotonic):
+        """
+            @required:
+                rate: tokens added per second
+                burst: max tokens stored, ie: max calls sent at once
+        """
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate must be positive and burst at least 1")
+        self.rate = float(rate)
+        self.burst = burst
+        self.clock = clock
+        self.tokens = float(burst)
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, tokens=1):
+        """Take `tokens` from the bucket.
+        Output:
+            seconds to wait before the tokens are actually available
+        """
+        with self.lock:
+            self._refill()
+            self.tokens -= tokens
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    @property
+    def wait_time(self):
+        """Seconds a new call would wait for its token."""
+        with self.lock:
+            self._refill()
+            if self.tokens >= 1:
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    @property
+    def queue_depth(self):
+        """Number of reserved calls still waiting for their token."""
+        with self.lock:
+            self._refill()
+            if self.tokens >= 0:
+                return 0
+            return int(math.ceil(-self.tokens))
+
+
+class RateLimiter(object):
+    """Token buckets keyed by page access token, to throttle sends before
+    they hit the Messenger per-page limits (errors 4 and 613). One limiter
+    can be shared between all the Bot instances of a page, or of many
+    pages.
+
+        limiter = RateLimiter(rate=250, burst=50)
+        bot = Bot(<access_token>, rate_limiter=limiter)
+    """
+
+    def __init__(self, rate, burst=None, clock=monotonic, sleep=time.sleep):
+        """
+            @required:
+                rate: calls per second allowed for each page token
+            @optional:
+                burst: calls allowed at once, defaults to `rate`
+        """
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self.clock = clock
+        self.sleep = sleep
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def bucket(self, key):
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            with self.lock:
+                bucket = self.buckets.get(key)
+                if bucket is None:
+                    bucket = TokenBucket(self.rate, self.burst, self.clock)
+                    self.buckets[key] = bucket
+        return bucket
+
+    def reserve(self, key, tokens=1):
+        """Reserve `tokens` calls for `key` without blocking.
+        Output:
+            seconds to wait before sending
+        """
+        return self.bucket(key).reserve(tokens)
+
+    def acquire(self, key, tokens=1):
+        """Block the calling thread until `tokens` calls are allowed.
+        Output:
+            seconds waited
+        """
+        delay = self.reserve(key, tokens)
+        if delay > 0:
+            self.sleep(delay)
+        return delay
+
+    def wait_time(self, key):
+        return self.bucket(key).wait_time
+
+    def queue_depth(self, key=None):
+        """Number of throttled calls waiting, for `key` or overall."""
+        if key is not None:
+            return self.bucket(key).queue_depth
+        return sum(bucket.queue_depth for bucket in list(self.buckets.values()))
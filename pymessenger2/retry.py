@@ -0,0 +1,102 @@
+import random
+import time
+
+# Graph error codes worth retrying
+# https://developers.facebook.com/docs/graph-api/using-graph-api/error-handling
+# https://developers.facebook.com/docs/messenger-platform/reference/send-api/error-codes
+RETRY_CODES = frozenset([
+    1,     # Unknown error, usually temporary
+    2,     # Service temporarily unavailable
+    4,     # Application request limit reached
+    17,    # User request limit reached
+    32,    # Page request limit reached
+    341,   # Application limit reached
+    613,   # Calls to this api have exceeded the rate limit
+    1200,  # Temporary send message failure
+])
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+
+def parse_retry_after(value):
+    """Return the seconds of a Retry-After header, None if missing or
+    given as an HTTP date.
+    """
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy(object):
+    """How a Bot retries the Graph API calls failing for transient reasons.
+
+        bot = Bot(<access_token>, retry_policy=RetryPolicy(max_attempts=5))
+
+    A call is retried when the HTTP status is in `retry_statuses`, the Graph
+    error code is in `retry_codes` or the error is flagged `is_transient`,
+    and on connection errors and timeouts, only raised before the request
+    was sent for the calls other than GETs. The wait between attempts grows
+    exponentially, with full jitter, unless Graph gives a Retry-After.
+    """
+
+    def __init__(self,
+                 max_attempts=3,
+                 backoff=0.5,
+                 max_backoff=30,
+                 jitter=True,
+                 retry_codes=RETRY_CODES,
+                 retry_statuses=RETRY_STATUSES,
+                 retry_transient=True,
+                 retry_connection_errors=True,
+                 sleep=time.sleep):
+        """
+            @optional:
+                max_attempts: attempts made in total, including the first
+                backoff: seconds waited after the first attempt, doubled
+                    after every following one
+                max_backoff: upper bound of the exponential backoff
+                jitter: wait a random time between 0 and the backoff
+                retry_codes: Graph error codes to retry
+                retry_statuses: HTTP statuses to retry
+                retry_transient: retry the errors flagged is_transient
+                retry_connection_errors: retry connection errors/timeouts
+        """
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1")
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.retry_codes = frozenset(retry_codes)
+        self.retry_statuses = frozenset(retry_statuses)
+        self.retry_transient = retry_transient
+        self.retry_connection_errors = retry_connection_errors
+        self.sleep = sleep
+
+    def is_retriable(self, status_code=None, error_params=None):
+        """
+        Input:
+            status_code: HTTP status of the response
+            error_params: error fields, as given by Bot._get_error_params
+        Output:
+            whether the call should be retried
+        """
+        if status_code in self.retry_statuses:
+            return True
+        if error_params:
+            if self.retry_transient and error_params.get('is_transient'):
+                return True
+            if error_params.get('code') in self.retry_codes:
+                return True
+        return False
+
+    def delay(self, attempt, retry_after=None):
+        """Seconds to wait after the failed `attempt` (starting at 1)."""
+        if retry_after is not None:
+            return retry_after
+        backoff = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        if self.jitter:
+            backoff = random.uniform(0, backoff)
+        return backoff
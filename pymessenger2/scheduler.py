@@ -0,0 +1,172 @@
+import logging
+import threading
+import zlib
+
+import six
+from six.moves import queue
+
+from pymessenger2.utils import monotonic
+
+logger = logging.getLogger("pymessenger")
+
+DEFAULT_SHARDS = 10
+
+_STOP = object()
+
+
+class ShardStats(object):
+    """Counters of one shard of an OrderedScheduler."""
+    __slots__ = ('sent', 'failed', 'total_latency', 'max_latency')
+
+    def __init__(self):
+        self.sent = 0
+        self.failed = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def record(self, latency, failed):
+        if failed:
+            self.failed += 1
+        else:
+            self.sent += 1
+        self.total_latency += latency
+        if latency > self.max_latency:
+            self.max_latency = latency
+
+    @property
+    def mean_latency(self):
+        count = self.sent + self.failed
+        return self.total_latency / count if count else 0.0
+
+
+def shard_of(recipient_id, shards):
+    """Shard of a recipient, stable across processes."""
+    return zlib.crc32(
+        six.text_type(recipient_id).encode('utf8')) % shards
+
+
+class OrderedScheduler(object):
+    """Send payloads in parallel across recipients while keeping the
+    messages of each recipient in order.
+
+        with OrderedScheduler(bot, shards=20) as scheduler:
+            scheduler.submit(bot.send_action(psid, 'typing_on',
+                                             do_send=False))
+            scheduler.submit(bot.send_text_message(psid, 'Hello!',
+                                                   do_send=False))
+
+    Recipients are sharded by ID over `shards` worker threads, each one
+    sending its queue in submission order, so two messages to the same
+    PSID never overtake each other. A message still goes out when an
+    earlier one to the same recipient failed; its result is given to the
+    callback.
+    """
+
+    def __init__(self, bot, shards=DEFAULT_SHARDS, max_queued=1000,
+                 send=None):
+        """
+            @required:
+                bot
+            @optional:
+                shards: number of shards, ie: sending threads
+                max_queued: payloads queued per shard before `submit`
+                    blocks, 0 for no limit
+                send: callable sending one payload, defaults to
+                    Bot.send_raw
+        """
+        if shards < 1:
+            raise ValueError("shards must be at least 1")
+        self.bot = bot
+        self.shards = shards
+        self.send = send or bot.send_raw
+        self._queues = [queue.Queue(maxsize=max_queued)
+                        for _ in range(shards)]
+        self._stats = [ShardStats() for _ in range(shards)]
+        self._threads = []
+        for index in range(shards):
+            thread = threading.Thread(target=self._work, args=(index,))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, payload, recipient_id=None, callback=None):
+        """Queue a payload behind the ones already queued for its
+        recipient.
+        Input:
+            payload: <dict> as built with do_send=False, or wire <bytes>
+            recipient_id: required for <bytes> payloads, read from the
+                payload otherwise
+            callback: callable receiving (payload, result), result being
+                the response from API or the raised exception
+        """
+        if recipient_id is None:
+            recipient_id = payload['recipient']['id']
+        index = shard_of(recipient_id, self.shards)
+        self._queues[index].put((payload, callback, monotonic()))
+
+    def _work(self, index):
+        items = self._queues[index]
+        stats = self._stats[index]
+        while True:
+            item = items.get()
+            try:
+                if item is _STOP:
+                    return
+                payload, callback, queued_at = item
+                try:
+                    result = self.send(payload)
+                except Exception as e:
+                    result = e
+                stats.record(monotonic() - queued_at,
+                             isinstance(result, Exception) or (
+                                 type(result) is dict and 'error' in result))
+                if callback is not None:
+                    try:
+                        callback(payload, result)
+                    except Exception:
+                        logger.exception("Scheduler callback failed")
+            finally:
+                items.task_done()
+
+    def queue_depth(self, recipient_id=None):
+        """Payloads waiting in the shard of `recipient_id`, or in all the
+        shards.
+        """
+        if recipient_id is not None:
+            return self._queues[shard_of(recipient_id, self.shards)].qsize()
+        return sum(items.qsize() for items in self._queues)
+
+    def join(self):
+        """Wait until every submitted payload is sent."""
+        for items in self._queues:
+            items.join()
+
+    def close(self, wait=True):
+        """Stop the workers, after sending the queued payloads if `wait`."""
+        for items in self._queues:
+            if not wait:
+                # Drop what is still queued
+                while True:
+                    try:
+                        items.get_nowait()
+                    except queue.Empty:
+                        break
+                    items.task_done()
+            items.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def stats(self):
+        """Output: list of per shard <dict>, in shard order"""
+        return [{'depth': items.qsize(),
+                 'sent': stats.sent,
+                 'failed': stats.failed,
+                 'mean_latency': stats.mean_latency,
+                 'max_latency': stats.max_latency}
+                for items, stats in zip(self._queues, self._stats)]
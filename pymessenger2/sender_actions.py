@@ -0,0 +1,139 @@
+import collections
+import threading
+
+from pymessenger2.utils import monotonic
+
+# Seconds Messenger shows the typing indicator without a new typing_on
+TYPING_TIMEOUT = 20
+
+MARK_SEEN = 'mark_seen'
+TYPING_ON = 'typing_on'
+TYPING_OFF = 'typing_off'
+
+
+class _Indicators(object):
+    """What the recipient currently sees. `typing_since` is None when the
+    indicator is off, `typing_known` False when its state is unknown, eg:
+    after a failed call.
+    """
+    __slots__ = ('typing_since', 'typing_known', 'seen_at')
+
+    def __init__(self):
+        self.typing_since = None
+        self.typing_known = False
+        self.seen_at = None
+
+
+class SenderActions(object):
+    """Track the sender actions of each recipient and drop the redundant
+    ones, for Bot.send_action:
+
+        bot = Bot(<access_token>, sender_actions=SenderActions(window=2))
+
+    - typing_on is dropped while the indicator is already on, ie: less than
+      `typing_timeout` seconds after the previous typing_on;
+    - typing_off is dropped when the indicator is already off, in
+      particular once a message was sent to the recipient, since Messenger
+      clears the indicator itself;
+    - mark_seen is dropped when repeated within `window` seconds.
+
+    Dropped actions return {'recipient_id': ...} like Graph does, without
+    calling it. The state of a recipient is unknown until its first typing
+    action and after a failed call, then nothing is dropped.
+    """
+
+    def __init__(self, window=1.0, typing_timeout=TYPING_TIMEOUT,
+                 maxsize=10000, clock=monotonic):
+        """
+            @optional:
+                window: seconds during which a repeated mark_seen is
+                    dropped
+                typing_timeout: seconds the typing indicator stays on
+                maxsize: max recipients tracked, the least recently used
+                    being forgotten first
+        """
+        self.window = window
+        self.typing_timeout = typing_timeout
+        self.maxsize = maxsize
+        self.clock = clock
+        self._recipients = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.sent = collections.Counter()
+        self.saved = collections.Counter()
+
+    def __len__(self):
+        return len(self._recipients)
+
+    def _indicators(self, key):
+        # Must hold the lock
+        indicators = self._recipients.pop(key, None)
+        if indicators is None:
+            indicators = _Indicators()
+            while len(self._recipients) >= self.maxsize:
+                self._recipients.popitem(last=False)
+        # Python 2 OrderedDict has no move_to_end
+        self._recipients[key] = indicators
+        return indicators
+
+    def acquire(self, key, action):
+        """Return whether `action` has to be sent to the recipient `key`,
+        and if so record it as sent.
+        """
+        with self._lock:
+            now = self.clock()
+            indicators = self._indicators(key)
+            if action == MARK_SEEN:
+                redundant = (indicators.seen_at is not None and
+                             now - indicators.seen_at < self.window)
+                if not redundant:
+                    indicators.seen_at = now
+            elif action in (TYPING_ON, TYPING_OFF):
+                typing = (indicators.typing_since is not None and
+                          now - indicators.typing_since < self.typing_timeout)
+                redundant = (indicators.typing_known and
+                             typing == (action == TYPING_ON))
+                if not redundant:
+                    indicators.typing_known = True
+                    indicators.typing_since = (now if action == TYPING_ON
+                                               else None)
+            else:
+                redundant = False
+            if redundant:
+                self.saved[action] += 1
+            else:
+                self.sent[action] += 1
+            return not redundant
+
+    def failed(self, key, action):
+        """Forget what a failed `action` changed."""
+        with self._lock:
+            indicators = self._recipients.get(key)
+            if indicators is None:
+                return
+            if action == MARK_SEEN:
+                indicators.seen_at = None
+            elif action in (TYPING_ON, TYPING_OFF):
+                indicators.typing_known = False
+                indicators.typing_since = None
+
+    def message_sent(self, key):
+        """Record a message sent to the recipient: Messenger turns its
+        typing indicator off.
+        """
+        with self._lock:
+            indicators = self._indicators(key)
+            indicators.typing_known = True
+            indicators.typing_since = None
+
+    def clear(self):
+        with self._lock:
+            self._recipients.clear()
+
+    def stats(self):
+        """Output: <dict> with the actions sent and the calls saved, by
+        action.
+        """
+        with self._lock:
+            return {'sent': dict(self.sent), 'saved': dict(self.saved),
+                    'calls_saved': sum(self.saved.values()),
+                    'recipients': len(self._recipients)}
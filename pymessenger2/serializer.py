@@ -0,0 +1,144 @@
+import json
+import re
+import threading
+
+import attr
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_encoders = {}
+
+# Stand-in of a cached fragment in the encoded output, as escaped by both
+# JSON backends: "\u0000pm2:<id>"
+_FRAGMENT_MARK = '\x00pm2:'
+_FRAGMENT = re.compile(br'"\\u0000pm2:(\d+)"')
+_local = threading.local()
+# Types whose JSON is cached on the instance, see `pymessenger2.frozen`
+_fragment_types = set()
+
+
+def compile_encoder(cls):
+    """Generate the function turning an attrs instance of `cls` into a dict,
+    leaving out the None fields.
+    The function is built from the attrs field list, the same way attrs
+    generates `__init__`, so encoding only costs one attribute lookup per
+    field. Nested attrs instances are left as is: the JSON backend calls
+    `encode_default` on them in turn.
+    """
+    lines = ['def encode(obj):', '    d = {}']
+    for field in attr.fields(cls):
+        if field.name.startswith('_'):
+            # Private state, eg: the cached fragment of frozen models
+            continue
+        lines.append('    value = obj.{0}'.format(field.name))
+        lines.append('    if value is not None:')
+        lines.append('        d[{0!r}] = value'.format(str(field.name)))
+    lines.append('    return d')
+    namespace = {}
+    code = compile('\n'.join(lines),
+                   '<pymessenger2 encoder {0}>'.format(cls.__name__), 'exec')
+    exec(code, namespace)
+    return namespace['encode']
+
+
+def encode_default(obj):
+    """JSON `default` hook encoding the attrs message models."""
+    encoder = _encoders.get(type(obj))
+    if encoder is None:
+        if not hasattr(obj, '__attrs_attrs__'):
+            raise TypeError("{0!r} is not JSON serializable".format(obj))
+        encoder = _encoders[type(obj)] = compile_encoder(type(obj))
+    return encoder(obj)
+
+
+def register_fragment_type(cls):
+    """Cache the JSON of the instances of `cls`, an immutable attrs class
+    with a `_fragment` attribute, on their first encoding.
+    """
+    _fragment_types.add(cls)
+    return cls
+
+
+def _encode_fragment(obj):
+    """JSON `default` hook of the Serializer: registered types are
+    replaced by a mark, swapped for their cached JSON once the payload is
+    encoded.
+    """
+    if type(obj) in _fragment_types:
+        key = str(id(obj))
+        _local.objects[key.encode('ascii')] = obj
+        return _FRAGMENT_MARK + key
+    return encode_default(obj)
+
+
+class Serializer(object):
+    """Encode payloads to their wire bytes, once per message.
+
+        serializer = Serializer()
+        serializer.dumps({'message': {'attachment': ...}})
+
+    `backend` is 'orjson' or 'json'; by default orjson is used when it is
+    installed.
+    """
+
+    def __init__(self, backend=None):
+        if backend is None:
+            backend = 'orjson' if orjson is not None else 'json'
+        if backend == 'orjson':
+            if orjson is None:
+                raise ImportError("orjson is not installed")
+            self._dumps = self._orjson_dumps
+        elif backend == 'json':
+            self._encoder = json.JSONEncoder(default=_encode_fragment,
+                                             separators=(',', ':'))
+            self._dumps = self._json_dumps
+        else:
+            raise ValueError("Unknown JSON backend {0!r}".format(backend))
+        self.backend = backend
+
+    def _orjson_dumps(self, payload):
+        return orjson.dumps(payload, default=_encode_fragment)
+
+    def _json_dumps(self, payload):
+        return self._encoder.encode(payload).encode('utf8')
+
+    def dumps(self, payload):
+        """
+        Input:
+            payload: <dict> possibly holding message models
+        Output:
+            JSON encoded payload as UTF-8 <bytes>
+        """
+        objects = _local.objects = {}
+        data = self._dumps(payload)
+        if not objects:
+            return data
+        # [text, id, text, id, ..., text]
+        parts = _FRAGMENT.split(data)
+        for i in range(1, len(parts), 2):
+            obj = objects.get(parts[i])
+            if obj is None:
+                # A string looking like a mark
+                parts[i] = b'"\\u0000pm2:' + parts[i] + b'"'
+            else:
+                parts[i] = obj._fragment or self.fragment(obj)
+        return b''.join(parts)
+
+    def fragment(self, obj):
+        """JSON of an instance of a registered type, encoded on first use
+        then cached on the instance.
+        """
+        fragment = obj._fragment
+        if fragment is None:
+            fragment = self.dumps(encode_default(obj))
+            object.__setattr__(obj, '_fragment', fragment)
+        return fragment
+
+    def dumps_text(self, payload):
+        return self.dumps(payload).decode('utf8')
+
+
+default_serializer = Serializer()
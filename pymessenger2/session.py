@@ -0,0 +1,36 @@
+import requests
+from requests.adapters import HTTPAdapter
+from six.moves import http_cookiejar
+
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 10
+
+
+def make_session(pool_connections=DEFAULT_POOL_CONNECTIONS,
+                 pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 pool_block=False,
+                 keep_alive=True):
+    """Build a pooled keep-alive session for Graph API calls.
+    The session can be shared by many Bot instances and threads: cookies
+    are never stored, so the only shared state is the urllib3 connection
+    pool, which is thread-safe.
+    Input:
+        pool_connections: number of per-host pools to keep
+        pool_maxsize: max connections kept open per host
+        pool_block: block instead of opening extra connections when
+            pool_maxsize connections are already in use
+        keep_alive: reuse connections across requests
+    Output:
+        requests.Session
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections,
+                          pool_maxsize=pool_maxsize,
+                          pool_block=pool_block)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.cookies.set_policy(
+        http_cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+    if not keep_alive:
+        session.headers['Connection'] = 'close'
+    return session
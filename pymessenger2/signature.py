@@ -0,0 +1,149 @@
+import hashlib
+import hmac
+import io
+
+import six
+
+SIGNATURE_HEADERS = ('X-Hub-Signature-256', 'X-Hub-Signature')
+
+_DIGESTS = {
+    'sha1': hashlib.sha1,
+    'sha256': hashlib.sha256,
+}
+
+_CHUNK_SIZE = 64 * 1024
+
+
+class SignatureCheck(object):
+    """Incremental check of one request body against its signature header.
+
+        check = verifier.check(signature_header)
+        for chunk in body_chunks:
+            check.update(chunk)
+        check.verify()
+    """
+
+    def __init__(self, hmac_object, expected):
+        self._hmac = hmac_object
+        self._expected = expected
+
+    def update(self, chunk):
+        """Feed a body chunk: bytes, bytearray or memoryview."""
+        if self._hmac is not None:
+            self._hmac.update(chunk)
+
+    def verify(self):
+        if self._hmac is None:
+            return False
+        return hmac.compare_digest(self._hmac.hexdigest().encode('ascii'),
+                                   self._expected)
+
+
+class SignatureVerifier(object):
+    """Verify the X-Hub-Signature (sha1) and X-Hub-Signature-256 headers
+    Facebook signs webhook requests with.
+    https://developers.facebook.com/docs/messenger-platform/webhook#security
+
+        verifier = SignatureVerifier(<app_secret>)
+        verifier.verify(request_body, request.headers['X-Hub-Signature-256'])
+
+    The HMAC key is processed once, each check copies the keyed state.
+    Digests are compared in constant time.
+    """
+
+    def __init__(self, app_secret):
+        if isinstance(app_secret, six.text_type):
+            app_secret = app_secret.encode('utf8')
+        self._keyed = dict(
+            (name, hmac.new(app_secret, digestmod=digest))
+            for name, digest in _DIGESTS.items())
+
+    def check(self, signature_header):
+        """Start the incremental check of a request body.
+        Input:
+            signature_header: value of X-Hub-Signature(-256), eg: sha256=...
+        Output:
+            SignatureCheck, always failing when the header is malformed
+        """
+        if isinstance(signature_header, six.text_type):
+            try:
+                signature_header = signature_header.encode('ascii')
+            except UnicodeError:
+                return SignatureCheck(None, None)
+        method, _, signature = (signature_header or b'').partition(b'=')
+        keyed = self._keyed.get(method.decode('ascii', 'replace'))
+        if keyed is None or not signature:
+            return SignatureCheck(None, None)
+        return SignatureCheck(keyed.copy(), signature.lower())
+
+    def verify(self, body, signature_header):
+        """
+        Input:
+            body: request body as bytes, bytearray or memoryview
+            signature_header: value of X-Hub-Signature(-256)
+        Output:
+            boolean indicating that the signature is valid
+        """
+        check = self.check(signature_header)
+        check.update(body)
+        return check.verify()
+
+    def verify_headers(self, body, headers):
+        """Verify a body against the strongest signature among `headers`."""
+        header = signature_from_headers(headers)
+        return header is not None and self.verify(body, header)
+
+
+def signature_from_headers(headers):
+    """Return X-Hub-Signature-256 or, failing that, X-Hub-Signature."""
+    for name in SIGNATURE_HEADERS:
+        value = headers.get(name)
+        if value:
+            return value
+    return None
+
+
+def _forbidden(start_response):
+    start_response('403 Forbidden', [('Content-Type', 'text/plain'),
+                                     ('Content-Length', '17')])
+    return [b'Invalid signature']
+
+
+class WSGISignatureMiddleware(object):
+    """WSGI middleware refusing, with a 403, the POST requests whose body
+    doesn't match their signature, before the application parses it.
+
+        app.wsgi_app = WSGISignatureMiddleware(app.wsgi_app, <app_secret>)
+
+    The body is hashed while it is read, then handed to the application.
+    """
+
+    def __init__(self, app, app_secret, chunk_size=_CHUNK_SIZE):
+        self.app = app
+        self.verifier = SignatureVerifier(app_secret)
+        self.chunk_size = chunk_size
+
+    def __call__(self, environ, start_response):
+        if environ.get('REQUEST_METHOD') != 'POST':
+            return self.app(environ, start_response)
+        signature_header = (environ.get('HTTP_X_HUB_SIGNATURE_256') or
+                            environ.get('HTTP_X_HUB_SIGNATURE'))
+        check = self.verifier.check(signature_header)
+        try:
+            remaining = int(environ.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return _forbidden(start_response)
+        stream = environ['wsgi.input']
+        body = io.BytesIO()
+        while remaining > 0:
+            chunk = stream.read(min(self.chunk_size, remaining))
+            if not chunk:
+                break
+            check.update(chunk)
+            body.write(chunk)
+            remaining -= len(chunk)
+        if not check.verify():
+            return _forbidden(start_response)
+        body.seek(0)
+        environ['wsgi.input'] = body
+        return self.app(environ, start_response)
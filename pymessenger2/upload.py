@@ -0,0 +1,328 @@
+import json
+import mimetypes
+import os
+import uuid
+
+import six
+
+from pymessenger2.utils import monotonic
+
+CHUNK_SIZE = 64 * 1024
+DEFAULT_CONTENT_TYPE = 'application/octet-stream'
+
+# Bytes needed to sniff the content type
+_HEADER_SIZE = 32
+
+# (offset, magic bytes, content type), checked in order
+_SIGNATURES = (
+    (0, b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (0, b'\xff\xd8\xff', 'image/jpeg'),
+    (0, b'GIF87a', 'image/gif'),
+    (0, b'GIF89a', 'image/gif'),
+    (0, b'%PDF-', 'application/pdf'),
+    (0, b'ID3', 'audio/mpeg'),
+    (0, b'OggS', 'audio/ogg'),
+    (0, b'fLaC', 'audio/flac'),
+    (0, b'\x1a\x45\xdf\xa3', 'video/webm'),
+    (0, b'PK\x03\x04', 'application/zip'),
+    (4, b'ftypqt', 'video/quicktime'),
+    (4, b'ftypM4A', 'audio/mp4'),
+    (4, b'ftyp', 'video/mp4'),
+)
+
+_RIFF_TYPES = {
+    b'WAVE': 'audio/wav',
+    b'WEBP': 'image/webp',
+    b'AVI ': 'video/x-msvideo',
+}
+
+
+def sniff_content_type(header):
+    """Content type of a file from its first bytes, None if unknown."""
+    for offset, magic, content_type in _SIGNATURES:
+        if header[offset:offset + len(magic)] == magic:
+            return content_type
+    if header[:4] == b'RIFF':
+        return _RIFF_TYPES.get(header[8:12])
+    # MPEG audio frame sync, for mp3 files without ID3 tag
+    if (len(header) > 1 and six.indexbytes(header, 0) == 0xff and
+            six.indexbytes(header, 1) & 0xe0 == 0xe0):
+        return 'audio/mpeg'
+    return None
+
+
+def guess_content_type(filename=None, header=b''):
+    """Content type from the file name extension, then from the content.
+    Input:
+        filename: name of the file, eg: clip.final.mp4
+        header: first bytes of the content
+    """
+    if filename:
+        content_type = mimetypes.guess_type(filename)[0]
+        if content_type:
+            return content_type
+    return sniff_content_type(header) or DEFAULT_CONTENT_TYPE
+
+
+def _as_buffer(source):
+    """Return a byte memoryview over `source`, None if it isn't a buffer."""
+    if isinstance(source, six.string_types):
+        return None
+    try:
+        view = memoryview(source)
+    except TypeError:
+        return None
+    if view.itemsize != 1 or view.ndim != 1:
+        view = view.cast('B')
+    return view
+
+
+class AttachmentSource(object):
+    """Content of an attachment, read chunk by chunk.
+    Accepts a path, a file object, a buffer (bytes, bytearray, memoryview,
+    mmap) or an iterable of bytes chunks. Buffers are sliced without
+    copies; files and iterators are read one chunk at a time, so memory
+    stays bounded whatever the size. Non seekable files and iterators
+    can only be read once: `replayable` is False.
+    """
+
+    def __init__(self, source, filename=None, content_type=None,
+                 size=None, chunk_size=CHUNK_SIZE):
+        """
+            @required:
+                source: path, file object, buffer or chunks iterable
+            @optional:
+                filename: name sent to Facebook, defaults to the basename
+                    of the path or file object name
+                content_type: MIME type, guessed from the filename and the
+                    first bytes when omitted
+                size: size in bytes of a chunks iterable, sent as
+                    Content-Length instead of chunked transfer encoding
+                chunk_size: bytes read at once
+        """
+        self.chunk_size = chunk_size
+        self.size = size
+        self._path = None
+        self._file = None
+        self._buffer = None
+        self._chunks = None
+        self._pending = None
+        self._start = 0
+        self._consumed = False
+        self.replayable = True
+        name = None
+        if isinstance(source, six.string_types):
+            self._path = name = source
+            self.size = os.path.getsize(source)
+            with open(source, 'rb') as f:
+                header = f.read(_HEADER_SIZE)
+        elif hasattr(source, 'read'):
+            self._file = source
+            name = getattr(source, 'name', None)
+            header = self._peek_file(source)
+        else:
+            self._buffer = _as_buffer(source)
+            if self._buffer is not None:
+                self.size = self._buffer.nbytes
+                header = self._buffer[:_HEADER_SIZE].tobytes()
+            else:
+                self.replayable = False
+                self._chunks = iter(source)
+                header = self._peek_chunks()
+        if filename is None and isinstance(name, six.string_types):
+            filename = os.path.basename(name)
+        self.filename = filename or 'attachment'
+        self.content_type = content_type or guess_content_type(filename,
+                                                               header)
+
+    def _peek_file(self, f):
+        seekable = getattr(f, 'seekable', lambda: hasattr(f, 'seek'))
+        try:
+            seekable = seekable()
+        except (AttributeError, IOError, ValueError):
+            seekable = False
+        if seekable:
+            self._start = f.tell()
+            f.seek(0, os.SEEK_END)
+            self.size = f.tell() - self._start
+            f.seek(self._start)
+            header = f.read(_HEADER_SIZE)
+            f.seek(self._start)
+            return header
+        self.replayable = False
+        self._pending = [f.read(max(self.chunk_size, _HEADER_SIZE))]
+        return self._pending[0][:_HEADER_SIZE]
+
+    def _peek_chunks(self):
+        # Keep the first chunks until there are enough bytes to sniff
+        self._pending = []
+        read = 0
+        while read < _HEADER_SIZE:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._pending.append(chunk)
+            read += len(chunk)
+        return b''.join(bytes(chunk) for chunk in self._pending)[:_HEADER_SIZE]
+
+    def __iter__(self):
+        if not self.replayable:
+            if self._consumed:
+                raise ValueError("The attachment content can't be read "
+                                 "twice")
+            self._consumed = True
+        if self._buffer is not None:
+            buffer, chunk_size = self._buffer, self.chunk_size
+            for offset in range(0, len(buffer), chunk_size):
+                yield buffer[offset:offset + chunk_size]
+        elif self._path is not None:
+            with open(self._path, 'rb') as f:
+                for chunk in self._read(f):
+                    yield chunk
+        elif self._file is not None:
+            if self.replayable:
+                self._file.seek(self._start)
+            else:
+                for chunk in self._pending:
+                    if chunk:
+                        yield chunk
+            for chunk in self._read(self._file):
+                yield chunk
+        else:
+            for chunk in self._pending:
+                if chunk:
+                    yield chunk
+            for chunk in self._chunks:
+                if chunk:
+                    yield chunk
+
+    def _read(self, f):
+        return iter(lambda: f.read(self.chunk_size), b'')
+
+
+class UploadProgress(object):
+    """State of an upload, given to the progress callback after every
+    chunk and once more when the upload is complete.
+    `total` is None when the size isn't known ahead.
+    """
+    __slots__ = ('sent', 'total', 'started', 'finished')
+
+    def __init__(self, total):
+        self.sent = 0
+        self.total = total
+        self.started = None
+        self.finished = None
+
+    @property
+    def done(self):
+        return self.finished is not None
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or monotonic()) - self.started
+
+    @property
+    def throughput(self):
+        """Bytes per second sent so far."""
+        elapsed = self.elapsed
+        return self.sent / elapsed if elapsed > 0 else 0.0
+
+    def __repr__(self):
+        return 'UploadProgress(sent={0}, total={1}, elapsed={2:.3f})'.format(
+            self.sent, self.total, self.elapsed)
+
+
+def _quote(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace(
+        '\r', '').replace('\n', '')
+
+
+class MultipartBody(object):
+    """multipart/form-data request body streaming one file part.
+    Iterating it yields the encoded body chunk by chunk, with the file
+    content passed through as read from its AttachmentSource. The body
+    has a length, sent as Content-Length, when the size of the source is
+    known.
+    """
+
+    def __init__(self, fields, file_field, source, progress=None):
+        """
+            @required:
+                fields: <dict> of the form fields, as str
+                file_field: name of the file field, eg: filedata
+                source: AttachmentSource
+            @optional:
+                progress: callable receiving an UploadProgress
+        """
+        self.boundary = uuid.uuid4().hex
+        self.content_type = 'multipart/form-data; boundary={0}'.format(
+            self.boundary)
+        self.source = source
+        self.progress = progress
+        parts = []
+        for name, value in fields.items():
+            parts.append(
+                '--{0}\r\nContent-Disposition: form-data; name="{1}"'
+                '\r\n\r\n{2}\r\n'.format(self.boundary, _quote(name), value))
+        parts.append(
+            '--{0}\r\nContent-Disposition: form-data; name="{1}"; '
+            'filename="{2}"\r\nContent-Type: {3}\r\n\r\n'.format(
+                self.boundary, _quote(file_field),
+                _quote(source.filename), source.content_type))
+        self._head = ''.join(parts).encode('utf8')
+        self._tail = '\r\n--{0}--\r\n'.format(self.boundary).encode('ascii')
+        self.size = None
+        if source.size is not None:
+            self.size = len(self._head) + source.size + len(self._tail)
+        self.last_progress = None
+
+    @property
+    def replayable(self):
+        return self.source.replayable
+
+    def __len__(self):
+        if self.size is None:
+            raise TypeError("The size of the body isn't known")
+        return self.size
+
+    def __iter__(self):
+        progress = self.last_progress = UploadProgress(self.source.size)
+        progress.started = monotonic()
+        callback = self.progress
+        yield self._head
+        for chunk in self.source:
+            yield chunk
+            progress.sent += len(chunk)
+            if callback is not None:
+                callback(progress)
+        yield self._tail
+        progress.finished = monotonic()
+        if callback is not None:
+            callback(progress)
+
+    def stream(self):
+        """Request data: the body itself when its size is known, so that
+        it is sent with a Content-Length, else a generator sent chunked.
+        """
+        return self if self.size is not None else iter(self)
+
+
+def attachment_fields(recipient_id, attachment_type, notification_type=None,
+                      reusable=False):
+    """Form fields of an attachment upload, without recipient for the
+    Attachment Upload API.
+    """
+    fields = {
+        'message': json.dumps({
+            'attachment': {
+                'type': attachment_type,
+                'payload': {'is_reusable': True} if reusable else {}
+            }
+        }),
+    }
+    if recipient_id is not None:
+        fields['recipient'] = json.dumps({'id': recipient_id})
+        fields['notification_type'] = notification_type.value
+    return fields
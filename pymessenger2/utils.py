@@ -1,31 +1,33 @@
 import hashlib
 import hmac
+import itertools
+import time
 import six
-import attr
 import json
 
+from pymessenger2.serializer import encode_default
+from pymessenger2.signature import SignatureVerifier
+
+# time.monotonic is not available on Python 2
+monotonic = getattr(time, 'monotonic', time.time)
+
 
 def validate_hub_signature(app_secret, request_payload, hub_signature_header):
     """
         @inputs:
             app_secret: Secret Key for application
             request_payload: request body
-            hub_signature_header: X-Hub-Signature header sent with request
+            hub_signature_header: X-Hub-Signature or X-Hub-Signature-256
+                header sent with request
         @outputs:
             boolean indicated that hub signature is validated
+
+        Use a `signature.SignatureVerifier` to check many requests.
     """
-    try:
-        hash_method, hub_signature = hub_signature_header.split('=')
-    except:
-        pass
-    else:
-        digest_module = getattr(hashlib, hash_method)
-        hmac_object = hmac.new(
-            str(app_secret), str(request_payload), digest_module)
-        generated_hash = hmac_object.hexdigest()
-        if hub_signature == generated_hash:
-            return True
-    return False
+    if isinstance(request_payload, six.text_type):
+        request_payload = request_payload.encode('utf8')
+    return SignatureVerifier(app_secret).verify(request_payload,
+                                                hub_signature_header)
 
 
 def generate_appsecret_proof(access_token, app_secret):
@@ -48,11 +50,21 @@ def generate_appsecret_proof(access_token, app_secret):
     return generated_hash
 
 
+def chunks(iterable, size):
+    """Lazily split an iterable in lists of at most `size` items."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
 class AttrsEncoder(json.JSONEncoder):
+    """Encode the attrs message models, leaving out their None fields.
+    Prefer `serializer.Serializer` to encode whole payloads.
+    """
     def default(self, obj):
         if hasattr(obj, '__attrs_attrs__'):
-            items_iterator = (attr.asdict(obj).items()
-                              if six.PY3 else
-                              attr.asdict(obj).iteritems())
-            return {k: v for k, v in items_iterator if v is not None}
+            return encode_default(obj)
         return json.JSONEncoder.default(self, obj)
@@ -0,0 +1,311 @@
+"""
+Client side checks of the Send API limits, eg: at most 10 generic template
+elements, 3 buttons or 13 quick replies.
+
+    bot = Bot(<access_token>, validator=Validator(mode=WARN))
+
+The checks of every template type are compiled once, at import, and only
+read the fields having a limit: validating costs about a microsecond per
+element, button or quick reply. Payloads can hold dicts as well as the
+message models, frozen or not.
+"""
+import collections
+import logging
+import re
+
+import six
+
+logger = logging.getLogger("pymessenger")
+
+STRICT = 'strict'
+WARN = 'warn'
+OFF = 'off'
+MODES = (STRICT, WARN, OFF)
+
+# https://developers.facebook.com/docs/messenger-platform/reference/send-api
+MAX_TEXT = 2000
+MAX_BUTTON_TEXT = 640
+MAX_TITLE = 80
+MAX_SUBTITLE = 80
+MAX_BUTTON_TITLE = 20
+MAX_QUICK_REPLY_TITLE = 20
+MAX_PAYLOAD = 1000
+MAX_BUTTONS = 3
+MAX_GENERIC_ELEMENTS = 10
+MIN_LIST_ELEMENTS = 2
+MAX_LIST_ELEMENTS = 4
+MAX_QUICK_REPLIES = 13
+
+QUICK_REPLY_TYPES = frozenset(['text', 'location', 'user_phone_number',
+                               'user_email'])
+SENDER_ACTIONS = frozenset(['mark_seen', 'typing_on', 'typing_off'])
+
+Violation = collections.namedtuple('Violation', 'path message')
+
+
+class ValidationError(ValueError):
+    """A payload, or a message model, breaking the Send API limits.
+    `violations` is the list of every Violation(path, message) found.
+    """
+
+    def __init__(self, violations):
+        super(ValidationError, self).__init__('; '.join(
+            '{0}: {1}'.format(path, message)
+            for path, message in violations))
+        self.violations = violations
+
+
+def invalid(path, message):
+    """ValidationError of a single violation, for the model checks."""
+    return ValidationError([Violation(path, message)])
+
+
+#===============================================================================
+# Schema
+#===============================================================================
+# Checks are callables receiving (value, path, violations). `value` is never
+# None and `path` is a linked (parent path, key) pair, None for the payload,
+# only rendered to a string for the violations.
+def _render(path):
+    keys = []
+    while path is not None:
+        path, key = path
+        keys.append(key)
+    rendered = ''
+    for key in reversed(keys):
+        if isinstance(key, int):
+            rendered += '[{0}]'.format(key)
+        else:
+            rendered += '.' + key if rendered else key
+    return rendered or 'payload'
+
+
+def _violation(violations, path, message):
+    violations.append(Violation(_render(path), message))
+
+
+def _get(value, name):
+    if isinstance(value, dict):
+        return value.get(name)
+    return getattr(value, name, None)
+
+
+def string(max_length=None, pattern=None, description=None):
+    pattern = re.compile(pattern) if pattern is not None else None
+
+    def check(value, path, violations):
+        if not isinstance(value, six.string_types):
+            _violation(violations, path, "must be a string, not {0}".format(
+                type(value).__name__))
+        elif max_length is not None and len(value) > max_length:
+            _violation(violations, path,
+                       "longer than {0} characters ({1})".format(
+                           max_length, len(value)))
+        elif pattern is not None and not pattern.match(value):
+            _violation(violations, path, "must be {0}".format(description))
+    return check
+
+
+def one_of(values):
+    values = frozenset(values)
+
+    def check(value, path, violations):
+        if value not in values:
+            _violation(violations, path,
+                       "must be one of {0}, not {1!r}".format(
+                           ', '.join(sorted(values)), value))
+    return check
+
+
+def array(item=None, max_items=None, min_items=0):
+    def check(value, path, violations):
+        if not isinstance(value, (list, tuple)):
+            _violation(violations, path, "must be a list, not {0}".format(
+                type(value).__name__))
+            return
+        if len(value) < min_items:
+            _violation(violations, path, "fewer than {0} items ({1})".format(
+                min_items, len(value)))
+        elif max_items is not None and len(value) > max_items:
+            _violation(violations, path, "more than {0} items ({1})".format(
+                max_items, len(value)))
+        if item is not None:
+            for i, element in enumerate(value):
+                if element is None:
+                    _violation(violations, (path, i), "is required")
+                else:
+                    item(element, (path, i), violations)
+    return check
+
+
+def obj(fields=(), required=(), any_of=(), extra=None):
+    """Check of an object, a dict or a message model. Its fields are read
+    by a function generated from the schema, the same way
+    `serializer.compile_encoder` is, so each costs one lookup.
+    Input:
+        fields: (name, check) of the fields having limits
+        required: names of the mandatory fields
+        any_of: names of which at least one field is mandatory
+        extra: check of the whole object, eg: `by_key`
+    """
+    names = []
+    for name in [name for name, _ in fields] + list(required) + list(any_of):
+        if name not in names:
+            names.append(name)
+    variables = dict((name, 'f{0}'.format(i)) for i, name in
+                     enumerate(names))
+    namespace = {'_violation': _violation, 'extra': extra}
+    lines = ['def check(value, path, violations):',
+             '    if type(value) is dict:']
+    lines.extend('        {0} = value.get({1!r})'.format(variables[name],
+                                                        str(name))
+                 for name in names)
+    lines.append('    else:')
+    lines.extend('        {0} = getattr(value, {1!r}, None)'.format(
+        variables[name], str(name)) for name in names)
+    for name in required:
+        lines.append('    if {0} is None:'.format(variables[name]))
+        lines.append('        _violation(violations, (path, {0!r}), '
+                     '"is required")'.format(str(name)))
+    if any_of:
+        lines.append('    if {0}:'.format(' and '.join(
+            '{0} is None'.format(variables[name]) for name in any_of)))
+        lines.append('        _violation(violations, path, {0!r})'.format(
+            str("requires one of {0}".format(', '.join(any_of)))))
+    for name, field_check in fields:
+        variable = variables[name]
+        namespace['check_' + variable] = field_check
+        lines.append('    if {0} is not None:'.format(variable))
+        lines.append('        check_{0}({0}, (path, {1!r}), '
+                     'violations)'.format(variable, str(name)))
+    if extra is not None:
+        lines.append('    extra(value, path, violations)')
+    code = compile('\n'.join(lines), '<pymessenger2 validation>', 'exec')
+    exec(code, namespace)
+    return namespace['check']
+
+
+def by_key(name, checks):
+    """Check of the objects whose `name` field selects their schema, eg:
+    the type of a button. Unknown values aren't checked.
+    """
+    def check(value, path, violations):
+        key_check = checks.get(_get(value, name))
+        if key_check is not None:
+            key_check(value, path, violations)
+    return check
+
+
+#===============================================================================
+# Send API
+#===============================================================================
+POSTBACK_PAYLOAD = string(MAX_PAYLOAD)
+
+BUTTON = obj(extra=by_key('type', {
+    'postback': obj([('title', string(MAX_BUTTON_TITLE)),
+                     ('payload', POSTBACK_PAYLOAD)],
+                    required=('title', 'payload')),
+    'web_url': obj([('title', string(MAX_BUTTON_TITLE)),
+                    ('url', string())],
+                   required=('title', 'url')),
+    'phone_number': obj([('title', string(MAX_BUTTON_TITLE)),
+                         ('payload', string(
+                             pattern=r'\+[0-9]+$',
+                             description="a phone number with a country "
+                                         "code, eg: +16505551234"))],
+                        required=('title', 'payload')),
+}), required=('type',))
+
+QUICK_REPLY = obj([('content_type', one_of(QUICK_REPLY_TYPES))],
+                  required=('content_type',),
+                  extra=by_key('content_type', {
+                      'text': obj([('title', string(MAX_QUICK_REPLY_TITLE)),
+                                   ('payload', POSTBACK_PAYLOAD)],
+                                  required=('title', 'payload')),
+                  }))
+
+GENERIC_ELEMENT = obj([('title', string(MAX_TITLE)),
+                       ('subtitle', string(MAX_SUBTITLE)),
+                       ('buttons', array(BUTTON, MAX_BUTTONS))],
+                      required=('title',))
+
+LIST_ELEMENT = obj([('title', string(MAX_TITLE)),
+                    ('subtitle', string(MAX_SUBTITLE)),
+                    ('buttons', array(BUTTON, 1))],
+                   required=('title',))
+
+# Checks of the template payloads, by template_type
+TEMPLATES = {
+    'generic': obj([('elements', array(GENERIC_ELEMENT,
+                                       MAX_GENERIC_ELEMENTS, 1))],
+                   required=('elements',)),
+    'list': obj([('elements', array(LIST_ELEMENT, MAX_LIST_ELEMENTS,
+                                    MIN_LIST_ELEMENTS)),
+                 ('buttons', array(BUTTON, 1))],
+                required=('elements',)),
+    'button': obj([('text', string(MAX_BUTTON_TEXT)),
+                   ('buttons', array(BUTTON, MAX_BUTTONS, 1))],
+                  required=('text', 'buttons')),
+}
+
+ATTACHMENT = obj(required=('type', 'payload'), extra=by_key('type', {
+    'template': obj([('payload', by_key('template_type', TEMPLATES))]),
+}))
+
+MESSAGE = obj([('text', string(MAX_TEXT)),
+               ('attachment', ATTACHMENT),
+               ('quick_replies', array(QUICK_REPLY, MAX_QUICK_REPLIES, 1))],
+              any_of=('text', 'attachment'))
+
+PAYLOAD = obj([('message', MESSAGE),
+               ('sender_action', one_of(SENDER_ACTIONS))],
+              required=('recipient',),
+              any_of=('message', 'sender_action'))
+
+
+class Validator(object):
+    """Check the payloads sent by a bot against the Send API limits.
+
+        bot = Bot(<access_token>, validator=Validator())
+
+    In STRICT mode an invalid payload raises ValidationError instead of
+    being sent, in WARN mode its violations are logged and it is sent
+    anyway, OFF skips the checks. Payloads are checked by `send_raw`,
+    `send_batch` and `Outbox.put`; a PreparedMessage is checked once, the
+    first time the bot sends it; wire bytes given to `send_raw` aren't.
+    """
+
+    def __init__(self, mode=STRICT, schema=PAYLOAD):
+        """
+            @optional:
+                mode: STRICT, WARN or OFF
+                schema: check of the whole payload, defaults to the Send
+                    API one
+        """
+        if mode not in MODES:
+            raise ValueError("Unknown validation mode {0!r}".format(mode))
+        self.mode = mode
+        self.schema = schema
+
+    def violations(self, payload):
+        """Output: list of the Violation of `payload`, empty when valid."""
+        violations = []
+        if payload is None:
+            _violation(violations, None, "is required")
+        else:
+            self.schema(payload, None, violations)
+        return violations
+
+    def validate(self, payload):
+        """Apply the mode to the violations of `payload`.
+        Output:
+            list of the Violation found
+        """
+        if self.mode == OFF:
+            return []
+        violations = self.violations(payload)
+        if violations:
+            if self.mode == STRICT:
+                raise ValidationError(violations)
+            logger.warning("Invalid payload: %s", ValidationError(violations))
+        return violations
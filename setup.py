@@ -1,6 +1,6 @@
 from setuptools import setup
 
-installation_requirements = ['requests', 'requests-toolbelt', 'six']
+installation_requirements = ['requests', 'six']
 
 try:
     import enum
@@ -20,6 +20,10 @@ setup(
     packages=['pymessenger2'],
     version='3.1.0',
     install_requires=required,
+    extras_require={
+        'async': ['aiohttp'],
+        'fast': ['orjson'],
+    },
     description="Python Wrapper for Facebook Messenger Platform",
     long_description=long_description,
     author='Charles Crete',
@@ -0,0 +1,252 @@
+import asyncio
+import json
+
+import pytest
+
+aiohttp = pytest.importorskip('aiohttp')
+from aiohttp import web
+
+from pymessenger2 import QuickReply
+from pymessenger2.aio import AsyncBot
+from pymessenger2.attachments import AttachmentCache
+from pymessenger2.cache import ProfileCache
+from pymessenger2.circuit import CLOSED, CircuitBreaker
+from pymessenger2.emulator import GraphEmulator
+from pymessenger2.ratelimit import RateLimiter
+from pymessenger2.retry import RetryPolicy
+from pymessenger2.sender_actions import SenderActions
+
+
+async def _serve(received):
+    async def messages(request):
+        if request.content_type == 'application/json':
+            received.append(await request.json())
+        else:
+            received.append(dict(await request.post()))
+        return web.json_response({'recipient_id': '1', 'message_id': 'mid'})
+
+    async def attachments(request):
+        received.append(dict(await request.post()))
+        return web.json_response({'attachment_id': '42'})
+
+    async def profile(request):
+        received.append(request.path)
+        return web.json_response({'first_name': 'Jane',
+                                  'fields': request.query.get('fields')})
+
+    app = web.Application()
+    app.router.add_post('/me/messages', messages)
+    app.router.add_post('/me/message_attachments', attachments)
+    app.router.add_get('/{psid}', profile)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, 'http://127.0.0.1:{0}'.format(port)
+
+
+def test_async_bot_sends_concurrently(tmpdir):
+    f = tmpdir.join('clip.mp3')
+    f.write_binary(b'ID3')
+
+    async def main():
+        received = []
+        runner, url = await _serve(received)
+        try:
+            async with AsyncBot('token') as bot:
+                bot.graph_url = url
+                results = await asyncio.gather(*[
+                    bot.send_text_message(str(i), 'hi') for i in range(20)])
+                assert all(r['message_id'] == 'mid' for r in results)
+                await bot.send_quick_reply(
+                    '1', 'pick', [QuickReply(content_type='text', title='A')])
+                await bot.send_audio('1', str(f))
+                profile = await bot.get_user_info('1', fields=['first_name'])
+                assert profile == {'first_name': 'Jane',
+                                   'fields': 'first_name'}
+                payload = bot.send_text_message('1', 'hi', do_send=False)
+                assert payload['message'] == {'text': 'hi'}
+        finally:
+            await runner.cleanup()
+        return received
+
+    received = asyncio.run(main())
+    assert len(received) == 23
+    assert received[20]['message']['quick_replies'][0]['payload'] == 'A'
+    assert json.loads(received[21]['message'])['attachment']['type'] == 'audio'
+
+
+def test_async_profile_lookups_are_coalesced():
+    async def main():
+        received = []
+        runner, url = await _serve(received)
+        cache = ProfileCache()
+        try:
+            async with AsyncBot('token', profile_cache=cache) as bot:
+                bot.graph_url = url
+                profiles = await asyncio.gather(*[
+                    bot.get_user_info('1') for _ in range(5)])
+                profiles.append(await bot.get_user_info('1'))
+        finally:
+            await runner.cleanup()
+        return received, profiles, cache
+
+    received, profiles, cache = asyncio.run(main())
+    assert received == ['/1']
+    assert all(profile['first_name'] == 'Jane' for profile in profiles)
+    assert cache.stats()['coalesced'] == 4
+    assert cache.stats()['hits'] == 1
+
+
+def test_async_attachment_uploads_are_coalesced(tmpdir):
+    f = tmpdir.join('clip.mp4')
+    f.write_binary(b'\x00' * 1024)
+
+    async def main():
+        received = []
+        runner, url = await _serve(received)
+        try:
+            async with AsyncBot('token',
+                                attachment_cache=AttachmentCache()) as bot:
+                bot.graph_url = url
+                await asyncio.gather(*[
+                    bot.send_video(str(i), str(f)) for i in range(5)])
+        finally:
+            await runner.cleanup()
+        return received
+
+    received = asyncio.run(main())
+    assert len(received) == 6
+    assert 'filedata' in received[0]
+    assert received[1]['message']['attachment']['payload'] == {
+        'attachment_id': '42'}
+
+
+def test_cancelled_call_gives_the_probe_back():
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=1,
+                             clock=lambda: now[0])
+    key = ('/me/messages', 'token')
+    breaker.acquire(key)
+    breaker.record(key, failed=True)
+    now[0] = 1
+
+    async def main():
+        received = []
+        runner, url = await _serve(received)
+        try:
+            async with AsyncBot('token', circuit_breaker=breaker,
+                                rate_limiter=RateLimiter(rate=1)) as bot:
+                bot.graph_url = url
+                bot.rate_limiter.reserve('token')
+                # Cancelled while throttled
+                task = asyncio.ensure_future(bot.send_text_message('1', 'hi'))
+                await asyncio.sleep(0.05)
+                task.cancel()
+                with pytest.raises(asyncio.CancelledError):
+                    await task
+                bot.rate_limiter = None
+                await bot.send_text_message('1', 'hi')
+        finally:
+            await runner.cleanup()
+        return received
+
+    assert len(asyncio.run(main())) == 1
+    assert breaker.state(key) == CLOSED
+
+
+def test_async_warm_up_and_broadcast():
+    async def main():
+        received = []
+        runner, url = await _serve(received)
+        results = []
+        try:
+            bot = AsyncBot('token', warm_up=True)
+            assert bot.session is None
+            bot.graph_url = url
+            async with bot:
+                assert bot.session is not None
+                summary = await bot.broadcast(
+                    (str(i) for i in range(10)), {'text': 'hi'},
+                    concurrency=3,
+                    sink=lambda recipient_id, result: results.append(
+                        recipient_id))
+        finally:
+            await runner.cleanup()
+        return received, summary, results
+
+    received, summary, results = asyncio.run(main())
+    assert summary.sent == 10
+    assert sorted(results, key=int) == [str(i) for i in range(10)]
+    assert len(received) == 10
+
+
+def test_async_sends_are_not_retried_on_timeouts():
+    async def main():
+        received = []
+
+        async def slow(request):
+            received.append(request.method)
+            await asyncio.sleep(1)
+            return web.json_response({})
+
+        app = web.Application()
+        app.router.add_post('/me/messages', slow)
+        app.router.add_get('/{psid}', slow)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        try:
+            async with AsyncBot('token', timeout=0.1, retry_policy=RetryPolicy(
+                    max_attempts=2, backoff=0)) as bot:
+                bot.graph_url = 'http://127.0.0.1:{0}'.format(port)
+                # Graph may have accepted the message before the timeout
+                with pytest.raises(asyncio.TimeoutError):
+                    await bot.send_text_message('1', 'hi')
+                assert received == ['POST']
+                with pytest.raises(asyncio.TimeoutError):
+                    await bot.get_user_info('1')
+                assert received == ['POST', 'GET', 'GET']
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(main())
+
+
+def test_async_sender_actions():
+    async def main(url):
+        async with AsyncBot('token',
+                            sender_actions=SenderActions()) as bot:
+            bot.graph_url = url
+            await bot.send_action('1', 'typing_on')
+            assert await bot.send_action('1', 'typing_on') == {
+                'recipient_id': '1'}
+            await bot.send_text_message('1', 'Hi')
+            await bot.send_action('1', 'typing_off')
+
+    with GraphEmulator() as graph:
+        asyncio.run(main(graph.url))
+        assert graph.stats()['requests'] == {('/me/messages', 200): 2}
+
+
+def test_async_batch():
+    async def main(url):
+        async with AsyncBot('token') as bot:
+            bot.graph_url = url
+            async with bot.batch(size=3) as batch:
+                for i in range(5):
+                    await batch.send_text_message(str(i), 'hello')
+                assert len(batch.results) == 3
+            with pytest.raises(TypeError):
+                with bot.batch():
+                    pass
+        return batch.results
+
+    with GraphEmulator() as graph:
+        results = asyncio.run(main(graph.url))
+        assert [result['recipient_id'] for result in results] == [
+            str(i) for i in range(5)]
+        assert graph.stats()['requests'] == {('/', 200): 2}
@@ -0,0 +1,37 @@
+import asyncio
+
+from pymessenger2.aio import ASGISignatureMiddleware
+from test.signature_test import BODY, SECRET, _header
+
+
+def test_asgi_middleware():
+    async def app(scope, receive, send):
+        message = await receive()
+        body = message['body']
+        while message.get('more_body'):
+            message = await receive()
+            body += message['body']
+        await send({'type': 'http.response.start', 'status': 200})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def call(signature):
+        chunks = [{'type': 'http.request', 'body': BODY[:10],
+                   'more_body': True},
+                  {'type': 'http.request', 'body': BODY[10:]}]
+        sent = []
+
+        async def receive():
+            return chunks.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {'type': 'http', 'method': 'POST',
+                 'headers': [(b'x-hub-signature-256', signature)]}
+        await ASGISignatureMiddleware(app, SECRET)(scope, receive, send)
+        return sent
+
+    sent = asyncio.run(call(_header('sha256').encode('ascii')))
+    assert sent[0]['status'] == 200 and sent[1]['body'] == BODY
+    sent = asyncio.run(call(b'sha256=00'))
+    assert sent[0]['status'] == 403
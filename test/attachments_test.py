@@ -0,0 +1,116 @@
+import json
+import threading
+
+from pymessenger2.attachments import AttachmentCache
+from pymessenger2.bot import Bot
+from pymessenger2.pool import BotPool
+
+
+def _fields(kwargs):
+    return kwargs['data'].decode('latin1')
+
+
+def test_upload_once_then_send_by_id(session, tmpdir):
+    video = tmpdir.join('promo.mp4')
+    video.write_binary(b'\x00' * 2048)
+    bot = Bot('token', session=session, attachment_cache=AttachmentCache())
+    session.queue({'attachment_id': '42'})
+    for recipient_id in ('1', '2', '3'):
+        bot.send_video(recipient_id, str(video))
+    assert len(session.calls) == 4
+    method, url, params, kwargs = session.calls[0]
+    assert url.endswith('/me/message_attachments')
+    assert '"is_reusable": true' in _fields(kwargs)
+    assert 'recipient' not in _fields(kwargs)
+    for method, url, params, kwargs in session.calls[1:]:
+        assert url.endswith('/me/messages')
+        message = json.loads(kwargs['data'])['message']
+        assert message['attachment']['payload'] == {'attachment_id': '42'}
+    assert bot.attachment_cache.stats()['hits'] == 2
+
+
+def test_failed_upload_is_returned_and_not_cached(session, tmpdir):
+    image = tmpdir.join('a.png')
+    image.write_binary(b'png')
+    bot = Bot('token', session=session, attachment_cache=AttachmentCache())
+    session.queue({'error': {'code': 100, 'message': 'bad'}}, 400)
+    assert bot.send_image('1', str(image))['error']['code'] == 100
+    assert len(bot.attachment_cache) == 0
+
+
+def test_cache_is_keyed_by_content_and_persisted(tmpdir):
+    path = str(tmpdir.join('cache.jsonl'))
+    first = tmpdir.join('a.mp3')
+    first.write_binary(b'sound')
+    copy = tmpdir.join('b.mp3')
+    copy.write_binary(b'sound')
+    cache = AttachmentCache(path)
+    key = cache.key('audio', str(first))
+    assert key == cache.key('audio', str(copy))
+    assert key == cache.key('audio', b'sound')
+    assert key != cache.key('file', b'sound')
+    cache.get_or_upload(key, lambda: '7')
+    with open(path, 'a') as f:
+        f.write('{"key": "trunc')
+    reloaded = AttachmentCache(path)
+    assert reloaded.get(key) == '7'
+    # The partial line is dropped, not merged into the next entry
+    reloaded.set('file:1', '8')
+    reloaded = AttachmentCache(path)
+    assert reloaded.get(key) == '7' and reloaded.get('file:1') == '8'
+
+
+def test_file_hashes_are_bounded(tmpdir):
+    cache = AttachmentCache(maxsize=2)
+    paths = []
+    for name in 'abc':
+        f = tmpdir.join(name)
+        f.write_binary(name.encode('ascii'))
+        paths.append(str(f))
+    for path in paths + paths[2:]:
+        cache.key('file', path)
+    assert len(cache._file_hashes) == 2
+    assert [signature[0] for signature in cache._file_hashes] == paths[1:]
+
+
+def test_concurrent_misses_upload_once():
+    cache = AttachmentCache()
+    uploads = []
+    started = threading.Event()
+
+    def upload():
+        uploads.append(1)
+        started.wait(1)
+        return '9'
+
+    results = []
+    threads = [threading.Thread(
+        target=lambda: results.append(cache.get_or_upload('k', upload)))
+        for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    started.set()
+    for thread in threads:
+        thread.join()
+    assert results == ['9'] * 4
+    assert len(uploads) == 1
+
+
+def test_pages_sharing_a_cache_upload_their_own(session, tmpdir):
+    image = tmpdir.join('a.png')
+    image.write_binary(b'png')
+    cache = AttachmentCache(str(tmpdir.join('cache.jsonl')))
+    pool = BotPool({'A': 'token-a', 'B': 'token-b'}, session=session,
+                   attachment_cache=cache)
+    session.queue({'attachment_id': '1'})
+    session.queue({'recipient_id': '1', 'message_id': 'mid.1'})
+    session.queue({'attachment_id': '2'})
+    for page_id in ('A', 'B', 'A', 'B'):
+        pool.get(page_id).send_image('1', str(image))
+    sent = [json.loads(kwargs['data'])['message']['attachment']['payload']
+            for _, url, _, kwargs in session.calls
+            if url.endswith('/me/messages')]
+    assert sent == [{'attachment_id': '1'}, {'attachment_id': '2'},
+                    {'attachment_id': '1'}, {'attachment_id': '2'}]
+    assert cache.stats()['uploads'] == 2
+    assert 'token-a' not in open(cache.path).read()
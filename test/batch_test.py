@@ -0,0 +1,91 @@
+import json
+
+import pytest
+from six.moves.urllib.parse import parse_qs
+
+from pymessenger2.bot import Bot
+from pymessenger2.exceptions import BatchError, OAuthError
+from pymessenger2.validation import ValidationError, Validator
+
+
+def _item(body, code=200):
+    return {'code': code, 'headers': [], 'body': json.dumps(body)}
+
+
+def test_send_batch_chunks_payloads(session):
+    bot = Bot('token', session=session)
+    payloads = [bot.send_text_message(str(i), 'hi', do_send=False)
+                for i in range(120)]
+    for size in (50, 50, 20):
+        session.queue([_item({'recipient_id': 'x'})] * size)
+    results = bot.send_batch(payloads)
+    assert len(results) == 120
+    assert len(session.calls) == 3
+    method, url, params, kwargs = session.calls[0]
+    assert url == 'https://graph.facebook.com/v2.6/'
+    batch = json.loads(kwargs['data']['batch'])
+    assert len(batch) == 50
+    body = parse_qs(batch[1]['body'])
+    assert json.loads(body['recipient'][0]) == {'id': '1'}
+    assert json.loads(body['message'][0]) == {'text': 'hi'}
+    assert body['notification_type'] == ['REGULAR']
+
+
+def test_send_batch_per_item_errors(session):
+    bot = Bot('token', session=session, raise_exception=True)
+    error = {'error': {'type': 'OAuthException', 'code': 190,
+                       'message': 'bad token'}}
+    session.queue([_item({'recipient_id': '1'}), _item(error, 400), None])
+    with pytest.raises(BatchError) as e:
+        bot.send_batch(
+            [bot.send_action(str(i), 'typing_on', do_send=False)
+             for i in range(3)])
+    results = e.value.results
+    assert e.value.errors == results[1:]
+    assert results[0] == {'recipient_id': '1'}
+    assert isinstance(results[1], OAuthError)
+    assert results[1].code == 190
+    assert results[2].is_transient
+
+
+def test_batcher_flushes_every_size(session):
+    bot = Bot('token', session=session)
+    session.queue([_item({'recipient_id': 'x'})] * 3)
+    session.queue([_item({'recipient_id': 'x'})] * 2)
+    with bot.batch(size=3) as batch:
+        for i in range(5):
+            batch.send_text_message(str(i), 'hello')
+        assert len(session.calls) == 1
+    assert len(session.calls) == 2
+    assert len(batch.results) == 5
+
+
+def test_strict_validator_checks_batches(session):
+    bot = Bot('token', session=session, validator=Validator())
+    with pytest.raises(ValidationError):
+        with bot.batch() as batch:
+            batch.send_text_message('1', 'hi')
+            batch.send_text_message('2', 'x' * 2001)
+    assert session.calls == []
+
+
+def test_refused_batch_fails_every_payload(session):
+    error = {'error': {'type': 'OAuthException', 'code': 190,
+                       'message': 'bad token'}}
+    bot = Bot('token', session=session)
+    payloads = [bot.send_text_message(str(i), 'hi', do_send=False)
+                for i in range(60)]
+    session.queue(error, 400)
+    results = bot.send_batch(payloads)
+    assert results[:50] == [error] * 50 and len(results) == 60
+
+    bot.raise_exception = True
+    session.queue(error, 400)
+    with pytest.raises(BatchError) as e:
+        with bot.batch(size=50) as batch:
+            for payload in payloads:
+                batch.add(payload)
+    assert len(session.calls) == 3
+    assert len(batch.results) == 50
+    assert all(isinstance(result, OAuthError) for result in batch.results)
+    assert e.value.errors == batch.results and not e.value.is_transient
@@ -0,0 +1,55 @@
+import threading
+
+from pymessenger2.bot import Bot
+from pymessenger2.broadcast import Broadcast
+from pymessenger2.exceptions import FacebookError
+
+
+def test_broadcast_counts_by_error_code(session):
+    bot = Bot('token', session=session)
+    lock = threading.Lock()
+    recorded = []
+
+    def sink(recipient_id, result):
+        with lock:
+            recorded.append(recipient_id)
+
+    def error_every_tenth(recipient_id):
+        if recipient_id % 10 == 0:
+            return {'error': {'code': 613, 'message': 'Calls limit'}}
+        if recipient_id == 5:
+            raise FacebookError(code=100)
+        return {'recipient_id': str(recipient_id)}
+
+    broadcast = Broadcast(bot, (i for i in range(100)), {'text': 'hi'},
+                          concurrency=4, sink=sink, send=error_every_tenth)
+    summary = broadcast.run()
+    assert summary.sent == 89
+    assert summary.failed == 11
+    assert summary.errors == {613: 10, 100: 1}
+    assert sorted(recorded) == list(range(100))
+
+
+def test_bot_broadcast_sends_message(session):
+    bot = Bot('token', session=session)
+    summary = bot.broadcast(iter(['1', '2', '3']), {'text': 'hi'},
+                            concurrency=2)
+    assert summary.sent == 3
+    assert len(session.calls) == 3
+
+
+def test_broadcast_stops_early(session):
+    bot = Bot('token', session=session)
+    consumed = []
+
+    def recipients():
+        for i in range(10 ** 6):
+            consumed.append(i)
+            yield i
+
+    broadcast = Broadcast(bot, recipients(), {'text': 'hi'}, concurrency=2,
+                          send=lambda recipient_id: {})
+    for i, (recipient_id, result) in enumerate(broadcast):
+        if i == 5:
+            break
+    assert len(consumed) < 100
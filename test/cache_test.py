@@ -0,0 +1,61 @@
+import threading
+import time
+
+from pymessenger2.bot import Bot
+from pymessenger2.cache import ProfileCache
+
+
+class FakeClock(object):
+    now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_lru_and_negative_caching(session):
+    clock = FakeClock()
+    cache = ProfileCache(ttl=10, maxsize=2, negative_ttl=1, clock=clock)
+    bot = Bot('token', session=session, profile_cache=cache)
+    session.queue({'first_name': 'A'})
+    assert bot.get_user_info('1') == {'first_name': 'A'}
+    assert bot.get_user_info('1') == {'first_name': 'A'}
+    session.queue({'error': {'code': 100}}, 400)
+    assert bot.get_user_info('2') is None
+    assert bot.get_user_info('2') is None
+    assert len(session.calls) == 2
+    clock.now = 2
+    session.queue({'first_name': 'B'})
+    assert bot.get_user_info('2') == {'first_name': 'B'}
+    session.queue({'first_name': 'C'})
+    bot.get_user_info('3')
+    assert cache.evictions == 1
+    session.queue({'first_name': 'A2'})
+    assert bot.get_user_info('1') == {'first_name': 'A2'}
+    clock.now = 20
+    bot.get_user_info('1', fields=['first_name'])
+    assert cache.stats()['hits'] == 2
+
+
+def test_concurrent_lookups_are_coalesced(session):
+    cache = ProfileCache()
+    calls = []
+    started = threading.Event()
+
+    def loader():
+        calls.append(1)
+        started.set()
+        time.sleep(0.05)
+        return {'first_name': 'A'}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(
+        cache.get_or_load('key', loader))) for _ in range(8)]
+    threads[0].start()
+    started.wait()
+    for thread in threads[1:]:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert results == [{'first_name': 'A'}] * 8
+    assert cache.coalesced == 7
@@ -0,0 +1,180 @@
+import pytest
+import requests
+
+from pymessenger2.bot import Bot
+from pymessenger2.circuit import (CLOSED, HALF_OPEN, OPEN, CircuitBreaker,
+                                  CircuitOpenError)
+from pymessenger2.emulator import GraphEmulator
+from pymessenger2.exceptions import OAuthError
+from pymessenger2.instrumentation import Hooks, Instrumentation, Metrics
+
+
+class FakeClock(object):
+    now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Recorder(Instrumentation):
+    def __init__(self):
+        self.changes = []
+
+    def on_circuit_change(self, bot, endpoint, old_state, new_state):
+        self.changes.append((endpoint, old_state, new_state))
+
+
+UNAVAILABLE = {'error': {'code': 2, 'message': 'Service unavailable',
+                         'is_transient': True}}
+
+
+def test_consecutive_failures_open_the_circuit(session):
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10,
+                             clock=clock)
+    recorder = Recorder()
+    metrics = Metrics()
+    bot = Bot('token', session=session, circuit_breaker=breaker,
+              instrumentation=Hooks(recorder, metrics))
+    session.queue(UNAVAILABLE, 503)
+    bot.send_text_message('1', 'hi')
+    session.queue(requests.ConnectionError())
+    with pytest.raises(requests.ConnectionError):
+        bot.send_text_message('1', 'hi')
+    # Errors about the recipient don't count
+    session.queue({'error': {'code': 100, 'message': 'No matching user'}},
+                  400)
+    bot.send_text_message('1', 'hi')
+    for _ in range(3):
+        session.queue(UNAVAILABLE, 503)
+        bot.send_text_message('1', 'hi')
+    assert breaker.state(('/me/messages', 'token')) == OPEN
+    with pytest.raises(CircuitOpenError) as e:
+        bot.send_text_message('1', 'hi')
+    assert e.value.retry_after == 10
+    assert e.value.is_transient
+    assert len(session.calls) == 6
+    # Other endpoints and pages have their own circuit
+    bot.get_user_info('1')
+    Bot('other', session=session,
+        circuit_breaker=breaker).send_text_message('1', 'hi')
+    assert len(session.calls) == 8
+
+    clock.now = 10
+    session.queue(UNAVAILABLE, 503)
+    bot.send_text_message('1', 'hi')
+    clock.now = 20
+    bot.send_text_message('1', 'hi')
+    assert breaker.state(('/me/messages', 'token')) == CLOSED
+    assert recorder.changes == [
+        ('/me/messages', CLOSED, OPEN), ('/me/messages', OPEN, HALF_OPEN),
+        ('/me/messages', HALF_OPEN, OPEN), ('/me/messages', OPEN, HALF_OPEN),
+        ('/me/messages', HALF_OPEN, CLOSED)]
+    assert metrics.circuit_changes[('/me/messages', OPEN)] == 2
+    assert ('pymessenger_circuit_changes_total{endpoint="/me/messages",'
+            'state="open"} 2') in metrics.prometheus()
+    assert breaker.stats() == {CLOSED: 3, OPEN: 0, HALF_OPEN: 0,
+                               'rejected': 1}
+
+
+def test_error_rate_opens_the_circuit():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=100, error_rate=0.5,
+                             min_calls=10, window=5, clock=clock)
+    key = ('/me/messages', 'token')
+    for i in range(9):
+        breaker.acquire(key)
+        breaker.record(key, failed=i % 2 == 0)
+    assert breaker.state(key) == CLOSED
+    # The oldest calls left the window
+    clock.now = 5
+    breaker.acquire(key)
+    breaker.record(key, failed=True)
+    assert breaker.state(key) == CLOSED
+    for i in range(9):
+        breaker.acquire(key)
+        breaker.record(key, failed=i % 2 == 0)
+    assert breaker.state(key) == OPEN
+
+
+def test_half_open_probes():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=1,
+                             half_open_calls=1, clock=clock)
+    key = ('/me/messages', 'token')
+    breaker.acquire(key)
+    breaker.record(key, failed=True)
+    clock.now = 1
+    breaker.acquire(key)
+    # A single probe at a time
+    with pytest.raises(CircuitOpenError):
+        breaker.acquire(key)
+    # Neutral outcome: the probe is given back
+    breaker.record(key, failed=None)
+    assert breaker.state(key) == HALF_OPEN
+    breaker.acquire(key)
+    breaker.record(key, failed=False)
+    assert breaker.state(key) == CLOSED
+
+
+def test_revoked_token_fails_fast():
+    with GraphEmulator() as graph:
+        bot = Bot('token', raise_exception=True,
+                  circuit_breaker=CircuitBreaker(failure_threshold=2))
+        bot.graph_url = graph.url
+        bot.send_text_message('1', 'hi')
+        graph.revoke('token')
+        for _ in range(2):
+            with pytest.raises(OAuthError):
+                bot.send_text_message('1', 'hi')
+        with pytest.raises(CircuitOpenError):
+            bot.send_text_message('1', 'hi')
+        # The handover circuit of the page is still closed
+        with pytest.raises(OAuthError):
+            bot.pass_thread_control('1')
+        assert graph.stats()['errors'] == {190: 3}
+
+
+def test_stale_probes_expire():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=1,
+                             probe_timeout=5, clock=clock)
+    key = ('/me/messages', 'token')
+    breaker.acquire(key)
+    breaker.record(key, failed=True)
+    clock.now = 1
+    breaker.acquire(key)
+    # The probe is never recorded
+    clock.now = 3
+    with pytest.raises(CircuitOpenError) as e:
+        breaker.acquire(key)
+    assert e.value.retry_after == 3
+    clock.now = 6
+    breaker.acquire(key)
+    breaker.record(key, failed=False)
+    assert breaker.state(key) == CLOSED
+
+
+def test_probe_is_recorded_when_a_hook_raises(session):
+    class Failing(Instrumentation):
+        fail = True
+
+        def before_request(self, info):
+            if self.fail:
+                self.fail = False
+                raise RuntimeError("hook bug")
+
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=1,
+                             clock=clock)
+    key = ('/me/messages', 'token')
+    breaker.acquire(key)
+    breaker.record(key, failed=True)
+    clock.now = 1
+    bot = Bot('token', session=session, circuit_breaker=breaker,
+              instrumentation=Failing())
+    with pytest.raises(RuntimeError):
+        bot.send_text_message('1', 'hi')
+    assert breaker.state(key) == HALF_OPEN
+    bot.send_text_message('1', 'hi')
+    assert breaker.state(key) == CLOSED
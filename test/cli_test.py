@@ -0,0 +1,100 @@
+import io
+import json
+import sys
+
+import pytest
+
+from pymessenger2.cli import CommandError, Progress, compile_payloads, main
+from pymessenger2.emulator import TRANSIENT, Fault, GraphEmulator
+
+
+def _lines(path):
+    return [json.loads(line) for line in path.read_binary().splitlines()]
+
+
+def test_compile(tmpdir):
+    message = tmpdir.join('message.json')
+    message.write(json.dumps({'text': 'Hello $first_name',
+                              'quick_replies': [{'content_type': 'text',
+                                                 'title': 'Hi $first_name',
+                                                 'payload': 'HI'}]}))
+    recipients = tmpdir.join('recipients.txt')
+    recipients.write('1234\n\n{"id": "5678", "first_name": "Jane"}\n')
+    output = tmpdir.join('payloads.jsonl')
+    assert main(['compile', '--message', str(message),
+                 '--recipients', str(recipients), '-o', str(output),
+                 '--notification-type', 'NO_PUSH']) == 0
+    plain, rendered = _lines(output)
+    assert plain['recipient'] == {'id': '1234'}
+    assert plain['notification_type'] == 'NO_PUSH'
+    assert plain['message']['text'] == 'Hello $first_name'
+    assert rendered['recipient'] == {'id': '5678'}
+    assert rendered['notification_type'] == 'NO_PUSH'
+    assert rendered['message']['text'] == 'Hello Jane'
+    assert rendered['message']['quick_replies'][0]['title'] == 'Hi Jane'
+
+
+def test_compile_is_lazy_and_reports_bad_lines():
+    payloads = compile_payloads({'text': 'Hi $name'},
+                                iter(['1', '{"id": "2"}']))
+    assert json.loads(next(payloads).decode('utf8'))['recipient'] == {
+        'id': '1'}
+    with pytest.raises(CommandError) as e:
+        next(payloads)
+    assert 'recipients line 2' in str(e.value)
+
+
+def test_progress():
+    progress = Progress(2)
+    for line in (3, 4, 2, 6):
+        progress.done(line)
+    assert progress.offset == 5
+    assert progress.ahead == {6}
+
+
+def test_replay_and_resume(tmpdir):
+    payloads = tmpdir.join('payloads.jsonl')
+    payloads.write(''.join(
+        json.dumps({'recipient': {'id': str(i)},
+                    'message': {'text': 'Hi'}}) + '\n' for i in range(20)))
+    results = tmpdir.join('results.jsonl')
+    with GraphEmulator(faults=[Fault(TRANSIENT, limit=3)]) as graph:
+        args = ['replay', str(payloads), '--results', str(results),
+                '--token', 'token', '--graph-url', graph.url,
+                '--concurrency', '4', '--max-attempts', '1']
+        assert main(args) == 1
+        failed = [r['line'] for r in _lines(results) if 'error' in r['result']]
+        assert len(failed) == 3
+        assert len(_lines(results)) == 20
+
+        # Resume after the first 10 payloads
+        results.write_binary(b''.join(
+            line + b'\n' for line in
+            results.read_binary().splitlines()
+            if json.loads(line.decode('utf8'))['line'] < 10))
+        assert main(args + ['--resume', '--rate', '1000']) == 0
+        lines = sorted(r['line'] for r in _lines(results))
+        assert lines == list(range(20))
+        assert graph.stats()['requests'][('/me/messages', 200)] == 27
+
+
+def test_replay_requires_a_token(tmpdir, monkeypatch, capsys):
+    monkeypatch.delenv('PAGE_ACCESS_TOKEN', raising=False)
+    assert main(['replay', '-', '--results',
+                 str(tmpdir.join('results.jsonl'))]) == 2
+    assert 'access token' in capsys.readouterr().err
+
+
+def test_std_streams_stay_open(tmpdir, monkeypatch):
+    message = tmpdir.join('message.json')
+    message.write(json.dumps({'text': 'Hello'}))
+    stdin = io.TextIOWrapper(io.BytesIO(b'1234\n5678\n'))
+    stdout = io.TextIOWrapper(io.BytesIO())
+    monkeypatch.setattr(sys, 'stdin', stdin)
+    monkeypatch.setattr(sys, 'stdout', stdout)
+    for _ in range(2):
+        assert main(['compile', '--message', str(message)]) == 0
+    assert not stdin.closed and not stdout.closed
+    lines = stdout.buffer.getvalue().splitlines()
+    assert [json.loads(line.decode('utf8'))['recipient']['id']
+            for line in lines] == ['1234', '5678']
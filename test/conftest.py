@@ -0,0 +1,61 @@
+import json
+import sys
+
+import pytest
+
+# async def is a syntax error before Python 3.5, asyncio.run needs 3.7
+collect_ignore = (['aio_test.py', 'asgi_test.py'] if
+                  sys.version_info < (3, 7) else [])
+
+
+class FakeResponse(object):
+    def __init__(self, data, status_code=200, headers=None):
+        self._data = data
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.content = json.dumps(data).encode('utf8')
+
+    def json(self):
+        return self._data
+
+
+class FakeSession(object):
+    """Stand-in for requests.Session recording every Graph API call."""
+
+    def __init__(self):
+        self.calls = []
+        self.responses = []
+        self.closed = False
+
+    def queue(self, data, status_code=200, headers=None):
+        if isinstance(data, Exception):
+            self.responses.append(data)
+        else:
+            self.responses.append(FakeResponse(data, status_code, headers))
+
+    def request(self, method, url, params=None, **kwargs):
+        data = kwargs.get('data')
+        if hasattr(data, 'read'):
+            kwargs['data'] = data.read()
+        elif hasattr(data, '__iter__') and not isinstance(
+                data, (bytes, str, dict)):
+            # Streamed bodies
+            kwargs['data'] = b''.join(bytes(chunk) for chunk in data)
+        self.calls.append((method, url, params, kwargs))
+        if self.responses:
+            response = self.responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+        return FakeResponse({'recipient_id': '1', 'message_id': 'mid.1'})
+
+    def head(self, url, **kwargs):
+        return self.request('HEAD', url, **kwargs)
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def session():
+    return FakeSession()
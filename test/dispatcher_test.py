@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+from pymessenger2.dispatcher import Dispatcher, parse_events
+
+
+def _body(*messagings):
+    return {'object': 'page', 'entry': [
+        {'id': 'PAGE', 'time': 1, 'messaging': list(messagings)}]}
+
+
+def _text(text, **message):
+    message['text'] = text
+    return {'sender': {'id': 'U'}, 'recipient': {'id': 'PAGE'},
+            'message': message}
+
+
+def _postback(payload):
+    return {'sender': {'id': 'U'}, 'postback': {'payload': payload}}
+
+
+def test_parse_events_types():
+    body = json.dumps(_body(
+        _text('hi'),
+        _text('yes', quick_reply={'payload': 'YES'}),
+        _text('me', is_echo=True),
+        _postback('GET_STARTED'),
+        {'sender': {'id': 'U'}, 'delivery': {'mids': ['m'], 'watermark': 1}},
+        {'sender': {'id': 'U'}, 'read': {'watermark': 2}},
+        {'sender': {'id': 'U'}, 'unexpected': {}})).encode('utf8')
+    events = list(parse_events(body))
+    assert [e.type for e in events] == [
+        'message', 'quick_reply', 'echo', 'postback', 'delivery', 'read',
+        'unknown']
+    assert events[1].payload == 'YES'
+    assert events[3].payload == 'GET_STARTED'
+    assert events[4].mids == ['m']
+    assert all(e.page_id == 'PAGE' and e.sender_id == 'U' for e in events)
+    with pytest.raises(AttributeError):
+        events[0].custom = 1
+
+
+def test_routes_precedence():
+    dispatcher = Dispatcher()
+    dispatcher.add_route('postback', 'PRODUCT:42', lambda e: 'exact')
+    dispatcher.add_route('postback', 'PRODUCT:', lambda e: 'prefix',
+                         prefix=True)
+    dispatcher.add_route('postback', 'PRODUCT:4', lambda e: 'long prefix',
+                         prefix=True)
+    for i in range(300):
+        dispatcher.add_route('postback', 'P{0}'.format(i), lambda e: i)
+    dispatcher.add_route('text', r'world', lambda e: 'world', regex=True)
+    dispatcher.add_route('text', r'^(?P<greeting>hi|hello)',
+                         lambda e: e.match.group('greeting'), regex=True)
+    dispatcher.add_handler('message', lambda e: 'message')
+    dispatcher.default(lambda e: 'default')
+
+    results = dispatcher.dispatch(_body(
+        _postback('PRODUCT:42'), _postback('PRODUCT:43'),
+        _postback('PRODUCT:1'), _postback('OTHER'),
+        _text('hello world'), _text('hello'), _text('bye')))
+    assert results == ['exact', 'long prefix', 'prefix', 'default',
+                       'world', 'hello', 'message']
+
+
+def test_numbered_backreferences():
+    dispatcher = Dispatcher()
+    dispatcher.add_route('text', r'^b', lambda e: 'b', regex=True)
+    dispatcher.add_route('text', r'(a)\1', lambda e: e.match.group(1),
+                         regex=True)
+    dispatcher.add_route('text', r'(x)?(?(1)y|z)', lambda e: 'z',
+                         regex=True)
+    dispatcher.default(lambda e: 'default')
+    assert dispatcher.dispatch(_body(
+        _text('aa'), _text('ab'), _text('bz'), _text('z'))) == [
+        'a', 'default', 'b', 'z']
+
+
+def test_duplicate_routes_are_refused():
+    dispatcher = Dispatcher()
+    dispatcher.postback('A')(lambda e: None)
+    with pytest.raises(ValueError):
+        dispatcher.postback('A')(lambda e: None)
+    with pytest.raises(ValueError):
+        dispatcher.on('nope')
+        dispatcher.add_handler('nope', lambda e: None)
@@ -0,0 +1,141 @@
+import pytest
+
+from pymessenger2.bot import Bot
+from pymessenger2.emulator import (APP_THROTTLED, INVALID_TOKEN, THROTTLED,
+                                   TRANSIENT, Fault, GraphEmulator, constant)
+from pymessenger2.exceptions import FacebookError, OAuthError
+from pymessenger2.retry import RetryPolicy
+from pymessenger2.utils import monotonic
+
+
+@pytest.fixture
+def graph():
+    with GraphEmulator(seed=1) as emulator:
+        yield emulator
+
+
+def _bot(graph, **options):
+    bot = Bot('token', **options)
+    bot.graph_url = graph.url
+    return bot
+
+
+def test_send_messages(graph):
+    bot = _bot(graph)
+    result = bot.send_text_message('1234', 'Hello')
+    assert result['recipient_id'] == '1234'
+    assert result['message_id'].startswith('m_')
+    assert bot.send_action('1234', 'typing_on') == {'recipient_id': '1234'}
+    call = graph.calls[0]
+    assert call.endpoint == '/me/messages'
+    assert call.fields['message'] == {'text': 'Hello'}
+    assert graph.stats()['requests'] == {('/me/messages', 200): 2}
+
+
+def test_send_attachment_multipart(graph, tmpdir):
+    path = tmpdir.join('image.png')
+    path.write_binary(b'\x89PNG\r\n\x1a\n' + b'\x00' * 100000)
+    bot = _bot(graph)
+    assert 'message_id' in bot.send_image('1234', str(path))
+    chunks = iter([b'GIF89a', b'\x00' * 70000])
+    assert 'message_id' in bot.send_attachment('1234', 'image', chunks)
+    first, second = list(graph.calls)
+    assert first.fields['recipient'] == {'id': '1234'}
+    assert first.fields['filedata'] == {'filename': 'image.png',
+                                        'size': 100008}
+    # Streamed chunked
+    assert second.fields['filedata']['size'] == 70006
+
+
+def test_messenger_profile(graph):
+    bot = _bot(graph)
+    assert bot.get_configuration(fields=['greeting']) == {'data': []}
+    greeting = [{'locale': 'default', 'text': 'Hi'}]
+    bot.send_configuration(greeting=greeting,
+                           get_started={'payload': 'GO'})
+    assert bot.get_configuration(fields=['greeting']) == {
+        'data': [{'greeting': greeting}]}
+    bot.delete_configuration(['greeting'])
+    assert bot.get_configuration(fields=['greeting', 'get_started']) == {
+        'data': [{'get_started': {'payload': 'GO'}}]}
+    # Kept per page
+    other = Bot('other')
+    other.graph_url = graph.url
+    assert other.get_configuration(fields=['get_started']) == {'data': []}
+
+
+def test_user_profile_and_handover(graph):
+    bot = _bot(graph)
+    profile = bot.get_user_info('5678', fields=['first_name', 'locale'])
+    assert profile == {'id': '5678', 'first_name': 'User',
+                       'locale': 'en_US'}
+    assert bot.get_user_info('5678', fields=['phone']) is None
+    assert bot.pass_thread_control('5678', '263902037430900') == {
+        'success': True}
+    assert graph.thread_owners['5678'] == '263902037430900'
+    assert bot.take_thread_control('5678') == {'success': True}
+    assert graph.thread_owners['5678'] is None
+
+
+def test_batch(graph):
+    bot = _bot(graph)
+    results = bot.send_batch([bot.send_text_message(str(i), 'Hi',
+                                                    do_send=False)
+                              for i in range(3)])
+    assert [result['recipient_id'] for result in results] == ['0', '1', '2']
+
+
+def test_oauth_errors(graph):
+    graph.tokens = {'token'}
+    bot = Bot('unknown', raise_exception=True)
+    bot.graph_url = graph.url
+    with pytest.raises(OAuthError) as e:
+        bot.send_text_message('1', 'Hi')
+    assert e.value.code == INVALID_TOKEN.code
+    graph.revoke('token')
+    with pytest.raises(OAuthError):
+        _bot(graph, raise_exception=True).send_text_message('1', 'Hi')
+    assert graph.stats()['errors'] == {190: 2}
+
+
+def test_fault_injection_and_retries(graph):
+    graph.faults = [Fault(TRANSIENT, limit=2, endpoints=['/me/messages'])]
+    delays = []
+    bot = _bot(graph, raise_exception=True,
+               retry_policy=RetryPolicy(max_attempts=3, sleep=delays.append))
+    assert 'message_id' in bot.send_text_message('1', 'Hi')
+    assert len(delays) == 2
+    assert graph.stats()['requests'] == {('/me/messages', 500): 2,
+                                         ('/me/messages', 200): 1}
+
+    graph.faults = [Fault(APP_THROTTLED, rate=0.5)]
+    statuses = [_bot(graph).send_text_message('1', 'Hi').get('error', {})
+                .get('code') for _ in range(40)]
+    assert 5 < statuses.count(4) < 35
+    assert statuses.count(None) == 40 - statuses.count(4)
+
+
+def test_rate_limit(graph):
+    graph.rate_limit = 3
+    bot = _bot(graph, raise_exception=True)
+    for _ in range(3):
+        bot.send_text_message('1', 'Hi')
+    with pytest.raises(FacebookError) as e:
+        bot.send_text_message('1', 'Hi')
+    assert e.value.code == THROTTLED.code
+    # Per token
+    other = Bot('other')
+    other.graph_url = graph.url
+    assert 'message_id' in other.send_text_message('1', 'Hi')
+
+
+def test_latency():
+    with GraphEmulator(latency={'/me/messages': constant(0.05),
+                                None: 0}) as graph:
+        bot = _bot(graph)
+        started = monotonic()
+        bot.get_user_info('1')
+        assert monotonic() - started < 0.05
+        started = monotonic()
+        bot.send_text_message('1', 'Hi')
+        assert monotonic() - started >= 0.05
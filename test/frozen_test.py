@@ -0,0 +1,73 @@
+import json
+
+import attr
+import pytest
+
+from pymessenger2 import Element, QuickReply, frozen
+from pymessenger2.airline import Airport, FlightSchedule
+from pymessenger2.buttons import PostbackButton, URLButton
+from pymessenger2.serializer import Serializer, orjson
+from pymessenger2.validation import ValidationError
+
+BACKENDS = ['json'] + (['orjson'] if orjson is not None else [])
+
+
+def _element():
+    return Element(title='Arsenal', subtitle='Go', buttons=[
+        URLButton(title='Site', url='http://arsenal.com'),
+        PostbackButton(title='More')])
+
+
+def test_frozen_models_are_immutable_and_hashable():
+    button = frozen.PostbackButton(title='More')
+    assert button.payload == 'More'
+    assert not hasattr(button, '__dict__')
+    with pytest.raises(attr.exceptions.FrozenInstanceError):
+        button.title = 'Less'
+    assert button == frozen.PostbackButton(title='More')
+    assert len({button, frozen.PostbackButton(title='More')}) == 1
+    assert attr.evolve(button, payload='LESS').payload == 'LESS'
+    # Same checks and converters as the mutable models
+    assert frozen.CallButton(title='Call', payload='+1 650').payload == \
+        '+1650'
+    with pytest.raises(ValidationError):
+        frozen.QuickReply(content_type='text')
+
+
+def test_freeze_converts_nested_models():
+    element = frozen.freeze(_element())
+    assert type(element) is frozen.Element
+    assert element.buttons == (
+        frozen.URLButton(title='Site', url='http://arsenal.com'),
+        frozen.PostbackButton(title='More'))
+    assert frozen.freeze(element) is element
+    flight = frozen.FlightInfo(
+        connection_id=1, segment_id=1, flight_number='KL9',
+        departure_airport=Airport(airport_code='SFO', city='San Francisco'),
+        arrival_airport=Airport(airport_code='AMS', city='Amsterdam'),
+        flight_schedule=FlightSchedule(departure_time='2016-01-02T19:45',
+                                       arrival_time='2016-01-03T17:30'),
+        travel_class='business')
+    assert flight.connection_id == '1'
+    assert type(flight.departure_airport) is frozen.Airport
+    with pytest.raises(TypeError):
+        frozen.freeze(object())
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_fragments_are_cached(backend):
+    serializer = Serializer(backend)
+    element = frozen.freeze(_element())
+    payload = {'elements': [element] * 3,
+               'quick_replies': [frozen.QuickReply(content_type='location')],
+               'text': '\x00pm2:1'}
+    data = json.loads(serializer.dumps(payload).decode('utf8'))
+    assert data == json.loads(serializer.dumps_text(dict(
+        payload, elements=[_element()] * 3,
+        quick_replies=[QuickReply(content_type='location')])))
+    assert element._fragment == serializer.dumps(_element())
+    assert element.buttons[1]._fragment is not None
+    assert 'fragment' not in repr(element)
+    # Reused as is
+    object.__setattr__(element, '_fragment', b'{"title":"cached"}')
+    assert serializer.dumps([element]) == b'[{"title":"cached"}]'
@@ -0,0 +1,82 @@
+import logging
+
+import requests
+
+from pymessenger2.bot import Bot
+from pymessenger2.instrumentation import (Hooks, Instrumentation,
+                                          LoggingHooks, Metrics, endpoint_of)
+from pymessenger2.ratelimit import RateLimiter
+from pymessenger2.retry import RetryPolicy
+
+
+class Recorder(Instrumentation):
+    def __init__(self):
+        self.events = []
+
+    def before_request(self, info):
+        self.events.append(('before', info.path, info.attempt))
+
+    def after_request(self, info):
+        self.events.append(('after', info.path, info.status_code))
+
+    def on_retry(self, info, delay):
+        self.events.append(('retry', info.path, delay))
+
+
+def test_hooks_around_every_attempt(session):
+    recorder = Recorder()
+    bot = Bot('token', session=session, instrumentation=recorder,
+              retry_policy=RetryPolicy(backoff=0, jitter=False,
+                                       sleep=lambda delay: None))
+    session.queue({'error': {'code': 2, 'message': 'retry me'}}, 500)
+    bot.send_text_message('1', 'hi')
+    assert recorder.events == [
+        ('before', 'me/messages', 1), ('after', 'me/messages', 500),
+        ('retry', 'me/messages', 0), ('before', 'me/messages', 2),
+        ('after', 'me/messages', 200)]
+
+
+def test_metrics_and_prometheus_export(session):
+    metrics = Metrics()
+    clock = [0.0]
+    limiter = RateLimiter(rate=1, burst=1, clock=lambda: clock[0],
+                          sleep=lambda delay: None)
+    bot = Bot('token', session=session, rate_limiter=limiter,
+              retry_policy=RetryPolicy(max_attempts=2, backoff=0,
+                                       sleep=lambda delay: None),
+              instrumentation=Hooks(metrics, Recorder()))
+    session.queue({'error': {'code': 100, 'error_subcode': 2018001,
+                             'message': 'No matching user'}}, 400)
+    bot.send_text_message('1', 'hi')
+    bot.send_text_message('1', 'hi')
+    session.queue(requests.ConnectionError())
+    bot.get_user_info('1234567890')
+    assert metrics.errors == {('/me/messages', 100, 2018001): 1}
+    assert metrics.retries == {'/{id}': 1}
+    assert metrics.throttled == {'/me/messages': 1}
+    assert metrics.requests[('/{id}', 'ConnectionError')] == 1
+    assert metrics.latency['/me/messages'].count == 2
+    text = metrics.prometheus()
+    assert ('pymessenger_errors_total{code="100",endpoint="/me/messages",'
+            'subcode="2018001"} 1') in text
+    assert ('pymessenger_request_duration_seconds_bucket{endpoint='
+            '"/me/messages",le="+Inf"} 2') in text
+    assert 'pymessenger_request_size_bytes_count{endpoint="/me/messages"} 2' \
+        in text
+    assert '# TYPE pymessenger_retries_total counter' in text
+
+
+def test_logging_hooks_redact_tokens(session, caplog):
+    bot = Bot('secret-token', app_secret='app-secret', session=session,
+              instrumentation=LoggingHooks())
+    with caplog.at_level(logging.DEBUG, logger='pymessenger'):
+        bot.send_text_message('1', 'hi')
+    assert 'Graph API POST /me/messages' in caplog.text
+    assert 'secret-token' not in caplog.text
+    assert bot.auth_args['appsecret_proof'] not in caplog.text
+
+
+def test_endpoint_labels():
+    assert endpoint_of('me/messages') == '/me/messages'
+    assert endpoint_of('123456') == '/{id}'
+    assert endpoint_of('') == '/'
@@ -0,0 +1,83 @@
+import pytest
+
+from pymessenger2.bot import Bot
+from pymessenger2.exceptions import OAuthError
+from pymessenger2.messenger_profile import sync_configurations
+from test.conftest import FakeSession
+
+GREETING = [{'locale': 'default', 'text': 'Hello!'}]
+
+
+def _configuration(**fields):
+    return {'data': [fields] if fields else []}
+
+
+def test_get_configuration_keeps_auth_args(session):
+    bot = Bot('token', session=session)
+    bot.get_configuration(fields=['greeting'])
+    bot.send_text_message('1', 'hi')
+    assert bot.auth_args == {'access_token': 'token'}
+    assert session.calls[1][2] == {'access_token': 'token'}
+
+
+def test_sync_configuration_sends_only_the_diff(session):
+    bot = Bot('token', session=session)
+    session.queue(_configuration(
+        greeting=GREETING,
+        get_started={'payload': 'OLD'},
+        home_url={'url': 'https://example.com'}))
+    diff = bot.sync_configuration(
+        {'greeting': GREETING, 'get_started': {'payload': 'START'},
+         'home_url': None})
+    assert diff.changed == {'get_started': {'payload': 'START'}}
+    assert diff.removed == ['home_url']
+    assert diff.unchanged == ['greeting']
+    methods = [(method, kwargs.get('json')) for method, _, _, kwargs in
+               session.calls]
+    assert methods == [
+        ('GET', None),
+        ('POST', {'get_started': {'payload': 'START'}}),
+        ('DELETE', {'fields': ['home_url']})]
+    assert len(diff.responses) == 2
+
+
+def test_sync_configuration_dry_run(session):
+    bot = Bot('token', session=session)
+    session.queue(_configuration(greeting=GREETING))
+    diff = bot.sync_configuration({'greeting': None}, dry_run=True)
+    assert diff
+    assert diff.removed == ['greeting']
+    assert len(session.calls) == 1
+
+
+def test_sync_configuration_unchanged(session):
+    bot = Bot('token', session=session)
+    session.queue(_configuration(greeting=GREETING))
+    diff = bot.sync_configuration({'greeting': GREETING})
+    assert not diff
+    assert len(session.calls) == 1
+
+
+def test_sync_configuration_failed_read(session):
+    bot = Bot('token', session=session)
+    session.queue({'error': {'type': 'OAuthException', 'code': 190,
+                             'message': 'Session has expired'}}, 400)
+    with pytest.raises(OAuthError) as e:
+        bot.sync_configuration({'greeting': GREETING, 'home_url': None})
+    assert e.value.code == 190
+    assert len(session.calls) == 1
+
+
+def test_sync_configurations_many_pages():
+    bots = []
+    for token in ('a', 'b', 'c'):
+        session = FakeSession()
+        session.queue(_configuration())
+        bots.append(Bot(token, session=session))
+    results = dict(sync_configurations(
+        bots, lambda bot: {'greeting': GREETING, 'home_url': None},
+        concurrency=2))
+    assert set(results) == set(bots)
+    for bot, diff in results.items():
+        assert diff.changed == {'greeting': GREETING}
+        assert [call[0] for call in bot.session.calls] == ['GET', 'POST']
@@ -0,0 +1,108 @@
+import json
+
+import pytest
+
+from pymessenger2.bot import Bot
+from pymessenger2.instrumentation import Instrumentation
+from pymessenger2.outbox import Outbox, OutboxFull, SQLiteSpool
+from pymessenger2.retry import RetryPolicy
+from pymessenger2.validation import ValidationError, Validator
+
+
+def _recipients(session):
+    return [json.loads(kwargs['data'])['recipient']['id']
+            for _, _, _, kwargs in session.calls]
+
+
+def test_drain_sends_every_entry_once(session):
+    bot = Bot('token', session=session)
+    spool = SQLiteSpool(':memory:')
+    with Outbox(bot, spool, workers=3) as outbox:
+        outbox.put_many(bot.send_text_message(str(i), 'hi', do_send=False)
+                        for i in range(20))
+        outbox.put(b'{"recipient":{"id":"20"},"message":{"text":"hi"}}')
+    assert sorted(_recipients(session), key=int) == [
+        str(i) for i in range(21)]
+    assert len(spool) == 0
+    assert outbox.stats()['sent'] == 21
+
+
+def test_resume_after_crash(session, tmpdir):
+    path = str(tmpdir.join('outbox.db'))
+    bot = Bot('token', session=session)
+    spool = SQLiteSpool(path)
+    Outbox(bot, spool).put_many(
+        bot.send_text_message(str(i), 'hi', do_send=False) for i in range(3))
+    # Leased by a process that died before Graph answered
+    spool.lease(2)
+    spool.close()
+    spool = SQLiteSpool(path)
+    outbox = Outbox(bot, spool).start()
+    outbox.stop(drain=True)
+    assert _recipients(session) == ['0', '1', '2']
+    assert outbox.pending == 0
+
+
+def test_transient_errors_retried_and_permanent_buried(session):
+    bot = Bot('token', session=session)
+    spool = SQLiteSpool(':memory:')
+    policy = RetryPolicy(max_attempts=3, backoff=0, jitter=False)
+    session.queue({'error': {'code': 2, 'message': 'Service unavailable'}})
+    session.queue({'error': {'code': 100, 'message': 'Invalid parameter'}})
+    outbox = Outbox(bot, spool, workers=1, retry_policy=policy)
+    outbox.put(bot.send_text_message('1', 'hi', do_send=False))
+    outbox.put(bot.send_text_message('2', 'hi', do_send=False))
+    outbox.start()
+    outbox.stop(drain=True)
+    # '2' is sent while '1' waits for its retry
+    assert _recipients(session) == ['1', '2', '1']
+    assert outbox.stats() == {'pending': 0, 'in_flight': 0, 'sent': 1,
+                              'failed': 1, 'retried': 1}
+    [(_, payload, attempts, error)] = spool.dead_letters()
+    assert json.loads(payload)['recipient'] == {'id': '2'}
+    assert '100' in error
+
+
+def test_backpressure(session):
+    bot = Bot('token', session=session)
+    outbox = Outbox(bot, SQLiteSpool(':memory:'), max_pending=2)
+    outbox.put({'recipient': {'id': '1'}})
+    outbox.put({'recipient': {'id': '2'}})
+    with pytest.raises(OutboxFull):
+        outbox.put({'recipient': {'id': '3'}}, timeout=0.01)
+    outbox.start()
+    outbox.put({'recipient': {'id': '3'}}, timeout=5)
+    outbox.stop()
+    assert outbox.pending == 0
+
+
+def test_unexpected_errors_are_buried(session):
+    class Failing(Instrumentation):
+        def before_request(self, info):
+            raise RuntimeError("hook bug")
+
+    bot = Bot('token', session=session, instrumentation=Failing())
+    spool = SQLiteSpool(':memory:')
+    outbox = Outbox(bot, spool, workers=1, max_pending=1)
+    for i in range(3):
+        # Blocks forever if the failed entries keep their room
+        outbox.put(bot.send_text_message(str(i), 'hi', do_send=False),
+                   timeout=5)
+        if i == 0:
+            outbox.start()
+    outbox.stop(drain=True)
+    assert outbox.stats() == {'pending': 0, 'in_flight': 0, 'sent': 0,
+                              'failed': 3, 'retried': 0}
+    assert [error for _, _, _, error in spool.dead_letters()] == [
+        "RuntimeError('hook bug')"] * 3
+
+
+def test_strict_validator_checks_puts(session):
+    bot = Bot('token', session=session, validator=Validator())
+    spool = SQLiteSpool(':memory:')
+    outbox = Outbox(bot, spool)
+    with pytest.raises(ValidationError):
+        outbox.put_many([bot.send_text_message('1', 'hi', do_send=False),
+                         bot.send_text_message('2', 'x' * 2001,
+                                               do_send=False)])
+    assert len(spool) == 0 and outbox.pending == 0
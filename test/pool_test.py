@@ -0,0 +1,53 @@
+from pymessenger2 import utils
+from pymessenger2.pool import BotPool
+
+
+def test_lazy_creation_and_lru_eviction(session):
+    tokens = dict(('page{0}'.format(i), 'token{0}'.format(i))
+                  for i in range(3))
+    pool = BotPool(tokens, maxsize=2, session=session)
+    assert len(pool) == 0
+    first = pool['page0']
+    assert first is pool.get('page0')
+    assert first.session is session
+    pool['page1']
+    pool['page0']
+    pool['page2']
+    assert 'page1' not in pool
+    assert 'page0' in pool
+    assert pool.stats()['evictions'] == 1
+    assert pool.get('unknown') is None
+
+
+def test_appsecret_proofs_are_cached(session, monkeypatch):
+    computed = []
+    generate = utils.generate_appsecret_proof
+
+    def counting_proof(access_token, app_secret):
+        computed.append(access_token)
+        return generate(access_token, app_secret)
+
+    monkeypatch.setattr(utils, 'generate_appsecret_proof', counting_proof)
+    pool = BotPool(lambda page_id: 'token', app_secret='secret', maxsize=1,
+                   session=session)
+    for page_id in ('1', '2', '1', '2'):
+        pool[page_id].send_text_message('user', 'hi')
+    assert computed == ['token']
+    assert session.calls[-1][2] == {
+        'access_token': 'token',
+        'appsecret_proof': generate('token', 'secret')}
+
+
+def test_route_webhook_entries(session):
+    pool = BotPool({'1': 'a', '2': 'b'}, session=session)
+    body = {'object': 'page', 'entry': [
+        {'id': '1', 'messaging': [{'sender': {'id': 'u'},
+                                   'message': {'text': 'hi'}}]},
+        {'id': '2', 'messaging': [{'sender': {'id': 'u'},
+                                   'postback': {'payload': 'GO'}}]},
+        {'id': '3', 'messaging': [{'sender': {'id': 'u'},
+                                   'read': {'watermark': 1}}]},
+    ]}
+    routed = [(bot and bot.access_token, event.type)
+              for bot, event in pool.route(body)]
+    assert routed == [('a', 'message'), ('b', 'postback'), (None, 'read')]
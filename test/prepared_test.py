@@ -0,0 +1,72 @@
+import json
+
+from pymessenger2 import Element
+from pymessenger2.airline import (AirlineItinerary, Airport, FlightInfo,
+                                  FlightSchedule, PassengerInfo,
+                                  PassengerSegmentInfo)
+from pymessenger2.bot import Bot, NotificationType
+from pymessenger2.prepared import PreparedMessage
+from pymessenger2.serializer import Serializer
+
+
+def _itinerary():
+    return AirlineItinerary(
+        intro_message='Your trip', pnr_number='ABC123',
+        passenger_info=[PassengerInfo(passenger_id='p1', name='Jane')],
+        flight_info=[FlightInfo(
+            connection_id='c1', segment_id='s1', flight_number='KL1',
+            departure_airport=Airport(airport_code='AMS', city='Amsterdam'),
+            arrival_airport=Airport(airport_code='JFK', city='New York'),
+            flight_schedule=FlightSchedule(
+                departure_time='2017-01-01T10:00',
+                arrival_time='2017-01-01T12:00'),
+            travel_class='economy')],
+        passenger_segment_info=[PassengerSegmentInfo(
+            segment_id='s1', passenger_id='p1', seat='1A',
+            seat_type='Economy')],
+        total_price=100, currency='EUR')
+
+
+def test_prepared_bytes_match_regular_payload(session):
+    bot = Bot('token', session=session)
+    message = {'attachment': {'type': 'template', 'payload': _itinerary()}}
+    serializer = Serializer('json')
+    prepared = PreparedMessage(message, serializer=serializer)
+    for recipient_id in ('123', 'a"b\n'):
+        payload = bot.send_message(recipient_id, message,
+                                   NotificationType.silent_push,
+                                   do_send=False)
+        spliced = bot.send_message(recipient_id, prepared,
+                                   NotificationType.silent_push,
+                                   do_send=False)
+        assert json.loads(spliced.decode('utf8')) == json.loads(
+            serializer.dumps(payload).decode('utf8'))
+    assert json.loads(prepared.for_recipient(456).decode('utf8'))[
+        'recipient'] == {'id': '456'}
+
+
+def test_prepared_message_is_sent_as_is(session):
+    bot = Bot('token', session=session)
+    elements = [Element(title='Arsenal')]
+    prepared = PreparedMessage.from_payload(
+        bot.send_generic_message('0', elements, do_send=False))
+    bot.broadcast(['1', '2'], prepared, concurrency=1)
+    bodies = [json.loads(call[3]['data'].decode('utf8'))
+              for call in session.calls]
+    assert [body['recipient'] for body in bodies] == [{'id': '1'},
+                                                      {'id': '2'}]
+    assert bodies[0]['message']['attachment']['payload']['elements'] == [
+        {'title': 'Arsenal'}]
+
+
+def test_prepared_notification_type_is_kept(session):
+    bot = Bot('token', session=session)
+    prepared = PreparedMessage({'text': 'hi'},
+                               NotificationType.silent_push)
+    bot.send_message('1', prepared)
+    bot.broadcast(['2'], prepared, concurrency=1)
+    bot.send_message('3', prepared, NotificationType.no_push)
+    bot.send_message('4', {'text': 'hi'})
+    assert [json.loads(call[3]['data'].decode('utf8'))['notification_type']
+            for call in session.calls] == ['SILENT_PUSH', 'SILENT_PUSH',
+                                          'NO_PUSH', 'REGULAR']
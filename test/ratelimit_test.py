@@ -0,0 +1,42 @@
+from pymessenger2.bot import Bot
+from pymessenger2.ratelimit import RateLimiter, TokenBucket
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_token_bucket_burst_then_refill():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=10, burst=2, clock=clock)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.wait_time == 0.1
+    assert abs(bucket.reserve() - 0.1) < 1e-9
+    assert abs(bucket.reserve() - 0.2) < 1e-9
+    assert bucket.queue_depth == 2
+    clock.now = 0.2
+    assert bucket.queue_depth == 0
+    clock.now = 10
+    assert bucket.tokens <= 2 and bucket.wait_time == 0
+
+
+def test_bot_sends_are_throttled_per_token(session):
+    clock = FakeClock()
+    limiter = RateLimiter(rate=5, burst=1, clock=clock, sleep=clock.sleep)
+    bot = Bot('token', session=session, rate_limiter=limiter)
+    other = Bot('other', session=session, rate_limiter=limiter)
+    for _ in range(3):
+        bot.send_text_message('1', 'hi')
+    other.take_thread_control('1')
+    bot.get_user_info('1')
+    assert abs(clock.now - 0.4) < 1e-9
+    assert limiter.queue_depth() == 0
+    assert len(session.calls) == 5
@@ -0,0 +1,71 @@
+import socket
+
+import pytest
+import requests
+from requests.packages.urllib3.exceptions import ProtocolError
+
+from pymessenger2.bot import Bot
+from pymessenger2.exceptions import FacebookError
+from pymessenger2.retry import RetryPolicy
+
+THROTTLED = {'error': {'code': 613, 'message': 'Calls limit',
+                       'type': 'OAuthException'}}
+
+
+def _bot(session, sleeps, **policy_options):
+    policy = RetryPolicy(jitter=False, sleep=sleeps.append, **policy_options)
+    return Bot('token', session=session, raise_exception=True,
+               retry_policy=policy)
+
+
+def test_retries_throttling_with_backoff(session):
+    sleeps = []
+    bot = _bot(session, sleeps, max_attempts=4)
+    session.queue(THROTTLED, 400)
+    session.queue(requests.ConnectionError())
+    session.queue({'error': {'code': 1200, 'is_transient': True}}, 400,
+                  {'Retry-After': '7'})
+    result = bot.send_text_message('1', 'hi')
+    assert result['message_id'] == 'mid.1'
+    assert sleeps == [0.5, 1.0, 7.0]
+
+
+def test_gives_up_after_max_attempts(session):
+    sleeps = []
+    bot = _bot(session, sleeps, max_attempts=2)
+    session.queue(THROTTLED, 400)
+    session.queue(THROTTLED, 400)
+    with pytest.raises(FacebookError) as excinfo:
+        bot.pass_thread_control('1')
+    assert excinfo.value.code == 613
+    assert len(session.calls) == 2
+
+
+def test_permanent_errors_are_not_retried(session):
+    sleeps = []
+    bot = _bot(session, sleeps)
+    session.queue({'error': {'code': 100, 'message': 'Invalid parameter'}},
+                  400)
+    with pytest.raises(FacebookError):
+        bot.send_text_message('1', 'hi')
+    assert sleeps == []
+
+
+def test_sent_messages_are_not_retried_on_read_errors(session):
+    sleeps = []
+    bot = _bot(session, sleeps)
+    # Graph may have accepted the message before the connection dropped
+    session.queue(requests.ReadTimeout())
+    with pytest.raises(requests.ReadTimeout):
+        bot.send_text_message('1', 'hi')
+    session.queue(requests.ConnectionError(ProtocolError(
+        'Connection aborted.', socket.error())))
+    with pytest.raises(requests.ConnectionError):
+        bot.send_text_message('1', 'hi')
+    assert sleeps == []
+    session.queue(requests.ConnectTimeout())
+    bot.send_text_message('1', 'hi')
+    session.queue(requests.ReadTimeout())
+    bot.get_user_info('1')
+    assert sleeps == [0.5, 0.5]
+    assert len(session.calls) == 6
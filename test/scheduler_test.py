@@ -0,0 +1,55 @@
+import random
+import threading
+import time
+
+from pymessenger2.bot import Bot
+from pymessenger2.scheduler import OrderedScheduler, shard_of
+
+
+def test_per_recipient_order_with_parallel_recipients(session):
+    bot = Bot('token', session=session)
+    sent = []
+    running = [0, 0]
+    lock = threading.Lock()
+
+    def send(payload):
+        with lock:
+            running[0] += 1
+            running[1] = max(running)
+        time.sleep(random.uniform(0, 0.002))
+        with lock:
+            running[0] -= 1
+            sent.append((payload['recipient']['id'],
+                         payload['message']['text']))
+        return {'recipient_id': payload['recipient']['id']}
+
+    with OrderedScheduler(bot, shards=8, send=send) as scheduler:
+        for seq in range(10):
+            for recipient_id in range(20):
+                scheduler.submit(bot.send_text_message(
+                    str(recipient_id), str(seq), do_send=False))
+    for recipient_id in range(20):
+        texts = [text for rid, text in sent if rid == str(recipient_id)]
+        assert texts == [str(seq) for seq in range(10)]
+    assert running[1] > 1
+    stats = scheduler.stats()
+    assert sum(shard['sent'] for shard in stats) == 200
+    assert all(shard['depth'] == 0 for shard in stats)
+
+
+def test_callbacks_and_bytes_payloads(session):
+    bot = Bot('token', session=session)
+    session.queue({'error': {'code': 100, 'message': 'bad'}})
+    results = []
+    scheduler = OrderedScheduler(bot, shards=2)
+    scheduler.submit(b'{"recipient":{"id":"1"}}', recipient_id='1',
+                     callback=lambda payload, result: results.append(result))
+    scheduler.submit({'recipient': {'id': '1'}},
+                     callback=lambda payload, result: results.append(result))
+    scheduler.join()
+    assert results[0]['error']['code'] == 100
+    assert results[1]['recipient_id'] == '1'
+    shard = scheduler.stats()[shard_of('1', 2)]
+    assert (shard['sent'], shard['failed']) == (1, 1)
+    assert shard['max_latency'] >= shard['mean_latency'] > 0
+    scheduler.close()
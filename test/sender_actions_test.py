@@ -0,0 +1,96 @@
+import pytest
+
+from pymessenger2.bot import Bot
+from pymessenger2.outbox import Outbox, SQLiteSpool
+from pymessenger2.prepared import PreparedMessage
+from pymessenger2.sender_actions import SenderActions
+
+
+class FakeClock(object):
+    now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_redundant_actions_are_dropped(session):
+    clock = FakeClock()
+    actions = SenderActions(window=1, typing_timeout=20, clock=clock)
+    bot = Bot('token', session=session, sender_actions=actions)
+    bot.send_action('1', 'mark_seen')
+    assert bot.send_action('1', 'mark_seen') == {'recipient_id': '1'}
+    assert bot.send_action('1', 'mark_seen') == {'recipient_id': '1'}
+    bot.send_action('1', 'typing_on')
+    assert bot.send_action('1', 'typing_on') == {'recipient_id': '1'}
+    bot.send_text_message('1', 'Hello')
+    # Messenger cleared the indicator
+    assert bot.send_action('1', 'typing_off') == {'recipient_id': '1'}
+    assert len(session.calls) == 3
+    clock.now = 2
+    bot.send_action('1', 'mark_seen')
+    bot.send_action('1', 'typing_on')
+    bot.send_action('1', 'typing_off')
+    assert bot.send_action('1', 'typing_off') == {'recipient_id': '1'}
+    assert len(session.calls) == 6
+    assert actions.stats() == {
+        'sent': {'mark_seen': 2, 'typing_on': 2, 'typing_off': 1},
+        'saved': {'mark_seen': 2, 'typing_on': 1, 'typing_off': 2},
+        'calls_saved': 5, 'recipients': 1}
+
+
+def test_typing_timeout_and_unknown_state(session):
+    clock = FakeClock()
+    bot = Bot('token', session=session,
+              sender_actions=SenderActions(typing_timeout=20, clock=clock))
+    # Unknown state: nothing dropped
+    bot.send_action('1', 'typing_off')
+    bot.send_action('1', 'typing_on')
+    clock.now = 25
+    # The indicator went away by itself
+    bot.send_action('1', 'typing_on')
+    clock.now = 50
+    bot.send_action('1', 'typing_off')
+    assert len(session.calls) == 3
+    # Other recipients and pages are tracked apart
+    bot.send_action('2', 'typing_off')
+    Bot('other', session=session,
+        sender_actions=bot.sender_actions).send_action('1', 'typing_off')
+    assert len(session.calls) == 5
+
+
+def test_failed_actions_are_forgotten(session):
+    bot = Bot('token', session=session, sender_actions=SenderActions())
+    session.queue({'error': {'code': 1200, 'message': 'Temporary'}}, 500)
+    bot.send_action('1', 'typing_on')
+    bot.send_action('1', 'typing_on')
+    session.queue(ValueError('boom'))
+    with pytest.raises(ValueError):
+        bot.send_action('1', 'mark_seen')
+    bot.send_action('1', 'mark_seen')
+    assert len(session.calls) == 4
+
+
+def test_prepared_messages_clear_typing(session):
+    bot = Bot('token', session=session, sender_actions=SenderActions())
+    bot.send_action('1', 'typing_on')
+    bot.send_message('1', PreparedMessage({'text': 'Hi'}))
+    bot.send_action('1', 'typing_off')
+    assert len(session.calls) == 2
+    # Wire bytes are tracked like the dicts
+    bot.send_action('1', 'typing_on')
+    bot.send_raw(PreparedMessage({'text': 'Hi'}).for_recipient('1'))
+    bot.send_action('1', 'typing_off')
+    assert len(session.calls) == 4
+
+
+def test_outbox_sends_are_tracked(session):
+    bot = Bot('token', session=session, sender_actions=SenderActions())
+    outbox = Outbox(bot, SQLiteSpool(':memory:'), workers=1)
+    outbox.put_many([bot.send_action('1', 'typing_on', do_send=False),
+                     bot.send_action('1', 'typing_on', do_send=False),
+                     bot.send_text_message('1', 'Hi', do_send=False),
+                     bot.send_action('1', 'typing_off', do_send=False)])
+    outbox.start().stop(drain=True)
+    assert outbox.stats()['sent'] == 4
+    assert len(session.calls) == 2
+
@@ -0,0 +1,38 @@
+import json
+
+import pytest
+
+from pymessenger2 import Element, QuickReply
+from pymessenger2.buttons import PostbackButton, URLButton
+from pymessenger2.serializer import Serializer, orjson
+from pymessenger2.utils import AttrsEncoder
+
+BACKENDS = ['json'] + (['orjson'] if orjson is not None else [])
+
+
+def _payload():
+    element = Element(title='Arsenal', subtitle='Go', buttons=[
+        URLButton(title='Site', url='http://arsenal.com'),
+        PostbackButton(title='More')])
+    return {'recipient': {'id': '1'},
+            'message': {'attachment': {'type': 'template', 'payload': {
+                'template_type': 'generic', 'elements': [element] * 3}},
+                'quick_replies': [QuickReply(content_type='location')]}}
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_serializer_drops_none_fields(backend):
+    data = json.loads(Serializer(backend).dumps(_payload()).decode('utf8'))
+    element = data['message']['attachment']['payload']['elements'][0]
+    assert element == {
+        'title': 'Arsenal', 'subtitle': 'Go', 'buttons': [
+            {'title': 'Site', 'url': 'http://arsenal.com',
+             'webview_height_ratio': 'full', 'type': 'web_url'},
+            {'title': 'More', 'payload': 'More', 'type': 'postback'}]}
+    assert data['message']['quick_replies'] == [{'content_type': 'location'}]
+    assert data == json.loads(json.dumps(_payload(), cls=AttrsEncoder))
+
+
+def test_serializer_rejects_unknown_objects():
+    with pytest.raises(TypeError):
+        Serializer('json').dumps({'x': object()})
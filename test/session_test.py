@@ -0,0 +1,39 @@
+import json
+
+from pymessenger2.bot import Bot
+from pymessenger2.session import make_session
+
+
+def test_make_session_pools_connections():
+    session = make_session(pool_connections=2, pool_maxsize=20)
+    adapter = session.get_adapter('https://graph.facebook.com')
+    assert adapter._pool_connections == 2
+    assert adapter._pool_maxsize == 20
+    assert session.headers['Connection'] == 'keep-alive'
+    assert make_session(keep_alive=False).headers['Connection'] == 'close'
+
+
+def test_every_endpoint_uses_the_session(session):
+    bot = Bot('token', session=session)
+    bot.send_text_message('123', 'hello')
+    bot.pass_thread_control('123')
+    bot.take_thread_control('123')
+    bot.send_configuration(greeting=[])
+    bot.get_user_info('123')
+    urls = [call[1] for call in session.calls]
+    assert urls == [
+        'https://graph.facebook.com/v2.6/me/messages',
+        'https://graph.facebook.com/v2.6/me/pass_thread_control',
+        'https://graph.facebook.com/v2.6/me/take_thread_control',
+        'https://graph.facebook.com/v2.6/me/messenger_profile',
+        'https://graph.facebook.com/v2.6/123',
+    ]
+    body = json.loads(session.calls[0][3]['data'])
+    assert body['message'] == {'text': 'hello'}
+
+
+def test_shared_session_is_not_closed_by_bot(session):
+    with Bot('token', session=session, warm_up=True) as bot:
+        assert session.calls[0][0] == 'HEAD'
+        assert bot.session is session
+    assert not session.closed
@@ -0,0 +1,64 @@
+import hashlib
+import hmac
+import io
+
+from pymessenger2.signature import SignatureVerifier, WSGISignatureMiddleware
+from pymessenger2.utils import validate_hub_signature
+
+SECRET = 'app secret'
+BODY = b'{"object":"page","entry":[]}' * 100
+
+
+def _header(method, body=BODY):
+    digest = getattr(hashlib, method)
+    return '{0}={1}'.format(method, hmac.new(SECRET.encode('utf8'), body,
+                                             digest).hexdigest())
+
+
+def test_verifier_accepts_both_headers_and_buffers():
+    verifier = SignatureVerifier(SECRET)
+    for method in ('sha1', 'sha256'):
+        header = _header(method)
+        assert verifier.verify(BODY, header)
+        assert verifier.verify(bytearray(BODY), header)
+        assert verifier.verify(memoryview(BODY), header.encode('ascii'))
+        assert not verifier.verify(BODY + b' ', header)
+    for header in (None, '', 'sha256', 'md5=abc', 'sha256=\xe9'):
+        assert not verifier.verify(BODY, header)
+    assert validate_hub_signature(SECRET, BODY.decode('utf8'),
+                                  _header('sha1'))
+
+
+def test_incremental_check():
+    check = SignatureVerifier(SECRET).check(_header('sha256'))
+    view = memoryview(BODY)
+    for i in range(0, len(BODY), 100):
+        check.update(view[i:i + 100])
+    assert check.verify()
+
+
+def _wsgi_call(middleware, headers):
+    environ = {'REQUEST_METHOD': 'POST', 'CONTENT_LENGTH': str(len(BODY)),
+               'wsgi.input': io.BytesIO(BODY)}
+    environ.update(headers)
+    statuses = []
+    body = middleware(environ, lambda status, headers: statuses.append(
+        status))
+    return statuses, body
+
+
+def test_wsgi_middleware():
+    received = []
+
+    def app(environ, start_response):
+        received.append(environ['wsgi.input'].read())
+        start_response('200 OK', [])
+        return [b'ok']
+
+    middleware = WSGISignatureMiddleware(app, SECRET, chunk_size=64)
+    statuses, _ = _wsgi_call(middleware,
+                             {'HTTP_X_HUB_SIGNATURE_256': _header('sha256')})
+    assert statuses == ['200 OK'] and received == [BODY]
+    statuses, _ = _wsgi_call(middleware, {'HTTP_X_HUB_SIGNATURE': 'sha1=0'})
+    assert statuses == ['403 Forbidden'] and len(received) == 1
+
@@ -0,0 +1,87 @@
+import io
+import mmap
+
+import requests
+
+from pymessenger2.bot import Bot
+from pymessenger2.retry import RetryPolicy
+from pymessenger2.upload import (AttachmentSource, MultipartBody,
+                                 guess_content_type)
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 100
+
+
+class NonSeekable(io.RawIOBase):
+    def __init__(self, data):
+        self._data = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        return self._data.read(size)
+
+
+def test_content_type_detection():
+    assert guess_content_type('clip.final.mp4') == 'video/mp4'
+    assert guess_content_type('photo', PNG) == 'image/png'
+    assert guess_content_type(None, b'ID3\x03') == 'audio/mpeg'
+    assert guess_content_type(None, b'RIFF\x00\x00\x00\x00WAVE') == (
+        'audio/wav')
+    assert guess_content_type('notes', b'hello') == (
+        'application/octet-stream')
+
+
+def test_sources(tmpdir):
+    path = tmpdir.join('a.b.png')
+    path.write_binary(PNG)
+    with open(str(path), 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        sources = [str(path), PNG, bytearray(PNG), memoryview(PNG), mapped,
+                   io.BytesIO(PNG)]
+        for source in sources:
+            attachment = AttachmentSource(source, chunk_size=7)
+            assert attachment.size == len(PNG)
+            assert attachment.content_type == 'image/png'
+            assert attachment.replayable
+            assert b''.join(bytes(c) for c in attachment) == PNG
+            assert b''.join(bytes(c) for c in attachment) == PNG
+        mapped.close()
+    for source in (NonSeekable(PNG), iter([PNG[:3], PNG[3:]])):
+        attachment = AttachmentSource(source, chunk_size=7)
+        assert attachment.size is None
+        assert attachment.content_type == 'image/png'
+        assert not attachment.replayable
+        assert b''.join(attachment) == PNG
+    assert AttachmentSource(str(path)).filename == 'a.b.png'
+
+
+def test_multipart_body_length_and_progress():
+    calls = []
+    body = MultipartBody({'message': '{}'}, 'filedata',
+                         AttachmentSource(PNG, chunk_size=50),
+                         progress=lambda p: calls.append((p.sent, p.done)))
+    data = b''.join(bytes(chunk) for chunk in body)
+    assert len(data) == len(body)
+    assert b'filename="attachment"\r\nContent-Type: image/png' in data
+    assert calls == [(50, False), (100, False), (108, False), (108, True)]
+    assert body.last_progress.total == 108
+    assert body.stream() is body
+    chunked = MultipartBody({}, 'filedata', AttachmentSource(iter([PNG])))
+    assert chunked.stream() is not chunked
+
+
+def test_send_streams_and_retries_replayable_sources(session):
+    bot = Bot('token', session=session,
+              retry_policy=RetryPolicy(sleep=lambda delay: None))
+    session.queue(requests.ConnectionError())
+    bot.send_attachment('1', 'image', memoryview(PNG))
+    assert len(session.calls) == 2
+    assert PNG in session.calls[1][3]['data']
+    session.queue(requests.ConnectionError())
+    try:
+        bot.send_attachment('1', 'image', iter([PNG]))
+    except requests.ConnectionError:
+        pass
+    else:
+        raise AssertionError("Iterators can't be retried")
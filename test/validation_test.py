@@ -0,0 +1,147 @@
+import logging
+
+import pytest
+
+from pymessenger2 import Element, QuickReply, frozen
+from pymessenger2.bot import Bot
+from pymessenger2.buttons import CallButton, PostbackButton, URLButton
+from pymessenger2.cli import CommandError, compile_payloads
+from pymessenger2.prepared import PreparedMessage
+from pymessenger2.validation import (OFF, WARN, ValidationError, Validator,
+                                     Violation)
+
+
+def _generic(elements):
+    return {'recipient': {'id': '1'}, 'message': {'attachment': {
+        'type': 'template',
+        'payload': {'template_type': 'generic', 'elements': elements}}}}
+
+
+def _element(i, buttons=1):
+    return Element(title='Element {0}'.format(i),
+                   buttons=[PostbackButton(title='Pick {0}'.format(b))
+                            for b in range(buttons)])
+
+
+def test_valid_payloads():
+    validator = Validator()
+    assert validator.validate(_generic([_element(i, 3)
+                                        for i in range(10)])) == []
+    assert validator.validate(_generic(
+        [frozen.freeze(_element(0)), {'title': 'Dict'}])) == []
+    assert validator.validate({
+        'recipient': {'id': '1'},
+        'message': {'text': 'x' * 2000, 'quick_replies': [
+            QuickReply(content_type='text', title=str(i))
+            for i in range(13)]}}) == []
+    assert validator.validate({'recipient': {'id': '1'},
+                               'sender_action': 'typing_on'}) == []
+
+
+def test_every_violation_has_its_path():
+    elements = [_element(i) for i in range(11)]
+    elements[3] = _element(3, buttons=4)
+    elements[5] = {'title': 'x' * 81, 'buttons': [
+        {'type': 'postback', 'title': 'Buy', 'payload': 'p' * 1001},
+        {'type': 'phone_number', 'title': 'Call', 'payload': '555'},
+        {'type': 'web_url', 'title': 'Site'}]}
+    violations = Validator().violations(_generic(elements))
+    assert violations == [
+        Violation('message.attachment.payload.elements',
+                  'more than 10 items (11)'),
+        Violation('message.attachment.payload.elements[3].buttons',
+                  'more than 3 items (4)'),
+        Violation('message.attachment.payload.elements[5].title',
+                  'longer than 80 characters (81)'),
+        Violation('message.attachment.payload.elements[5].buttons[0].'
+                  'payload', 'longer than 1000 characters (1001)'),
+        Violation('message.attachment.payload.elements[5].buttons[1].'
+                  'payload', 'must be a phone number with a country code, '
+                             'eg: +16505551234'),
+        Violation('message.attachment.payload.elements[5].buttons[2].url',
+                  'is required')]
+
+    violations = Validator().violations({
+        'recipient': {'id': '1'},
+        'message': {'text': 'x' * 2001, 'quick_replies': [
+            {'content_type': 'text', 'title': 'Yes', 'payload': 'YES'}] * 14
+            + [{'content_type': 'sticker'}]}})
+    assert violations == [
+        Violation('message.text', 'longer than 2000 characters (2001)'),
+        Violation('message.quick_replies', 'more than 13 items (15)'),
+        Violation('message.quick_replies[14].content_type',
+                  "must be one of location, text, user_email, "
+                  "user_phone_number, not 'sticker'")]
+    assert Validator().violations({'message': {}}) == [
+        Violation('recipient', 'is required'),
+        Violation('message', 'requires one of text, attachment')]
+
+
+def test_bot_modes(session, caplog):
+    payload = {'recipient': {'id': '1'}, 'message': {'text': 'x' * 2001}}
+    bot = Bot('token', session=session, validator=Validator())
+    with pytest.raises(ValidationError) as e:
+        bot.send_raw(payload)
+    assert e.value.violations == [
+        Violation('message.text', 'longer than 2000 characters (2001)')]
+    assert str(e.value) == 'message.text: longer than 2000 characters (2001)'
+    with pytest.raises(ValidationError):
+        bot.send_text_message('1', 'x' * 2001)
+    assert session.calls == []
+
+    bot.validator = Validator(WARN)
+    with caplog.at_level(logging.WARNING, logger='pymessenger'):
+        bot.send_raw(payload)
+    assert 'message.text: longer than 2000' in caplog.text
+    bot.validator = Validator(OFF)
+    bot.send_raw(payload)
+    assert len(session.calls) == 2
+    with pytest.raises(ValueError):
+        Validator('lenient')
+
+
+def test_models_raise_without_asserts():
+    with pytest.raises(ValidationError) as e:
+        CallButton(title='Call', payload='06 50')
+    assert e.value.violations[0].path == 'payload'
+    with pytest.raises(ValidationError):
+        URLButton(title='Site', url='http://arsenal.com', type='postback')
+    with pytest.raises(ValidationError):
+        QuickReply(content_type='text')
+    assert QuickReply(content_type='user_email').payload is None
+
+
+def test_compile_validates_the_messages():
+    validator = Validator()
+    with pytest.raises(CommandError) as e:
+        next(compile_payloads({'text': 'x' * 2001}, ['1'],
+                              validator=validator))
+    assert 'message: message.text: longer than 2000' in str(e.value)
+    payloads = compile_payloads({'text': '$text'},
+                                ['{"id": "1", "text": "Hi"}',
+                                 '{"id": "2", "text": "%s"}' % ('x' * 2001)],
+                                validator=validator)
+    next(payloads)
+    with pytest.raises(CommandError) as e:
+        next(payloads)
+    assert 'recipients line 2' in str(e.value)
+
+
+def test_prepared_messages_are_validated_once(session, caplog):
+    validator = Validator()
+    checked = []
+    schema = validator.schema
+    validator.schema = lambda *args: checked.append(1) or schema(*args)
+    bot = Bot('token', session=session, validator=validator)
+    prepared = PreparedMessage({'text': 'x' * 2001})
+    with pytest.raises(ValidationError):
+        bot.send_message('1', prepared, do_send=False)
+    summary = bot.broadcast(['1', '2', '3'], prepared)
+    assert summary.failed == 3 and session.calls == []
+    assert len(checked) == 1
+
+    bot.validator = Validator(WARN)
+    with caplog.at_level(logging.WARNING, logger='pymessenger'):
+        bot.broadcast(['1', '2', '3'], prepared)
+    assert caplog.text.count('message.text: longer than 2000') == 1
+    assert len(session.calls) == 3